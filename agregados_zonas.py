@@ -0,0 +1,179 @@
+"""
+AGREGADOS POR ZONA - Remates e defesas materializados por GR/adversário/época/zona/fase
+Tabela mantida por triggers em lances e jogos (cada lance inserido, alterado
+ou apagado só mexe na sua linha do agregado; um jogo inserido depois dos seus
+lances acrescenta-os e um jogo apagado retira-os), para o get_zone_performance
+ler poucas linhas em vez de percorrer todos os lances
+"""
+
+import sqlite3
+import sys
+
+TABELA = 'agregados_zonas'
+
+CRIAR_TABELA = f"""
+CREATE TABLE IF NOT EXISTS {TABELA} (
+    guarda_redes_id INTEGER NOT NULL,
+    adversario_id INTEGER NOT NULL,
+    epoca INTEGER NOT NULL,
+    zona_baliza_id INTEGER NOT NULL,
+    fase_jogo TEXT NOT NULL,
+    zona_baliza_nome TEXT,
+    remates INTEGER NOT NULL,
+    defesas INTEGER NOT NULL,
+    PRIMARY KEY (guarda_redes_id, adversario_id, epoca, zona_baliza_id, fase_jogo)
+) WITHOUT ROWID
+"""
+
+# Contribuição (com sinal) de um conjunto de lances de um jogo, somada ao agregado.
+# {gr}/{adv}/{epoca} vêm da linha de jogos (j, ou OLD/NEW nos triggers de jogos).
+SOMAR = f"""
+INSERT INTO {TABELA} (guarda_redes_id, adversario_id, epoca, zona_baliza_id, fase_jogo,
+                      zona_baliza_nome, remates, defesas)
+SELECT {{gr}}, {{adv}}, {{epoca}}, l.zona_baliza_id, COALESCE(l.fase_jogo, ''),
+       MAX(l.zona_baliza_nome), {{sinal}} COUNT(*),
+       {{sinal}} SUM(CASE WHEN l.resultado = 'Defesa' THEN 1 ELSE 0 END)
+FROM {{origem}}
+GROUP BY l.zona_baliza_id, COALESCE(l.fase_jogo, '')
+ON CONFLICT (guarda_redes_id, adversario_id, epoca, zona_baliza_id, fase_jogo) DO UPDATE SET
+    remates = remates + excluded.remates,
+    defesas = defesas + excluded.defesas,
+    zona_baliza_nome = COALESCE(excluded.zona_baliza_nome, zona_baliza_nome);
+"""
+
+LIMPAR_VAZIOS = f"DELETE FROM {TABELA} WHERE remates <= 0;"
+
+
+def _somar_lance(linha, sinal):
+    """Soma/subtrai um lance (linha = NEW ou OLD de lances)"""
+    origem = f"(SELECT {linha}.zona_baliza_id AS zona_baliza_id, {linha}.fase_jogo AS fase_jogo, " \
+             f"{linha}.zona_baliza_nome AS zona_baliza_nome, {linha}.resultado AS resultado) l " \
+             f"JOIN jogos j ON j.id = {linha}.jogo_id"
+    return SOMAR.format(gr='j.guarda_redes_id', adv='j.adversario_id', epoca='j.epoca',
+                        sinal=sinal, origem=origem)
+
+
+def _somar_jogo(linha, sinal):
+    """Soma/subtrai todos os lances de um jogo com os ids da linha de jogos (NEW ou OLD)"""
+    return SOMAR.format(gr=f'{linha}.guarda_redes_id', adv=f'{linha}.adversario_id',
+                        epoca=f'{linha}.epoca', sinal=sinal,
+                        origem=f"lances l WHERE l.jogo_id = {linha}.id")
+
+
+TRIGGERS = {
+    f'{TABELA}_lance_inserido': f"""
+        CREATE TRIGGER {TABELA}_lance_inserido AFTER INSERT ON lances
+        BEGIN {_somar_lance('NEW', '+')} END""",
+    f'{TABELA}_lance_apagado': f"""
+        CREATE TRIGGER {TABELA}_lance_apagado AFTER DELETE ON lances
+        BEGIN {_somar_lance('OLD', '-')} {LIMPAR_VAZIOS} END""",
+    f'{TABELA}_lance_alterado': f"""
+        CREATE TRIGGER {TABELA}_lance_alterado
+        AFTER UPDATE OF jogo_id, zona_baliza_id, zona_baliza_nome, fase_jogo, resultado ON lances
+        BEGIN {_somar_lance('OLD', '-')} {_somar_lance('NEW', '+')} {LIMPAR_VAZIOS} END""",
+    f'{TABELA}_jogo_alterado': f"""
+        CREATE TRIGGER {TABELA}_jogo_alterado
+        AFTER UPDATE OF id, guarda_redes_id, adversario_id, epoca ON jogos
+        BEGIN {_somar_jogo('OLD', '-')} {_somar_jogo('NEW', '+')} {LIMPAR_VAZIOS} END""",
+    # Lances registados antes do jogo (o JOIN dos triggers de lances não os encontrou)
+    f'{TABELA}_jogo_inserido': f"""
+        CREATE TRIGGER {TABELA}_jogo_inserido AFTER INSERT ON jogos
+        BEGIN {_somar_jogo('NEW', '+')} END""",
+    f'{TABELA}_jogo_apagado': f"""
+        CREATE TRIGGER {TABELA}_jogo_apagado AFTER DELETE ON jogos
+        BEGIN {_somar_jogo('OLD', '-')} {LIMPAR_VAZIOS} END""",
+}
+
+COLUNAS = "guarda_redes_id, adversario_id, epoca, zona_baliza_id, fase_jogo, remates, defesas"
+
+# Agregação completa dos lances (mesmas chaves e colunas da tabela)
+AGREGAR = """
+SELECT j.guarda_redes_id AS guarda_redes_id, j.adversario_id AS adversario_id, j.epoca AS epoca,
+       l.zona_baliza_id AS zona_baliza_id, COALESCE(l.fase_jogo, '') AS fase_jogo,
+       MAX(l.zona_baliza_nome) AS zona_baliza_nome, COUNT(*) AS remates,
+       SUM(CASE WHEN l.resultado = 'Defesa' THEN 1 ELSE 0 END) AS defesas
+FROM lances l
+JOIN jogos j ON l.jogo_id = j.id
+GROUP BY j.guarda_redes_id, j.adversario_id, j.epoca, l.zona_baliza_id, COALESCE(l.fase_jogo, '')
+"""
+
+RECONSTRUIR = f"""
+INSERT INTO {TABELA} (guarda_redes_id, adversario_id, epoca, zona_baliza_id, fase_jogo,
+                      zona_baliza_nome, remates, defesas)
+{AGREGAR}
+"""
+
+
+def _normalizar(sql):
+    return ' '.join(sql.split()) if sql else None
+
+
+def instalar(conn):
+    """
+    Cria a tabela, recria os triggers e preenche-a a partir dos lances (idempotente)
+
+    Os triggers são sempre apagados e criados de novo, para uma base de dados
+    instalada com uma versão anterior ficar com os atuais; se algum mudou, o
+    agregado pode ter divergido e é reconstruído.
+    """
+    with conn:
+        conn.execute(CRIAR_TABELA)
+        existe = conn.execute(f"SELECT 1 FROM {TABELA} LIMIT 1").fetchone()
+        instalados = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall())
+        mudaram = any(_normalizar(instalados.get(nome)) != _normalizar(sql) for nome, sql in TRIGGERS.items())
+        for nome, sql in TRIGGERS.items():
+            conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+            conn.execute(sql)
+        if existe and mudaram:
+            conn.execute(f"DELETE FROM {TABELA}")
+        if not existe or mudaram:
+            conn.execute(RECONSTRUIR)
+
+
+def reconstruir(conn):
+    """Recalcula a tabela inteira (ex.: depois de carregar lances com os triggers desligados)"""
+    with conn:
+        conn.execute(f"DELETE FROM {TABELA}")
+        conn.execute(RECONSTRUIR)
+
+
+def remover(conn):
+    """Apaga triggers e tabela"""
+    with conn:
+        for nome in TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+        conn.execute(f"DROP TABLE IF EXISTS {TABELA}")
+
+
+def diferencas(conn):
+    """Linhas em que o agregado difere de uma agregação completa dos lances (vazio = consistente)"""
+    query = f"""
+    WITH completo AS ({AGREGAR})
+    SELECT * FROM (SELECT {COLUNAS} FROM {TABELA} EXCEPT SELECT {COLUNAS} FROM completo)
+    UNION ALL
+    SELECT * FROM (SELECT {COLUNAS} FROM completo EXCEPT SELECT {COLUNAS} FROM {TABELA})
+    """
+    return conn.execute(query).fetchall()
+
+
+# INSTALAÇÃO / MANUTENÇÃO
+if __name__ == "__main__":
+    acao = sys.argv[1] if len(sys.argv) > 1 else 'instalar'
+    db_path = sys.argv[2] if len(sys.argv) > 2 else 'handball_dt.db'
+
+    with sqlite3.connect(db_path) as conn:
+        if acao == 'instalar':
+            instalar(conn)
+            n = conn.execute(f"SELECT COUNT(*) FROM {TABELA}").fetchone()[0]
+            print(f"✅ {TABELA}: {n} linhas, {len(TRIGGERS)} triggers")
+        elif acao == 'reconstruir':
+            reconstruir(conn)
+            print(f"✅ {TABELA} reconstruída")
+        elif acao == 'verificar':
+            erradas = diferencas(conn)
+            print("✅ Consistente com os lances" if not erradas else f"❌ {len(erradas)} linhas diferentes")
+        elif acao == 'remover':
+            remover(conn)
+            print(f"🗑️ {TABELA} e triggers removidos")
+        else:
+            print("Uso: python agregados_zonas.py [instalar|reconstruir|verificar|remover] [db_path]")
@@ -230,8 +230,7 @@ with col2:
 
 with col3:
     query = "SELECT AVG(taxa_defesa_global) as media FROM epocas WHERE epoca = 2025"
-    with db.get_connection() as conn:
-        taxa_media = pd.read_sql_query(query, conn)['media'].values[0]
+    taxa_media = db.read_query(query)['media'].values[0]
     st.markdown(f"""
     <div class="metric-container">
         <div class="metric-value">{taxa_media:.1f}%</div>
@@ -241,8 +240,7 @@ with col3:
 
 with col4:
     query = "SELECT COUNT(DISTINCT id) as total FROM jogos"
-    with db.get_connection() as conn:
-        total_jogos = pd.read_sql_query(query, conn)['total'].values[0]
+    total_jogos = db.read_query(query)['total'].values[0]
     st.markdown(f"""
     <div class="metric-container">
         <div class="metric-value">{total_jogos}</div>
@@ -271,8 +269,7 @@ FROM guarda_redes gr
 LEFT JOIN epocas e ON gr.id = e.guarda_redes_id AND e.epoca = 2025
 """
 
-with db.get_connection() as conn:
-    plantel_df = pd.read_sql_query(query, conn)
+plantel_df = db.read_query(query)
 
 cols = st.columns(len(plantel_df))
 
@@ -2,27 +2,166 @@
 Módulo de acesso à base de dados - Digital Twin ABC Braga
 """
 
+import queue
 import sqlite3
+import threading
 import pandas as pd
+from contextlib import contextmanager
+from pathlib import Path
 from typing import Optional
+from urllib.parse import quote
+
+import agregados_zonas
+from models.cache_predicoes import CacheLRU
 
 class HandballDataAccess:
-    """Classe para acesso estruturado aos dados"""
+    """
+    Classe para acesso estruturado aos dados
+    
+    Só lê: as queries usam um pool pequeno de conexões só de leitura (URI
+    mode=ro, check_same_thread=False) com mmap e cache de statements,
+    partilhado pelas threads (cada rerun do Streamlit corre numa thread nova).
+    O modo WAL, para as leituras não bloquearem um escritor, é ativado por quem
+    escreve (ingestao_lances.py, migracao_bd.py migrar).
+    
+    Os resultados das queries ficam em cache (chave = SQL + parâmetros) até a
+    base de dados mudar: o mtime/tamanho do ficheiro e do -wal são verificados
+    a cada leitura, por isso um ingest aparece logo na leitura seguinte.
+    
+    A performance por zona lê a tabela agregados_zonas (mantida por triggers,
+    ver agregados_zonas.py) se existir; senão agrega os lances. A instalação é
+    um passo explícito (python agregados_zonas.py instalar ou migracao_bd.py
+    migrar), não uma escrita feita por cada página que abre o acesso.
+    """
     
-    def __init__(self, db_path="handball_dt.db"):
+    # Statements preparados guardados por conexão (sqlite3 cached_statements)
+    STATEMENTS_EM_CACHE = 256
+    MMAP_BYTES = 256 * 1024 * 1024
+    
+    def __init__(self, db_path="handball_dt.db", max_queries_cache=256, max_conexoes=4):
+        """
+        Args:
+            db_path (str): Base de dados SQLite
+            max_queries_cache (int): Resultados de queries em cache (0 = sem cache)
+            max_conexoes (int): Conexões livres mantidas no pool (as outras são fechadas)
+        """
         self.db_path = db_path
+        self.max_conexoes = max_conexoes
+        self._pool = queue.LifoQueue()
+        self.cache = CacheLRU(max_entradas=max_queries_cache) if max_queries_cache else None
+        self._versao_cache = None
+        self._lock_cache = threading.Lock()
+        self._uri = f"file:{quote(str(Path(db_path).resolve()))}?mode=ro"
+    
+    def _nova_conexao(self):
+        conn = sqlite3.connect(self._uri, uri=True, timeout=5.0, check_same_thread=False,
+                               cached_statements=self.STATEMENTS_EM_CACHE)
+        conn.execute(f"PRAGMA mmap_size={self.MMAP_BYTES}")
+        return conn
     
+    @contextmanager
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        """
+        Conexão só de leitura emprestada do pool, devolvida no fim do with
+        
+        Uso:
+            with db.get_connection() as conn:
+                df = pd.read_sql_query(query, conn)
+        """
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._nova_conexao()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._pool.qsize() < self.max_conexoes:
+                self._pool.put(conn)
+            else:
+                conn.close()
+    
+    def fechar(self):
+        """Fecha as conexões livres do pool"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+    
+    def _versao_dados(self):
+        """Assinatura (mtime, tamanho) da base de dados e do -wal: muda a cada commit"""
+        assinatura = []
+        for caminho in (self.db_path, f"{self.db_path}-wal"):
+            try:
+                estado = Path(caminho).stat()
+                assinatura.append((estado.st_mtime_ns, estado.st_size))
+            except FileNotFoundError:
+                assinatura.append(None)
+        return tuple(assinatura)
+    
+    def read_query(self, query, params=()):
+        """
+        Read-through: DataFrame da query (cópia, o chamador pode alterá-lo)
+        
+        A cache é esvaziada quando a assinatura da base de dados muda.
+        """
+        if self.cache is None:
+            with self.get_connection() as conn:
+                return pd.read_sql_query(query, conn, params=params)
+        
+        versao = self._versao_dados()
+        with self._lock_cache:
+            if versao != self._versao_cache:
+                self.cache.limpar()
+                self._versao_cache = versao
+        
+        chave = (query, tuple(params))
+        df = self.cache.get_many([chave])[0]
+        if df is None:
+            with self.get_connection() as conn:
+                df = pd.read_sql_query(query, conn, params=params)
+            # Só guarda se nada mudou durante a leitura
+            if self._versao_dados() == versao:
+                self.cache.put_many([chave], [df])
+        return df.copy()
+    
+    def cache_stats(self):
+        """Contadores da cache de queries (None se desativada)"""
+        return self.cache.stats() if self.cache is not None else None
     
     def get_all_goalkeepers(self):
         """Retorna lista de todos os guarda-redes"""
         query = "SELECT id, nome, altura_cm, envergadura_cm, posicao_principal, velocidade_lateral_ms FROM guarda_redes"
-        with self.get_connection() as conn:
-            return pd.read_sql_query(query, conn)
+        return self.read_query(query)
+    
+    def _tem_tabela(self, nome):
+        query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+        return not self.read_query(query, (nome,)).empty
     
     def get_zone_performance(self, gr_id: int, adversario_id: Optional[int] = None):
-        """Performance por zona de um GR"""
+        """Performance por zona de um GR (agregados materializados; sem eles, a partir dos lances)"""
+        if self._tem_tabela(agregados_zonas.TABELA):
+            query = f"""
+            SELECT 
+                zona_baliza_id,
+                MAX(zona_baliza_nome) as zona_baliza_nome,
+                SUM(remates) as total_remates,
+                SUM(defesas) as defesas,
+                ROUND(100.0 * SUM(defesas) / SUM(remates), 1) as taxa_defesa
+            FROM {agregados_zonas.TABELA}
+            WHERE guarda_redes_id = ?
+            """
+            params = [gr_id]
+            
+            if adversario_id:
+                query += " AND adversario_id = ?"
+                params.append(adversario_id)
+            
+            query += " GROUP BY zona_baliza_id ORDER BY zona_baliza_id"
+            return self.read_query(query, params)
+        
         query = """
         SELECT 
             l.zona_baliza_id,
@@ -42,11 +181,33 @@ class HandballDataAccess:
         
         query += " GROUP BY l.zona_baliza_id, l.zona_baliza_nome ORDER BY l.zona_baliza_id"
         
-        with self.get_connection() as conn:
-            return pd.read_sql_query(query, conn, params=params)
+        return self.read_query(query, params)
     
-    def get_compatibility_matrix(self, adversario_id: int):
-        """Matriz compatibilidade todos GRs vs adversário"""
+    def get_compatibility_matrix(self, adversario_id: int, fonte: str = "historico"):
+        """
+        Matriz compatibilidade todos GRs vs adversário
+        
+        fonte="historico": compatibilidades_gr_adversario (jogos disputados)
+        fonte="modelo": estimativas pré-calculadas em compatibilidades_modelo
+        (python models/predictor_compatibilidade.py --matriz), sem inferência
+        """
+        if fonte == "modelo":
+            if not self._tem_tabela('compatibilidades_modelo'):
+                return pd.DataFrame(columns=['nome', 'taxa_defesa_perc', 'model_id', 'model_hash', 'calculado_em'])
+            query = """
+            SELECT 
+                gr.nome,
+                m.taxa_defesa_prevista as taxa_defesa_perc,
+                m.model_id,
+                m.model_hash,
+                m.calculado_em
+            FROM compatibilidades_modelo m
+            JOIN guarda_redes gr ON m.guarda_redes_id = gr.id
+            WHERE m.adversario_id = ?
+            ORDER BY m.taxa_defesa_prevista DESC
+            """
+            return self.read_query(query, (adversario_id,))
+        
         query = """
         SELECT 
             gr.nome,
@@ -59,8 +220,7 @@ class HandballDataAccess:
         WHERE c.adversario_id = ?
         ORDER BY c.taxa_defesa_perc DESC
         """
-        with self.get_connection() as conn:
-            return pd.read_sql_query(query, conn, params=(adversario_id,))
+        return self.read_query(query, (adversario_id,))
     
     def get_training_scenarios(self, gr_id: int, top_n: int = 5):
         """Top N cenários de treino por ROI"""
@@ -76,8 +236,7 @@ class HandballDataAccess:
         ORDER BY roi_estimado DESC
         LIMIT ?
         """
-        with self.get_connection() as conn:
-            return pd.read_sql_query(query, conn, params=(gr_id, top_n))
+        return self.read_query(query, (gr_id, top_n))
     
     def get_evolution(self, gr_id: int, last_n_months: int = 6):
         """Evolução temporal de um GR"""
@@ -94,8 +253,23 @@ class HandballDataAccess:
         ORDER BY id DESC
         LIMIT ?
         """
-        with self.get_connection() as conn:
-            return pd.read_sql_query(query, conn, params=(gr_id, last_n_months))
+        return self.read_query(query, (gr_id, last_n_months))
+
+    def get_match_state(self, jogo_id: int):
+        """Remates e defesas por zona de um jogo registado ao vivo (ingestao_lances.py)"""
+        if not self._tem_tabela('estado_jogo_zonas'):
+            return pd.DataFrame(columns=['zona_baliza_id', 'remates', 'defesas', 'taxa_defesa'])
+        query = """
+        SELECT 
+            zona_baliza_id,
+            remates,
+            defesas,
+            ROUND(100.0 * defesas / remates, 1) as taxa_defesa
+        FROM estado_jogo_zonas
+        WHERE jogo_id = ?
+        ORDER BY zona_baliza_id
+        """
+        return self.read_query(query, (jogo_id,))
 
 # Exemplo de uso
 if __name__ == "__main__":
@@ -0,0 +1,401 @@
+"""
+INGESTÃO DE LANCES - Registo ao vivo dos remates durante o jogo
+API só de inserção: cada lote de lances entra em lances com um único
+executemany numa transação curta, que também atualiza o estado do jogo
+(resultado, minuto, remates/defesas por zona) de forma incremental.
+Em WAL, os dashboards continuam a ler sem esperar pelo escritor
+"""
+
+import argparse
+import sqlite3
+import sys
+import threading
+from collections import defaultdict
+from datetime import date, datetime
+
+ZONAS = {
+    1: 'Superior Esquerda', 2: 'Superior Centro', 3: 'Superior Direita',
+    4: 'Média Esquerda', 5: 'Média Centro', 6: 'Média Direita',
+    7: 'Inferior Esquerda', 8: 'Inferior Centro', 9: 'Inferior Direita'
+}
+RESULTADOS = ('Defesa', 'Golo')
+# Minuto a partir do qual o lance conta para a 2ª parte (jogo de 60 min)
+INICIO_2T = 31
+
+CRIAR_ESTADO = [
+    """
+    CREATE TABLE IF NOT EXISTS estado_jogo (
+        jogo_id INTEGER PRIMARY KEY,
+        minuto INTEGER NOT NULL DEFAULT 0,
+        golos_favor INTEGER NOT NULL DEFAULT 0,
+        golos_contra INTEGER NOT NULL DEFAULT 0,
+        remates INTEGER NOT NULL DEFAULT 0,
+        defesas INTEGER NOT NULL DEFAULT 0,
+        ultima_defesa_minuto INTEGER,
+        terminado INTEGER NOT NULL DEFAULT 0,
+        atualizado_em TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS estado_jogo_zonas (
+        jogo_id INTEGER NOT NULL,
+        zona_baliza_id INTEGER NOT NULL,
+        remates INTEGER NOT NULL,
+        defesas INTEGER NOT NULL,
+        PRIMARY KEY (jogo_id, zona_baliza_id)
+    ) WITHOUT ROWID
+    """,
+]
+
+INSERIR_LANCE = """
+INSERT INTO lances (id, jogo_id, zona_baliza_id, zona_baliza_nome, distancia_remate_m,
+                    velocidade_remate_kmh, tipo_remate, posicao_ofensiva, minuto_jogo, fase_jogo,
+                    tempo_desde_ultima_defesa_s, resultado, diferenca_golos_momento,
+                    inferioridade_numerica)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SOMAR_ESTADO = """
+INSERT INTO estado_jogo (jogo_id, minuto, golos_contra, remates, defesas, ultima_defesa_minuto, atualizado_em)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (jogo_id) DO UPDATE SET
+    minuto = MAX(minuto, excluded.minuto),
+    golos_contra = golos_contra + excluded.golos_contra,
+    remates = remates + excluded.remates,
+    defesas = defesas + excluded.defesas,
+    ultima_defesa_minuto = COALESCE(excluded.ultima_defesa_minuto, ultima_defesa_minuto),
+    atualizado_em = excluded.atualizado_em
+"""
+
+SOMAR_ZONA = """
+INSERT INTO estado_jogo_zonas (jogo_id, zona_baliza_id, remates, defesas)
+VALUES (?, ?, ?, ?)
+ON CONFLICT (jogo_id, zona_baliza_id) DO UPDATE SET
+    remates = remates + excluded.remates,
+    defesas = defesas + excluded.defesas
+"""
+
+
+class IngestorLances:
+    """
+    Escritor de lances de jogos a decorrer (um por processo de registo)
+
+    Os lances ficam num buffer e são escritos em lote quando este chega a
+    tamanho_lote, a cada intervalo segundos (thread de fundo) ou com flush().
+    Campos que dependem do momento do jogo (diferença de golos, tempo desde a
+    última defesa, parte do jogo) são calculados a partir do estado se não
+    forem indicados.
+
+    Uso:
+        ingestor = IngestorLances('handball_dt.db')
+        jogo_id = ingestor.iniciar_jogo(guarda_redes_id=1, adversario_id=3)
+        ingestor.registar(jogo_id, zona_baliza_id=5, resultado='Defesa', minuto_jogo=12)
+        ingestor.golo_favor(jogo_id, minuto=13)
+        print(ingestor.estado(jogo_id))
+        ingestor.fechar()
+    """
+
+    def __init__(self, db_path='handball_dt.db', tamanho_lote=50, intervalo=None):
+        """
+        Args:
+            db_path (str): Base de dados SQLite (passa a WAL)
+            tamanho_lote (int): Lances em buffer que disparam a escrita
+            intervalo (float | None): Segundos entre escritas automáticas (None = sem thread)
+        """
+        self.db_path = db_path
+        self.tamanho_lote = tamanho_lote
+        self._conn = sqlite3.connect(db_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        for sql in CRIAR_ESTADO:
+            self._conn.execute(sql)
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._estados = {}
+        self.escritos = 0
+        self.lotes = 0
+
+        self._parar = threading.Event()
+        self._thread = None
+        if intervalo:
+            self._thread = threading.Thread(target=self._ciclo, args=(intervalo,), daemon=True)
+            self._thread.start()
+
+    # -------------------------------------------------------------------------
+    # Jogos
+    # -------------------------------------------------------------------------
+    def iniciar_jogo(self, guarda_redes_id, adversario_id, local='Casa', data=None,
+                     fase_competicao='Liga', importancia_jogo='Média'):
+        """Cria a linha do jogo (e o seu estado a zeros); devolve o jogo_id"""
+        data = data or date.today().isoformat()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                jogo_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM jogos").fetchone()[0]
+                self._conn.execute(
+                    "INSERT INTO jogos (id, guarda_redes_id, adversario_id, data, local, epoca, "
+                    "fase_competicao, importancia_jogo) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (jogo_id, guarda_redes_id, adversario_id, data, local, int(data[:4]),
+                     fase_competicao, importancia_jogo)
+                )
+                self._conn.execute(
+                    "INSERT INTO estado_jogo (jogo_id, atualizado_em) VALUES (?, ?)",
+                    (jogo_id, datetime.now().isoformat())
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return jogo_id
+
+    def golo_favor(self, jogo_id, minuto=None):
+        """Golo da nossa equipa (não é um lance contra o GR, só mexe no resultado)"""
+        self.flush()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE estado_jogo SET golos_favor = golos_favor + 1, minuto = MAX(minuto, COALESCE(?, minuto)), "
+                "atualizado_em = ? WHERE jogo_id = ?",
+                (minuto, datetime.now().isoformat(), jogo_id)
+            )
+            self._estados.pop(jogo_id, None)
+
+    def terminar_jogo(self, jogo_id):
+        """Escreve o resultado final em jogos e marca o estado como terminado"""
+        self.flush()
+        estado = self.estado(jogo_id)
+        favor, contra = estado['golos_favor'], estado['golos_contra']
+        resultado = 'Vitória' if favor > contra else 'Derrota' if favor < contra else 'Empate'
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jogos SET golos_favor = ?, golos_contra = ?, diferenca_final = ?, "
+                    "resultado_final = ?, tempo_jogo_gr_minutos = ? WHERE id = ?",
+                    (favor, contra, favor - contra, resultado, estado['minuto'], jogo_id)
+                )
+                self._conn.execute("UPDATE estado_jogo SET terminado = 1 WHERE jogo_id = ?", (jogo_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return resultado
+
+    # -------------------------------------------------------------------------
+    # Lances
+    # -------------------------------------------------------------------------
+    def _estado_memoria(self, jogo_id):
+        """Estado corrente (lido uma vez por jogo, depois atualizado em memória)"""
+        estado = self._estados.get(jogo_id)
+        if estado is None:
+            linha = self._conn.execute(
+                "SELECT minuto, golos_favor, golos_contra, ultima_defesa_minuto FROM estado_jogo WHERE jogo_id = ?",
+                (jogo_id,)
+            ).fetchone()
+            if linha is None:
+                raise ValueError(f"Jogo {jogo_id} sem estado (iniciar_jogo primeiro)")
+            estado = dict(zip(['minuto', 'golos_favor', 'golos_contra', 'ultima_defesa_minuto'], linha))
+            self._estados[jogo_id] = estado
+        return estado
+
+    def registar(self, jogo_id, zona_baliza_id, resultado, minuto_jogo, distancia_remate_m=None,
+                 velocidade_remate_kmh=None, tipo_remate=None, posicao_ofensiva=None,
+                 inferioridade_numerica=0, diferenca_golos_momento=None, tempo_desde_ultima_defesa_s=None):
+        """
+        Acrescenta um lance ao buffer (escreve se o lote ficar cheio)
+
+        Args:
+            jogo_id (int): Jogo iniciado com iniciar_jogo
+            zona_baliza_id (int): 1-9
+            resultado (str): 'Defesa' ou 'Golo'
+            minuto_jogo (int): 0-60
+            diferenca_golos_momento (int | None): None = golos a favor - contra antes do lance
+            tempo_desde_ultima_defesa_s (int | None): None = calculado pelo minuto da última defesa
+        """
+        if zona_baliza_id not in ZONAS:
+            raise ValueError(f"zona_baliza_id deve ser 1-9 (recebido: {zona_baliza_id!r})")
+        if resultado not in RESULTADOS:
+            raise ValueError(f"resultado deve ser um de {RESULTADOS} (recebido: {resultado!r})")
+        if not 0 <= minuto_jogo <= 60:
+            raise ValueError(f"minuto_jogo deve estar entre 0 e 60 (recebido: {minuto_jogo!r})")
+
+        with self._lock:
+            estado = self._estado_memoria(jogo_id)
+            if diferenca_golos_momento is None:
+                diferenca_golos_momento = estado['golos_favor'] - estado['golos_contra']
+            if tempo_desde_ultima_defesa_s is None and estado['ultima_defesa_minuto'] is not None:
+                tempo_desde_ultima_defesa_s = max(minuto_jogo - estado['ultima_defesa_minuto'], 0) * 60
+
+            estado['minuto'] = max(estado['minuto'], minuto_jogo)
+            if resultado == 'Defesa':
+                estado['ultima_defesa_minuto'] = minuto_jogo
+            else:
+                estado['golos_contra'] += 1
+
+            self._buffer.append((
+                jogo_id, zona_baliza_id, ZONAS[zona_baliza_id], distancia_remate_m, velocidade_remate_kmh,
+                tipo_remate, posicao_ofensiva, minuto_jogo, '1ºT' if minuto_jogo < INICIO_2T else '2ºT',
+                tempo_desde_ultima_defesa_s, resultado, diferenca_golos_momento, int(inferioridade_numerica)
+            ))
+            cheio = len(self._buffer) >= self.tamanho_lote
+
+        if cheio:
+            self.flush()
+
+    def flush(self):
+        """Escreve o buffer: lances + estado numa só transação; devolve quantos lances"""
+        with self._lock:
+            if not self._buffer:
+                return 0
+            lote = self._buffer
+
+            # Contribuição do lote para o estado de cada jogo e zona
+            jogos = defaultdict(lambda: [0, 0, 0, 0, None])   # minuto, golos, remates, defesas, ult. defesa
+            zonas = defaultdict(lambda: [0, 0])
+            for (jogo_id, zona, _, _, _, _, _, minuto, _, _, resultado, _, _) in lote:
+                j = jogos[jogo_id]
+                j[0] = max(j[0], minuto)
+                j[2] += 1
+                zonas[(jogo_id, zona)][0] += 1
+                if resultado == 'Defesa':
+                    j[3] += 1
+                    j[4] = minuto if j[4] is None else max(j[4], minuto)
+                    zonas[(jogo_id, zona)][1] += 1
+                else:
+                    j[1] += 1
+            agora = datetime.now().isoformat()
+
+            # Se o BEGIN falhar (ex.: base de dados bloqueada), o lote continua no buffer
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._buffer = []
+            try:
+                inicio = self._conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM lances").fetchone()[0]
+                self._conn.executemany(INSERIR_LANCE, [(inicio + i, *linha) for i, linha in enumerate(lote)])
+                self._conn.executemany(SOMAR_ESTADO, [(j, *v, agora) for j, v in jogos.items()])
+                self._conn.executemany(SOMAR_ZONA, [(j, z, *v) for (j, z), v in zonas.items()])
+                self._conn.execute("COMMIT")
+            except Exception:
+                # O lote volta ao buffer antes do ROLLBACK (que também pode falhar)
+                self._buffer = lote + self._buffer
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+
+            self.escritos += len(lote)
+            self.lotes += 1
+            return len(lote)
+
+    def _ciclo(self, intervalo):
+        while not self._parar.wait(intervalo):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"❌ Escrita de lances falhou (fica em buffer): {e}")
+
+    # -------------------------------------------------------------------------
+    # Leitura / fecho
+    # -------------------------------------------------------------------------
+    def estado(self, jogo_id):
+        """Estado escrito do jogo + remates/defesas por zona"""
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM estado_jogo WHERE jogo_id = ?", (jogo_id,))
+            linha = cursor.fetchone()
+            if linha is None:
+                raise ValueError(f"Jogo {jogo_id} sem estado")
+            estado = dict(zip([c[0] for c in cursor.description], linha))
+            estado['zonas'] = {
+                zona: {'remates': r, 'defesas': d}
+                for zona, r, d in self._conn.execute(
+                    "SELECT zona_baliza_id, remates, defesas FROM estado_jogo_zonas "
+                    "WHERE jogo_id = ? ORDER BY zona_baliza_id", (jogo_id,)
+                )
+            }
+        return estado
+
+    def fechar(self):
+        """Para a thread, escreve o que falta e fecha a conexão"""
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        self._conn.close()
+
+
+def _imprimir_estado(estado):
+    print(f"⏱️ Min {estado['minuto']} | {estado['golos_favor']}-{estado['golos_contra']} | "
+          f"{estado['defesas']}/{estado['remates']} defesas")
+    for zona, z in estado['zonas'].items():
+        print(f"   {ZONAS[zona]:<18} {z['defesas']}/{z['remates']}")
+
+
+# REGISTO AO VIVO (CLI)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registo de lances durante o jogo")
+    parser.add_argument('--db', default='handball_dt.db')
+    sub = parser.add_subparsers(dest='acao', required=True)
+
+    p = sub.add_parser('iniciar', help="Cria o jogo e devolve o jogo_id")
+    p.add_argument('--gr', type=int, required=True)
+    p.add_argument('--adv', type=int, required=True)
+    p.add_argument('--local', default='Casa', choices=['Casa', 'Fora'])
+
+    p = sub.add_parser('remate', help="Um lance")
+    p.add_argument('jogo_id', type=int)
+    p.add_argument('zona', type=int)
+    p.add_argument('resultado', choices=RESULTADOS)
+    p.add_argument('minuto', type=int)
+    p.add_argument('--distancia', type=float)
+    p.add_argument('--velocidade', type=float)
+
+    p = sub.add_parser('golo', help="Golo a favor")
+    p.add_argument('jogo_id', type=int)
+    p.add_argument('minuto', type=int, nargs='?')
+
+    p = sub.add_parser('ao-vivo', help="Lê lances do stdin: 'zona D|G minuto [distancia] [velocidade]', 'golo minuto'")
+    p.add_argument('jogo_id', type=int)
+    p.add_argument('--lote', type=int, default=1, help="Lances por escrita (1 = cada lance logo visível)")
+
+    for nome in ('estado', 'terminar'):
+        sub.add_parser(nome).add_argument('jogo_id', type=int)
+
+    args = parser.parse_args()
+    ingestor = IngestorLances(args.db, tamanho_lote=getattr(args, 'lote', 1), intervalo=2.0)
+
+    try:
+        if args.acao == 'iniciar':
+            jogo_id = ingestor.iniciar_jogo(args.gr, args.adv, local=args.local)
+            print(f"✅ Jogo {jogo_id} iniciado")
+        elif args.acao == 'remate':
+            ingestor.registar(args.jogo_id, args.zona, args.resultado, args.minuto,
+                              distancia_remate_m=args.distancia, velocidade_remate_kmh=args.velocidade)
+            ingestor.flush()
+            _imprimir_estado(ingestor.estado(args.jogo_id))
+        elif args.acao == 'golo':
+            ingestor.golo_favor(args.jogo_id, args.minuto)
+            _imprimir_estado(ingestor.estado(args.jogo_id))
+        elif args.acao == 'ao-vivo':
+            print("✍️ zona (1-9), D/G, minuto [distância] [velocidade] | 'golo minuto' | 'estado' | Ctrl+D para sair")
+            for linha in sys.stdin:
+                partes = linha.split()
+                try:
+                    if not partes:
+                        continue
+                    if partes[0] == 'estado':
+                        ingestor.flush()
+                        _imprimir_estado(ingestor.estado(args.jogo_id))
+                    elif partes[0] == 'golo':
+                        ingestor.golo_favor(args.jogo_id, int(partes[1]) if len(partes) > 1 else None)
+                    else:
+                        extra = [float(v) for v in partes[3:5]] + [None, None]
+                        resultado = {'D': 'Defesa', 'G': 'Golo'}[partes[1].upper()[0]]
+                        ingestor.registar(args.jogo_id, int(partes[0]), resultado, int(partes[2]),
+                                          distancia_remate_m=extra[0], velocidade_remate_kmh=extra[1])
+                except (ValueError, KeyError, IndexError) as e:
+                    print(f"⚠️ Linha ignorada ({e})")
+        elif args.acao == 'estado':
+            _imprimir_estado(ingestor.estado(args.jogo_id))
+        elif args.acao == 'terminar':
+            print(f"🏁 Jogo {args.jogo_id}: {ingestor.terminar_jogo(args.jogo_id)}")
+    finally:
+        ingestor.fechar()
@@ -0,0 +1,310 @@
+"""
+MIGRAÇÃO DA BASE DE DADOS - Chaves primárias, índices compostos e ANALYZE
+As tabelas foram criadas pelo pandas.to_sql (sem PRIMARY KEY e com índices de
+uma só coluna). A migração reconstrói-as com chave primária inteira e cria os
+índices que servem o WHERE/ORDER BY de cada método do HandballDataAccess;
+o benchmark compara o plano (EXPLAIN QUERY PLAN) e o tempo antes e depois
+numa base de dados sintética grande
+"""
+
+import argparse
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import agregados_zonas
+from data_access import HandballDataAccess
+
+# Chave primária de cada tabela ('id' passa a alias do rowid)
+CHAVES = {
+    'guarda_redes': ('id',),
+    'adversarios': ('id',),
+    'jogos': ('id',),
+    'lances': ('id',),
+    'epocas': ('id',),
+    'treinos': ('id',),
+    'compatibilidades_gr_adversario': ('id',),
+    'correlacoes_fisica_performance': ('id',),
+    'evolucao_temporal': ('id',),
+    'simulacoes_cenarios': ('id',),
+    'analise_plantel': ('guarda_redes_1_id', 'guarda_redes_2_id'),
+}
+
+# (nome, tabela, colunas, único) - cada índice indica o acesso que serve
+INDICES = [
+    # get_zone_performance sem agregados: jogos do GR (e adversário), depois os seus lances
+    ('idx_jogos_gr_adv_epoca', 'jogos', 'guarda_redes_id, adversario_id, epoca', False),
+    ('idx_lances_jogo_zona', 'lances', 'jogo_id, zona_baliza_id, zona_baliza_nome, resultado', False),
+    # get_compatibility_matrix: WHERE adversario_id ORDER BY taxa DESC
+    ('idx_compat_adv_taxa', 'compatibilidades_gr_adversario', 'adversario_id, taxa_defesa_perc DESC', False),
+    ('uq_compat_gr_adv', 'compatibilidades_gr_adversario', 'guarda_redes_id, adversario_id', True),
+    ('idx_compat_modelo_adv_taxa', 'compatibilidades_modelo', 'adversario_id, taxa_defesa_prevista DESC', False),
+    # get_training_scenarios: WHERE guarda_redes_id ORDER BY roi DESC LIMIT
+    ('idx_simulacoes_gr_roi', 'simulacoes_cenarios', 'guarda_redes_id, roi_estimado DESC', False),
+    # get_evolution: WHERE guarda_redes_id ORDER BY id DESC (o rowid vem no índice)
+    ('idx_evolucao_gr', 'evolucao_temporal', 'guarda_redes_id', False),
+    # Plantel (LEFT JOIN epocas ON gr AND epoca) e média da época
+    ('uq_epocas_gr_epoca', 'epocas', 'guarda_redes_id, epoca', True),
+    ('idx_epocas_epoca', 'epocas', 'epoca, taxa_defesa_global', False),
+    ('idx_treinos_gr_data', 'treinos', 'guarda_redes_id, data', False),
+]
+
+# Índices de uma coluna que passam a ser prefixo de um composto
+OBSOLETOS = ['idx_lances_jogo', 'idx_jogos_gr']
+
+
+def _existe(conn, tipo, nome):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (tipo, nome)).fetchone() is not None
+
+
+def _reconstruir_tabela(conn, tabela, chave):
+    """Copia a tabela para uma nova com PRIMARY KEY; devolve False se já tinha chave"""
+    colunas = conn.execute(f'PRAGMA table_info("{tabela}")').fetchall()
+    if any(c[5] for c in colunas):
+        return False
+
+    definicoes = []
+    for _, nome, tipo, _, _, _ in colunas:
+        definicao = f'"{nome}" {tipo}'.rstrip()
+        if chave == (nome,) and tipo.upper() == 'INTEGER':
+            definicao += ' PRIMARY KEY'
+        elif nome in chave:
+            definicao += ' NOT NULL'
+        definicoes.append(definicao)
+    if len(chave) > 1 or not any('PRIMARY KEY' in d for d in definicoes):
+        definicoes.append(f"PRIMARY KEY ({', '.join(chave)})")
+
+    nomes = ', '.join(f'"{c[1]}"' for c in colunas)
+    nova = f'_migracao_{tabela}'
+    conn.execute(f'DROP TABLE IF EXISTS "{nova}"')
+    conn.execute(f'CREATE TABLE "{nova}" (\n    ' + ',\n    '.join(definicoes) + '\n)')
+    conn.execute(f'INSERT INTO "{nova}" ({nomes}) SELECT {nomes} FROM "{tabela}"')
+    conn.execute(f'DROP TABLE "{tabela}"')
+    conn.execute(f'ALTER TABLE "{nova}" RENAME TO "{tabela}"')
+    return True
+
+
+def migrar(db_path, backup=True, agregados=True):
+    """
+    Aplica a migração (idempotente) numa única transação e passa a base de dados a WAL
+
+    Args:
+        db_path (str | Path): Base de dados
+        backup (bool): Copia primeiro para <db_path>.bak
+        agregados (bool): Instala também a tabela/triggers de agregados_zonas.py
+
+    Returns:
+        dict: tabelas reconstruídas e índices criados/removidos
+    """
+    if backup:
+        with sqlite3.connect(db_path) as origem, sqlite3.connect(f"{db_path}.bak") as destino:
+            origem.backup(destino)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    resultado = {'tabelas': [], 'indices': [], 'removidos': []}
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        # Triggers (ex.: agregados_zonas) e índices antigos desaparecem com as tabelas
+        triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+        indices = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        ).fetchall()
+        for nome, _ in triggers:
+            conn.execute(f'DROP TRIGGER "{nome}"')
+
+        for tabela, chave in CHAVES.items():
+            if _existe(conn, 'table', tabela) and _reconstruir_tabela(conn, tabela, chave):
+                resultado['tabelas'].append(tabela)
+
+        for nome, sql in indices:
+            if nome in OBSOLETOS:
+                conn.execute(f'DROP INDEX IF EXISTS "{nome}"')
+                resultado['removidos'].append(nome)
+            elif not _existe(conn, 'index', nome):
+                conn.execute(sql)
+        for nome, tabela, colunas, unico in INDICES:
+            if _existe(conn, 'table', tabela) and not _existe(conn, 'index', nome):
+                conn.execute(f"CREATE {'UNIQUE ' if unico else ''}INDEX {nome} ON {tabela} ({colunas})")
+                resultado['indices'].append(nome)
+        for _, sql in triggers:
+            conn.execute(sql)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        conn.close()
+        raise
+
+    if agregados:
+        # instalar() usa o "with conn" do sqlite3: precisa de uma conexão em modo transacional
+        conn_agregados = sqlite3.connect(db_path)
+        try:
+            agregados_zonas.instalar(conn_agregados)
+        finally:
+            conn_agregados.close()
+    conn.execute("ANALYZE")
+    # Leituras dos dashboards (HandballDataAccess, só leitura) não bloqueiam o escritor
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+    return resultado
+
+
+# =============================================================================
+# PLANOS E BENCHMARK
+# =============================================================================
+
+def acessos(db):
+    """Chamadas do HandballDataAccess medidas no benchmark (GR/adversário a meio dos ids)"""
+    gr_id, adv_id = 2, 3
+    return {
+        'get_all_goalkeepers': lambda: db.get_all_goalkeepers(),
+        'get_zone_performance(gr)': lambda: db.get_zone_performance(gr_id),
+        'get_zone_performance(gr, adv)': lambda: db.get_zone_performance(gr_id, adv_id),
+        'get_compatibility_matrix': lambda: db.get_compatibility_matrix(adv_id),
+        'get_training_scenarios': lambda: db.get_training_scenarios(gr_id),
+        'get_evolution': lambda: db.get_evolution(gr_id),
+        'media_epoca (app)': lambda: db.read_query(
+            "SELECT AVG(taxa_defesa_global) as media FROM epocas WHERE epoca = 2025"),
+    }
+
+
+def medir(db_path, repeticoes=20):
+    """
+    Plano e tempo mediano de cada acesso (sem cache de queries nem agregados)
+
+    Returns:
+        dict: nome -> {'plano': [linhas], 'ms': float}
+    """
+    # Pool de uma conexão, numa só thread: as chamadas usam a conexão rastreada
+    db = HandballDataAccess(str(db_path), max_queries_cache=0, max_conexoes=1)
+    with db.get_connection() as conn:
+        pass
+    resultados = {}
+    for nome, chamar in acessos(db).items():
+        executadas = []
+        conn.set_trace_callback(executadas.append)
+        chamar()
+        conn.set_trace_callback(None)
+
+        plano = []
+        for sql in executadas:
+            if 'sqlite_master' in sql:
+                continue
+            plano += [linha[3] for linha in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            chamar()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        resultados[nome] = {'plano': plano, 'ms': float(np.median(tempos))}
+    db.fechar()
+    return resultados
+
+
+def criar_sintetica(destino, n_lances=1_000_000, n_grs=60, n_adversarios=40, seed=42, origem='handball_dt.db'):
+    """
+    Base de dados sintética com o esquema original (pandas.to_sql)
+
+    Cada tabela é preenchida reamostrando as linhas reais e reatribuindo ids e
+    chaves estrangeiras, para manter tipos e distribuições plausíveis.
+    """
+    rng = np.random.default_rng(seed)
+    with sqlite3.connect(origem) as fonte, sqlite3.connect(destino) as conn:
+        fonte.backup(conn)
+        for nome in agregados_zonas.TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+        conn.execute(f"DROP TABLE IF EXISTS {agregados_zonas.TABELA}")
+
+        def preencher(tabela, n, **colunas):
+            df = pd.read_sql_query(f'SELECT * FROM "{tabela}"', conn)
+            df = df.iloc[rng.integers(0, len(df), n)].reset_index(drop=True)
+            if 'id' in df:
+                df['id'] = np.arange(1, n + 1)
+            for coluna, valores in colunas.items():
+                df[coluna] = valores
+            conn.execute(f'DELETE FROM "{tabela}"')
+            df.to_sql(tabela, conn, if_exists='append', index=False, chunksize=50_000)
+
+        n_jogos = max(n_lances // 54, 1)
+        pares = np.array([(g, a) for g in range(1, n_grs + 1) for a in range(1, n_adversarios + 1)])
+        epocas = np.array([(g, e) for g in range(1, n_grs + 1) for e in (2023, 2024, 2025)])
+
+        preencher('guarda_redes', n_grs)
+        preencher('adversarios', n_adversarios, ranking_liga=np.arange(1, n_adversarios + 1))
+        preencher('jogos', n_jogos,
+                  guarda_redes_id=rng.integers(1, n_grs + 1, n_jogos),
+                  adversario_id=rng.integers(1, n_adversarios + 1, n_jogos),
+                  epoca=rng.choice([2023, 2024, 2025], n_jogos))
+        preencher('lances', n_lances, jogo_id=rng.integers(1, n_jogos + 1, n_lances))
+        preencher('compatibilidades_gr_adversario', len(pares),
+                  guarda_redes_id=pares[:, 0], adversario_id=pares[:, 1])
+        preencher('epocas', len(epocas), guarda_redes_id=epocas[:, 0], epoca=epocas[:, 1])
+        preencher('simulacoes_cenarios', n_grs * 10, guarda_redes_id=np.repeat(np.arange(1, n_grs + 1), 10))
+        preencher('evolucao_temporal', n_grs * 24, guarda_redes_id=np.repeat(np.arange(1, n_grs + 1), 24))
+        preencher('treinos', n_grs * 120, guarda_redes_id=np.repeat(np.arange(1, n_grs + 1), 120))
+    return destino
+
+
+def benchmark(n_lances=1_000_000, repeticoes=20):
+    """Mede os acessos numa base sintética, migra-a e volta a medir; imprime planos e tempos"""
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = Path(pasta) / 'sintetica.db'
+        inicio = time.perf_counter()
+        criar_sintetica(caminho, n_lances)
+        print(f"🧪 Base sintética: {n_lances:,} lances em {time.perf_counter() - inicio:.1f}s")
+
+        antes = medir(caminho, repeticoes)
+        inicio = time.perf_counter()
+        # Sem agregados: compara só o efeito das chaves e dos índices
+        resumo = migrar(caminho, backup=False, agregados=False)
+        print(f"🔧 Migração em {time.perf_counter() - inicio:.1f}s: "
+              f"{len(resumo['tabelas'])} tabelas, {len(resumo['indices'])} índices")
+        depois = medir(caminho, repeticoes)
+
+    print(f"\n{'Acesso':<32}{'Antes (ms)':>12}{'Depois (ms)':>13}{'Ganho':>8}")
+    print("-" * 65)
+    for nome in antes:
+        a, d = antes[nome]['ms'], depois[nome]['ms']
+        print(f"{nome:<32}{a:>12.2f}{d:>13.2f}{a / d:>7.1f}x")
+
+    print("\nEXPLAIN QUERY PLAN")
+    for nome in antes:
+        print(f"\n{nome}")
+        print("   antes:  " + " | ".join(antes[nome]['plano']))
+        print("   depois: " + " | ".join(depois[nome]['plano']))
+    return antes, depois
+
+
+# MIGRAÇÃO / BENCHMARK
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migração do esquema e benchmark de planos")
+    sub = parser.add_subparsers(dest='acao', required=True)
+
+    p = sub.add_parser('migrar', help="Chaves primárias, índices e ANALYZE")
+    p.add_argument('db_path', nargs='?', default='handball_dt.db')
+    p.add_argument('--sem-backup', action='store_true')
+
+    p = sub.add_parser('plano', help="EXPLAIN QUERY PLAN e tempos dos acessos")
+    p.add_argument('db_path', nargs='?', default='handball_dt.db')
+
+    p = sub.add_parser('benchmark', help="Antes/depois numa base sintética")
+    p.add_argument('--lances', type=int, default=1_000_000)
+    p.add_argument('--repeticoes', type=int, default=20)
+
+    args = parser.parse_args()
+
+    if args.acao == 'migrar':
+        resumo = migrar(args.db_path, backup=not args.sem_backup)
+        print(f"✅ Tabelas com chave primária: {', '.join(resumo['tabelas']) or 'nenhuma (já migradas)'}")
+        print(f"✅ Índices criados: {', '.join(resumo['indices']) or 'nenhum'}")
+        if resumo['removidos']:
+            print(f"🗑️ Índices removidos: {', '.join(resumo['removidos'])}")
+    elif args.acao == 'plano':
+        for nome, r in medir(args.db_path).items():
+            print(f"{nome:<32}{r['ms']:>8.2f} ms   " + " | ".join(r['plano']))
+    else:
+        benchmark(args.lances, args.repeticoes)
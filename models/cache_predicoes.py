@@ -0,0 +1,278 @@
+"""
+CACHE DE PREDIÇÕES - Memoização das chamadas aos modelos
+LRU limitado em memória (sessões do mesmo processo) e store SQLite persistente
+(partilhado entre workers e reinícios do Streamlit)
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def chaves_linhas(colunas):
+    """
+    Chaves canónicas (nomes ordenados, valores da linha) de cada linha das colunas
+
+    Números são normalizados para float, para 9 e 9.0 darem a mesma chave.
+    """
+    nomes = tuple(sorted(colunas))
+    normalizadas = [
+        [v if isinstance(v, str) else float(v) for v in colunas[n]]
+        for n in nomes
+    ]
+    return [(nomes, linha) for linha in zip(*normalizadas)]
+
+
+def pontuar_com_cache(colunas, model_hash, pontuar_modelo, lru=None, persistente=None):
+    """
+    Read-through: LRU -> store persistente -> modelo
+
+    Só as linhas em falta nas duas caches são enviadas a pontuar_modelo; os
+    resultados novos são escritos nas duas caches (o store num único lote).
+
+    Args:
+        colunas (dict): Nome da feature -> lista de valores
+        model_hash (str): Identidade do modelo (faz parte da chave)
+        pontuar_modelo (callable): colunas -> np.ndarray com uma predição por linha
+        lru (CacheLRU | None): Cache em memória
+        persistente (CachePersistente | None): Store SQLite
+
+    Returns:
+        list[float]: Uma predição por linha
+    """
+    if lru is None and persistente is None:
+        return pontuar_modelo(colunas).tolist()
+
+    chaves = [(model_hash, chave) for chave in chaves_linhas(colunas)]
+    valores = lru.get_many(chaves) if lru is not None else [None] * len(chaves)
+
+    em_falta = [i for i, v in enumerate(valores) if v is None]
+    if em_falta and persistente is not None:
+        guardados = persistente.get_many(model_hash, [chaves[i][1] for i in em_falta])
+        recuperados = [i for i, v in zip(em_falta, guardados) if v is not None]
+        for i, v in zip(em_falta, guardados):
+            valores[i] = v
+        if lru is not None and recuperados:
+            lru.put_many([chaves[i] for i in recuperados], [valores[i] for i in recuperados])
+        em_falta = [i for i in em_falta if valores[i] is None]
+
+    if em_falta:
+        novos = pontuar_modelo({n: [colunas[n][i] for i in em_falta] for n in colunas}).tolist()
+        for i, v in zip(em_falta, novos):
+            valores[i] = v
+        if lru is not None:
+            lru.put_many([chaves[i] for i in em_falta], novos)
+        if persistente is not None:
+            persistente.put_many(model_hash, [chaves[i][1] for i in em_falta], novos)
+
+    return valores
+
+
+class CacheLRU:
+    """
+    Cache LRU thread-safe com contadores de hits/misses/evictions
+
+    Uso:
+        cache = CacheLRU(max_entradas=50_000)
+        valores = cache.get_many(chaves)       # None onde não há entrada
+        cache.put_many(chaves_em_falta, novos)
+        print(cache.stats())
+    """
+
+    def __init__(self, max_entradas=50_000):
+        self.max_entradas = max_entradas
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, chaves):
+        """Valores em cache (None nas chaves em falta); marca os hits como recentes"""
+        resultado = []
+        with self._lock:
+            for chave in chaves:
+                valor = self._dados.get(chave)
+                if valor is None:
+                    self.misses += 1
+                else:
+                    self._dados.move_to_end(chave)
+                    self.hits += 1
+                resultado.append(valor)
+        return resultado
+
+    def put_many(self, chaves, valores):
+        """Guarda os pares chave/valor, removendo os menos usados acima do limite"""
+        with self._lock:
+            for chave, valor in zip(chaves, valores):
+                self._dados[chave] = valor
+                self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_entradas:
+                self._dados.popitem(last=False)
+                self.evictions += 1
+
+    def limpar(self):
+        """Remove todas as entradas (mantém os contadores)"""
+        with self._lock:
+            self._dados.clear()
+
+    def remover_hash(self, model_hash):
+        """Remove as entradas de uma versão do modelo; devolve quantas foram removidas"""
+        with self._lock:
+            chaves = [c for c in self._dados if c[0] == model_hash]
+            for chave in chaves:
+                del self._dados[chave]
+        return len(chaves)
+
+    def __len__(self):
+        return len(self._dados)
+
+    def stats(self):
+        """Contadores e taxa de acerto"""
+        total = self.hits + self.misses
+        return {
+            'entradas': len(self._dados),
+            'max_entradas': self.max_entradas,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+class CachePersistente:
+    """
+    Store de predições em SQLite (ficheiro à parte da base de dados de jogo)
+
+    Tabela predictions_cache(model_hash, chave, valor, criado), com chave
+    primária (model_hash, chave). Em WAL, vários workers leem e escrevem em
+    simultâneo. O número de entradas é contado na abertura e depois seguido
+    pelas escritas; acima de max_entradas, as mais antigas são apagadas pelo
+    índice de criado, até ficarem no máximo 90% do limite.
+
+    Uso:
+        store = CachePersistente('models/cache_predicoes.db')
+        valores = store.get_many(model_hash, chaves)
+        store.put_many(model_hash, chaves_novas, valores_novos)
+    """
+
+    # Máximo de parâmetros por SELECT ... IN (...)
+    LOTE_LEITURA = 500
+
+    def __init__(self, caminho, max_entradas=1_000_000):
+        self.caminho = str(caminho)
+        self.max_entradas = max_entradas
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.escritas = 0
+        self.podadas = 0
+
+        with self._conexao() as conn:
+            colunas = [linha[1] for linha in conn.execute("PRAGMA table_info(predictions_cache)")]
+            if colunas and 'criado' not in colunas:
+                # Store sem limite (versão anterior): é só cache, recomeça vazio
+                conn.execute("DROP TABLE predictions_cache")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS predictions_cache (
+                    model_hash TEXT NOT NULL,
+                    chave TEXT NOT NULL,
+                    valor REAL NOT NULL,
+                    criado REAL NOT NULL,
+                    PRIMARY KEY (model_hash, chave)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS predictions_cache_criado ON predictions_cache (criado)")
+            # Única contagem completa: a partir daqui o total é seguido pelas escritas e podas
+            self._entradas = conn.execute("SELECT COUNT(*) FROM predictions_cache").fetchone()[0]
+        if self._entradas > self.max_entradas:
+            self._podar()
+
+    def _conexao(self):
+        """Uma conexão por thread (objetos sqlite3 não se partilham entre threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _texto(chave):
+        return json.dumps(chave, separators=(',', ':'))
+
+    def get_many(self, model_hash, chaves):
+        """Valores guardados (None nas chaves em falta)"""
+        textos = [self._texto(c) for c in chaves]
+        encontrados = {}
+        conn = self._conexao()
+        for inicio in range(0, len(textos), self.LOTE_LEITURA):
+            lote = textos[inicio:inicio + self.LOTE_LEITURA]
+            marcadores = ','.join('?' * len(lote))
+            encontrados.update(conn.execute(
+                f"SELECT chave, valor FROM predictions_cache WHERE model_hash = ? AND chave IN ({marcadores})",
+                [model_hash, *lote]
+            ).fetchall())
+
+        valores = [encontrados.get(t) for t in textos]
+        n_hits = sum(v is not None for v in valores)
+        self.hits += n_hits
+        self.misses += len(valores) - n_hits
+        return valores
+
+    def put_many(self, model_hash, chaves, valores):
+        """Escreve um lote numa única transação (e poda o store se já escreveu o suficiente)"""
+        agora = time.time()
+        with self._conexao() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO predictions_cache (model_hash, chave, valor, criado) VALUES (?, ?, ?, ?)",
+                [(model_hash, self._texto(c), float(v), agora) for c, v in zip(chaves, valores)]
+            )
+        with self._lock:
+            self.escritas += len(valores)
+            # Limite superior: chaves substituídas não aumentam a tabela
+            self._entradas += len(valores)
+            podar = self._entradas > self.max_entradas
+        if podar:
+            self._podar()
+
+    def _podar(self):
+        """Apaga as entradas mais antigas, deixando no máximo 90% de max_entradas; devolve quantas"""
+        manter = int(self.max_entradas * 0.9)
+        with self._conexao() as conn:
+            # Linha n.º manter+1 a contar da mais recente (pelo índice); NULL se houver menos
+            apagadas = conn.execute("""
+                DELETE FROM predictions_cache WHERE criado <= (
+                    SELECT criado FROM predictions_cache ORDER BY criado DESC LIMIT 1 OFFSET ?
+                )
+            """, [manter]).rowcount
+        with self._lock:
+            self.podadas += apagadas
+            # Depois da poda nunca ficam mais de manter entradas
+            self._entradas = min(self._entradas - apagadas, manter)
+        return apagadas
+
+    def remover_hash(self, model_hash):
+        """Apaga as predições de uma versão do modelo; devolve quantas foram apagadas"""
+        with self._conexao() as conn:
+            apagadas = conn.execute("DELETE FROM predictions_cache WHERE model_hash = ?", [model_hash]).rowcount
+        with self._lock:
+            self._entradas = max(self._entradas - apagadas, 0)
+        return apagadas
+
+    def stats(self):
+        """Contadores deste processo e entradas guardadas (limite superior, sem contar a tabela)"""
+        total = self.hits + self.misses
+        return {
+            'entradas': self._entradas,
+            'max_entradas': self.max_entradas,
+            'hits': self.hits,
+            'misses': self.misses,
+            'escritas': self.escritas,
+            'podadas': self.podadas,
+            'hit_rate': self.hits / total if total else 0.0
+        }
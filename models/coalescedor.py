@@ -0,0 +1,154 @@
+"""
+COALESCEDOR - Micro-batching de pedidos concorrentes ao modelo
+Junta os pedidos que chegam dentro de uma janela de poucos milissegundos
+(várias sessões/tablets ao mesmo tempo), pontua-os num único pedido e
+devolve a cada chamador a sua parte do resultado
+"""
+
+import queue
+import threading
+import time
+import numpy as np
+
+
+class _Pedido:
+    """Colunas de um chamador + resultado (preenchido pela thread do coalescedor)"""
+
+    __slots__ = ('colunas', 'n', 'pronto', 'resultado', 'erro')
+
+    def __init__(self, colunas):
+        self.colunas = colunas
+        self.n = len(next(iter(colunas.values())))
+        self.pronto = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class Coalescedor:
+    """
+    Micro-batcher thread-based à frente de uma função de pontuação
+
+    Cada chamada a pontuar() bloqueia até o lote em que entrou ser pontuado.
+    Uma thread dedicada espera pelo primeiro pedido, recolhe os que chegarem
+    nos janela_ms seguintes (até max_linhas) e faz uma só chamada por
+    conjunto de colunas.
+
+    Uso:
+        coalescedor = Coalescedor(predictor._pontuar_h2o, janela_ms=5)
+        probs = coalescedor.pontuar({'zona_baliza_id': [5], ...})
+        print(coalescedor.stats())
+    """
+
+    def __init__(self, pontuar_lote, janela_ms=5, max_linhas=20_000):
+        """
+        Args:
+            pontuar_lote (callable): colunas -> np.ndarray com uma predição por linha
+            janela_ms (float): Tempo máximo de espera por mais pedidos após o primeiro
+            max_linhas (int): Linhas a partir das quais o lote é enviado logo
+        """
+        self.pontuar_lote = pontuar_lote
+        self.janela = janela_ms / 1000
+        self.max_linhas = max_linhas
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._parado = False
+        self.pedidos = 0
+        self.lotes = 0
+        self.linhas = 0
+        self._thread = threading.Thread(target=self._ciclo, daemon=True)
+        self._thread.start()
+
+    def pontuar(self, colunas):
+        """Pontua as colunas no próximo lote e devolve as predições desta chamada"""
+        pedido = _Pedido(colunas)
+        if pedido.n == 0:
+            return np.empty(0)
+        with self._lock:
+            if self._parado:
+                # Versão já substituída: pedido atrasado pontuado diretamente
+                return np.asarray(self.pontuar_lote(colunas), dtype=float)
+            self._fila.put(pedido)
+        pedido.pronto.wait()
+        if pedido.erro is not None:
+            raise pedido.erro
+        return pedido.resultado
+
+    def _recolher(self):
+        """Bloqueia pelo primeiro pedido e junta os que chegarem dentro da janela (vazio = parar)"""
+        primeiro = self._fila.get()
+        if primeiro is None:
+            return []
+        lote = [primeiro]
+        linhas = lote[0].n
+        limite = time.perf_counter() + self.janela
+        while linhas < self.max_linhas:
+            restante = limite - time.perf_counter()
+            if restante <= 0:
+                break
+            try:
+                pedido = self._fila.get(timeout=restante)
+            except queue.Empty:
+                break
+            if pedido is None:
+                # Fim: pontua este lote e volta a pôr o marcador para o próximo ciclo
+                self._fila.put(None)
+                break
+            lote.append(pedido)
+            linhas += pedido.n
+        return lote
+
+    def _ciclo(self):
+        while True:
+            lote = self._recolher()
+            if not lote:
+                return
+
+            # Pedidos com as mesmas colunas vão juntos num só frame
+            grupos = {}
+            for pedido in lote:
+                grupos.setdefault(tuple(pedido.colunas), []).append(pedido)
+
+            for nomes, pedidos in grupos.items():
+                self._pontuar_grupo(nomes, pedidos)
+
+            self.pedidos += len(lote)
+            self.lotes += len(grupos)
+            self.linhas += sum(p.n for p in lote)
+
+    def _pontuar_grupo(self, nomes, pedidos):
+        """Uma chamada ao modelo para o grupo; reparte o resultado (ou o erro) pelos pedidos"""
+        try:
+            colunas = {n: [v for p in pedidos for v in p.colunas[n]] for n in nomes}
+            resultado = np.asarray(self.pontuar_lote(colunas), dtype=float)
+            inicio = 0
+            for pedido in pedidos:
+                pedido.resultado = resultado[inicio:inicio + pedido.n]
+                inicio += pedido.n
+        except Exception as e:
+            for pedido in pedidos:
+                pedido.erro = e
+        finally:
+            for pedido in pedidos:
+                pedido.pronto.set()
+
+    def parar(self):
+        """
+        Termina a thread depois de pontuar os pedidos já em fila
+
+        Chamadas a pontuar() depois de parar() são pontuadas diretamente.
+        """
+        with self._lock:
+            if self._parado:
+                return
+            self._parado = True
+            self._fila.put(None)
+        self._thread.join()
+
+    def stats(self):
+        """Pedidos recebidos, lotes enviados ao modelo e tamanho médio do lote"""
+        return {
+            'pedidos': self.pedidos,
+            'lotes': self.lotes,
+            'linhas': self.linhas,
+            'pedidos_por_lote': self.pedidos / self.lotes if self.lotes else 0.0
+        }
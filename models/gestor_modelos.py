@@ -0,0 +1,144 @@
+"""
+GESTOR DE MODELOS - Um único dono da ligação H2O e dos predictors por processo
+Todas as páginas recebem as mesmas instâncias: cada modelo é carregado no
+máximo uma vez, mesmo com vários dashboards abertos em simultâneo
+"""
+
+import atexit
+import os
+import sys
+import threading
+from pathlib import Path
+
+# Permite correr este ficheiro diretamente (python models/<ficheiro>.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+_lock = threading.RLock()
+_h2o = {'ligado': False, 'iniciado_aqui': False}
+_predictores = {}
+
+# Segundos entre verificações dos metadados (troca do modelo a quente)
+INTERVALO_RECARGA = 5.0
+
+# Serializa os pedidos ao cluster (upload do frame + predict) entre threads
+lock_h2o = threading.Lock()
+
+
+def ligar_h2o(max_mem_size="2G"):
+    """
+    Liga ao cluster H2O uma única vez por processo
+
+    Tenta primeiro um cluster existente; se não houver, inicia um novo.
+    Chamadas seguintes reutilizam a mesma ligação.
+
+    Returns:
+        bool: True se o cluster foi iniciado por este processo
+    """
+    with _lock:
+        if not _h2o['ligado']:
+            import h2o
+            try:
+                # Tenta conectar a cluster existente
+                h2o.connect(verbose=False)
+                print("✅ Conectado a cluster H2O existente")
+            except:
+                # Inicia novo cluster
+                try:
+                    h2o.init(max_mem_size=max_mem_size, verbose=False)
+                    _h2o['iniciado_aqui'] = True
+                    # O cluster é partilhado: só é desligado à saída do processo
+                    # (ou explicitamente), nunca quando um predictor é destruído
+                    atexit.register(desligar_h2o)
+                    print("✅ Novo cluster H2O iniciado")
+                except Exception as e:
+                    print(f"❌ Erro ao iniciar H2O: {e}")
+                    raise
+            _h2o['ligado'] = True
+        return _h2o['iniciado_aqui']
+
+
+def desligar_h2o():
+    """Desliga o cluster H2O (só se foi iniciado por este processo)"""
+    with _lock:
+        if _h2o['ligado'] and _h2o['iniciado_aqui']:
+            import h2o
+            h2o.cluster().shutdown(prompt=False)
+        _h2o['ligado'] = False
+        _h2o['iniciado_aqui'] = False
+
+
+def _obter(tipo, model_dir, criar):
+    """Instância partilhada de (tipo, pasta), criada na primeira chamada"""
+    chave = (tipo, str(Path(model_dir).resolve()))
+    predictor = _predictores.get(chave)
+    if predictor is None:
+        with _lock:
+            # Outra thread pode ter carregado entretanto
+            predictor = _predictores.get(chave)
+            if predictor is None:
+                predictor = criar()
+                _predictores[chave] = predictor
+    return predictor
+
+
+def _sockets_padrao():
+    """Sockets dos daemons de scoring (DT_SCORING_SOCKETS, separados por vírgula)"""
+    return os.environ.get('DT_SCORING_SOCKETS') or None
+
+
+def obter_defesa(model_dir='models', cache_db='models/cache_predicoes.db', assincrono=True, **kwargs):
+    """
+    DefesaPredictor partilhado por todas as páginas
+
+    Os argumentos só são usados na primeira chamada (a que carrega o modelo).
+    Com DT_SCORING_SOCKETS definida, o predictor fica em modo cliente dos
+    daemons de scoring (models/servidor_scoring.py). Se os metadados do
+    modelo mudarem em disco, o novo modelo é carregado e trocado a quente;
+    o candidato do registo, se houver, é pontuado em sombra.
+
+    Uso:
+        predictor = obter_defesa()
+        grid = predictor.predict_grid(grs, 9.0, 95, 42, 0)
+    """
+    from models.predictor_defesa import DefesaPredictor
+    from models.registo_modelos import RegistoModelos
+    kwargs.setdefault('servidor', _sockets_padrao())
+    kwargs.setdefault('intervalo_recarga', INTERVALO_RECARGA)
+
+    def criar():
+        # Candidato do registo pontuado em sombra (python models/registo_modelos.py candidato defesa N);
+        # o registo só é lido quando o predictor é criado, não a cada chamada
+        if kwargs['servidor'] is None:
+            kwargs.setdefault('candidato', RegistoModelos(model_dir).candidato('defesa'))
+        return DefesaPredictor(model_dir=model_dir, cache_db=cache_db, assincrono=assincrono, **kwargs)
+
+    return _obter('defesa', model_dir, criar)
+
+
+def obter_compatibilidade(model_dir='models', cache_db='models/cache_predicoes.db', **kwargs):
+    """CompatibilidadePredictor partilhado (carregado na primeira chamada)"""
+    from models.predictor_compatibilidade import CompatibilidadePredictor
+    kwargs.setdefault('servidor', _sockets_padrao())
+    kwargs.setdefault('intervalo_recarga', INTERVALO_RECARGA)
+    return _obter('compatibilidade', model_dir, lambda: CompatibilidadePredictor(
+        model_dir=model_dir, cache_db=cache_db, **kwargs
+    ))
+
+
+def estado():
+    """Resumo do que está carregado neste processo"""
+    with _lock:
+        return {
+            'h2o_ligado': _h2o['ligado'],
+            'h2o_iniciado_aqui': _h2o['iniciado_aqui'],
+            'predictores': [f"{tipo}: {pasta}" for tipo, pasta in _predictores]
+        }
+
+
+def encerrar():
+    """Liberta os predictors (vigia, coalescedor, sombra) e desliga o cluster (se foi iniciado aqui)"""
+    with _lock:
+        for predictor in _predictores.values():
+            predictor.shutdown()
+        _predictores.clear()
+        desligar_h2o()
@@ -0,0 +1,160 @@
+"""
+INCERTEZA - Intervalos bootstrap das grelhas 3x3 de defesa
+Um ensemble de regressões logísticas reajustadas em reamostragens bootstrap
+dos lances (mesmas features do modelo de defesa) dá a variabilidade de
+amostragem de cada predição; todos os membros são avaliados numa única
+multiplicação de matrizes, rápida o suficiente para cada rerun do Timeout
+"""
+
+import json
+import sys
+import numpy as np
+from pathlib import Path
+
+# Permite correr este ficheiro diretamente (python models/<ficheiro>.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from models.modelo_fallback import (
+    ModeloLogistico, ajustar_logistica, assinatura_features, carregar_lances
+)
+
+FICHEIRO = 'modelo_defesa_bootstrap.npz'
+
+
+class EnsembleBootstrap:
+    """
+    B regressões logísticas (coeficientes em linhas de uma matriz)
+
+    As predições do ensemble não substituem as do modelo principal: dão os
+    desvios (em log-odds) à volta dele - ver intervalos().
+
+    Uso:
+        ensemble = EnsembleBootstrap.treinar('handball_dt.db', metadata, n_modelos=200)
+        amostras = ensemble.amostras(colunas, p_modelo)   # (B, n) em 0-1
+    """
+
+    def __init__(self, base, coefs):
+        """
+        Args:
+            base (ModeloLogistico): Ajuste com todos os lances (normalização e níveis)
+            coefs (np.ndarray): (B, 1 + n_coef) com o intercepto na 1ª coluna
+        """
+        self.base = base
+        self.coefs = np.asarray(coefs, dtype=float)
+        self.features_hash = base.features_hash
+
+    @classmethod
+    def treinar(cls, db_path, metadata, n_modelos=200, seed=42):
+        """Ajusta o modelo base e os n_modelos reamostrados (mesma matriz de desenho)"""
+        colunas, y, categoricas, dominios = carregar_lances(db_path, metadata)
+        base = ModeloLogistico.treinar(colunas, y, categoricas, dominios)
+        base.features_hash = assinatura_features(metadata)
+
+        D1 = base.desenho(base.matriz(colunas))
+        y = np.asarray(y, dtype=float)
+        inicio = np.concatenate([[base.intercepto], base.coef])
+
+        rng = np.random.default_rng(seed)
+        coefs = np.empty((n_modelos, D1.shape[1]))
+        for b in range(n_modelos):
+            i = rng.integers(0, len(y), len(y))
+            coefs[b] = ajustar_logistica(D1[i], y[i], beta=inicio, iteracoes=10)
+        return cls(base, coefs)
+
+    def logits(self, colunas):
+        """Log-odds de cada membro, shape (B, n)"""
+        D1 = self.base.desenho(self.base.matriz(colunas))
+        return self.coefs @ D1.T
+
+    def amostras(self, colunas, p_modelo):
+        """
+        Distribuição bootstrap das predições do modelo principal
+
+        Cada membro desloca o log-odds do modelo principal pelo seu desvio
+        em relação à média do ensemble.
+
+        Args:
+            colunas (dict): Features (já transformadas pelo pipeline)
+            p_modelo (np.ndarray): Predições do modelo principal (0-1), uma por linha
+
+        Returns:
+            np.ndarray: (B, n) em 0-1
+        """
+        L = self.logits(colunas)
+        p = np.clip(np.asarray(p_modelo, dtype=float), 1e-4, 1 - 1e-4)
+        logit_modelo = np.log(p / (1 - p))
+        return 1.0 / (1.0 + np.exp(-(logit_modelo + (L - L.mean(axis=0)))))
+
+    def guardar(self, destino):
+        """Base (.npz do ModeloLogistico) e coeficientes num só ficheiro"""
+        base = self.base
+        meta = {
+            'nomes': base.nomes, 'dominios': base.dominios, 'categoricas': base.categoricas,
+            'niveis': {n: v.tolist() for n, v in base.niveis.items()},
+            'intercepto': base.intercepto, 'n_treino': base.n_treino,
+            'features_hash': base.features_hash
+        }
+        np.savez(destino, meta=np.array(json.dumps(meta)), media=base.media,
+                 desvio=base.desvio, coef=base.coef, coefs=self.coefs)
+
+    @classmethod
+    def carregar(cls, caminho):
+        with np.load(caminho, allow_pickle=False) as f:
+            arrays = {k: f[k] for k in f.files}
+        coefs = arrays.pop('coefs')
+        meta = json.loads(str(arrays.pop('meta')))
+        return cls(ModeloLogistico({**arrays, **meta}), coefs)
+
+
+def obter_ensemble(model_dir, metadata, db_path='handball_dt.db'):
+    """Ensemble das features atuais: lê o .npz se corresponder, senão treina-o (e tenta guardá-lo)"""
+    caminho = Path(model_dir) / FICHEIRO
+    if caminho.exists():
+        ensemble = EnsembleBootstrap.carregar(caminho)
+        if ensemble.features_hash == assinatura_features(metadata):
+            return ensemble
+
+    ensemble = EnsembleBootstrap.treinar(db_path, metadata)
+    try:
+        ensemble.guardar(caminho)
+    except OSError as e:
+        print(f"⚠️ Ensemble bootstrap não guardado ({e})")
+    return ensemble
+
+
+def prob_superioridade(amostras, pesos=None):
+    """
+    P(GR i tem média de defesa superior à do GR j) para todos os pares
+
+    Args:
+        amostras (np.ndarray): (B, n_gr, 3, 3)
+        pesos (np.ndarray | None): Peso de cada zona (3, 3), ex.: distribuição
+            de remates do adversário (None = média simples)
+
+    Returns:
+        np.ndarray: (n_gr, n_gr), P[i, j]; diagonal = 0.5
+    """
+    pesos = np.full((3, 3), 1 / 9) if pesos is None else np.asarray(pesos) / np.sum(pesos)
+    medias = (amostras * pesos).sum(axis=(-2, -1))
+    P = (medias[:, :, None] > medias[:, None, :]).mean(axis=0)
+    P[np.diag_indices_from(P)] = 0.5
+    return P
+
+
+# TREINO DO ENSEMBLE
+if __name__ == "__main__":
+    import time
+
+    model_dir = Path(__file__).parent
+    db_path = model_dir.parent / 'handball_dt.db'
+
+    print("="*60)
+    print("ENSEMBLE BOOTSTRAP (INTERVALOS DAS GRELHAS)")
+    print("="*60)
+
+    with open(model_dir / 'modelo_defesa_metadata.json', 'r') as f:
+        metadata = json.load(f)
+
+    inicio = time.perf_counter()
+    ensemble = EnsembleBootstrap.treinar(db_path, metadata)
+    ensemble.guardar(model_dir / FICHEIRO)
+    print(f"✅ {FICHEIRO}: {len(ensemble.coefs)} modelos em {time.perf_counter() - inicio:.1f}s")
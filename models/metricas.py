@@ -0,0 +1,128 @@
+"""
+MÉTRICAS - Latência por etapa das predições
+Histogramas com buckets logarítmicos (memória fixa) por etapa (frame, upload,
+predict, download, ...) e contadores de chamadas, linhas e erros
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+
+
+# Limites dos buckets: 1 µs a 100 s, ~5% de resolução
+LIMITES = np.geomspace(1e-6, 100.0, 380)
+
+
+class Histograma:
+    """
+    Histograma de durações (segundos) com percentis aproximados
+
+    Uso:
+        h = Histograma()
+        h.registar(0.012)
+        h.percentil(95)   # segundos
+    """
+
+    def __init__(self):
+        self.contagens = np.zeros(len(LIMITES) + 1, dtype=np.int64)
+        self.n = 0
+        self.total = 0.0
+        self.maximo = 0.0
+
+    def registar(self, segundos):
+        self.contagens[np.searchsorted(LIMITES, segundos)] += 1
+        self.n += 1
+        self.total += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def percentil(self, p):
+        """Limite superior do bucket onde cai o percentil p (0-100)"""
+        if self.n == 0:
+            return 0.0
+        i = int(np.searchsorted(np.cumsum(self.contagens), np.ceil(self.n * p / 100)))
+        return min(float(LIMITES[min(i, len(LIMITES) - 1)]), self.maximo)
+
+    def resumo(self):
+        """n, média, p50/p95/p99 e máximo em milissegundos"""
+        return {
+            'n': self.n,
+            'media_ms': 1000 * self.total / self.n if self.n else 0.0,
+            'p50_ms': 1000 * self.percentil(50),
+            'p95_ms': 1000 * self.percentil(95),
+            'p99_ms': 1000 * self.percentil(99),
+            'max_ms': 1000 * self.maximo
+        }
+
+
+class Metricas:
+    """
+    Histogramas por etapa + contadores de um predictor (thread-safe)
+
+    Uso:
+        metricas = Metricas(orcamento_ms=250)
+        with metricas.etapa('predict'):
+            pred = model.predict(frame)
+        print(metricas.stats())
+    """
+
+    def __init__(self, orcamento_ms=None):
+        """
+        Args:
+            orcamento_ms (float | None): Orçamento de latência de uma chamada
+                completa (etapa 'total'); as chamadas acima são contadas
+        """
+        self.orcamento_ms = orcamento_ms
+        self._lock = threading.Lock()
+        self.limpar()
+
+    def limpar(self):
+        """Recomeça todos os histogramas e contadores"""
+        with self._lock:
+            self.etapas = {}
+            self.chamadas = 0
+            self.linhas = 0
+            self.erros = 0
+            self.acima_orcamento = 0
+
+    def registar(self, nome, segundos):
+        """Acrescenta uma duração ao histograma da etapa"""
+        with self._lock:
+            self.etapas.setdefault(nome, Histograma()).registar(segundos)
+            if nome == 'total' and self.orcamento_ms is not None and segundos * 1000 > self.orcamento_ms:
+                self.acima_orcamento += 1
+
+    @contextmanager
+    def etapa(self, nome):
+        """Mede o bloco e regista-o na etapa (também quando há exceção)"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registar(nome, time.perf_counter() - inicio)
+
+    @contextmanager
+    def chamada(self, n_linhas):
+        """Uma chamada completa: conta chamada, linhas e erros e mede a etapa 'total'"""
+        with self._lock:
+            self.chamadas += 1
+            self.linhas += n_linhas
+        try:
+            with self.etapa('total'):
+                yield
+        except Exception:
+            with self._lock:
+                self.erros += 1
+            raise
+
+    def stats(self):
+        """Contadores e resumo (ms) de cada etapa"""
+        with self._lock:
+            return {
+                'chamadas': self.chamadas,
+                'linhas': self.linhas,
+                'erros': self.erros,
+                'orcamento_ms': self.orcamento_ms,
+                'acima_orcamento': self.acima_orcamento,
+                'etapas': {nome: h.resumo() for nome, h in self.etapas.items()}
+            }
@@ -0,0 +1,281 @@
+"""
+MODELO DE RECURSO - Regressão logística em NumPy treinada a partir dos lances
+Usado quando o H2O não está instalado ou o cluster não arranca (e como modo
+rápido, motor='logistico'): mesmas features dos metadados do modelo de defesa,
+guardado como arrays num .npz e com a mesma interface do MotorGBM
+"""
+
+import json
+import sqlite3
+import sys
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Permite correr este ficheiro diretamente (python models/<ficheiro>.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import snapshot_lances
+from models.pipeline_features import FASES, PipelineFeatures
+
+FICHEIRO = 'modelo_defesa_fallback.npz'
+
+QUERY_LANCES = """
+SELECT
+    l.zona_baliza_id,
+    l.distancia_remate_m,
+    l.velocidade_remate_kmh,
+    l.minuto_jogo,
+    l.diferenca_golos_momento,
+    gr.altura_cm,
+    gr.envergadura_cm,
+    gr.velocidade_lateral_ms,
+    CASE WHEN l.resultado = 'Defesa' THEN 1 ELSE 0 END as defesa
+FROM lances l
+JOIN jogos j ON l.jogo_id = j.id
+JOIN guarda_redes gr ON j.guarda_redes_id = gr.id
+"""
+
+COLUNAS_LANCES = [
+    'zona_baliza_id', 'distancia_remate_m', 'velocidade_remate_kmh', 'minuto_jogo',
+    'diferenca_golos_momento', 'altura_cm', 'envergadura_cm', 'velocidade_lateral_ms', 'defesa'
+]
+
+
+def auc(y, p):
+    """Área sob a curva ROC (estatística de Mann-Whitney, empates a meio)"""
+    y = np.asarray(y, dtype=bool)
+    ordem = pd.Series(p).rank().to_numpy()
+    n1, n0 = y.sum(), (~y).sum()
+    if n1 == 0 or n0 == 0:
+        return float('nan')
+    return float((ordem[y].sum() - n1 * (n1 + 1) / 2) / (n1 * n0))
+
+
+def ajustar_logistica(D1, y, l2=1.0, beta=None, iteracoes=50):
+    """
+    Newton-Raphson da regressão logística penalizada (L2, exceto o intercepto)
+
+    Args:
+        D1 (np.ndarray): Matriz de desenho com a coluna de 1s primeiro
+        y (np.ndarray): 1 = defesa, 0 = golo
+        l2 (float): Penalização dos coeficientes
+        beta (np.ndarray | None): Ponto de partida (None = só o intercepto)
+        iteracoes (int): Máximo de passos
+
+    Returns:
+        np.ndarray: [intercepto, coeficientes...]
+    """
+    if beta is None:
+        beta = np.zeros(D1.shape[1])
+        beta[0] = np.log(y.mean() / (1 - y.mean()))
+    beta = np.array(beta, dtype=float)
+    penal = np.full(D1.shape[1], l2)
+    penal[0] = 0.0
+
+    for _ in range(iteracoes):
+        p = 1.0 / (1.0 + np.exp(-(D1 @ beta)))
+        gradiente = D1.T @ (y - p) - penal * beta
+        hessiana = (D1 * (p * (1 - p))[:, None]).T @ D1 + np.diag(penal)
+        passo = np.linalg.solve(hessiana, gradiente)
+        beta += passo
+        if np.abs(passo).max() < 1e-8:
+            break
+    return beta
+
+
+class ModeloLogistico:
+    """
+    Regressão logística com penalização L2 (Newton-Raphson em NumPy)
+
+    Colunas categóricas (zona e fase) entram como indicadores por nível; as
+    numéricas são padronizadas. Mesma interface que o MotorGBM (nomes,
+    dominios, matriz, prever), por isso o DefesaPredictor usa-o como motor.
+
+    Uso:
+        modelo = ModeloLogistico.treinar(colunas, y, categoricas=['zona_baliza_id'])
+        modelo.guardar('models/modelo_defesa_fallback.npz')
+        p1 = modelo.prever(modelo.matriz(colunas))
+    """
+
+    def __init__(self, arrays):
+        self.nomes = list(arrays['nomes'])
+        self.dominios = dict(arrays.get('dominios', {}))
+        self.categoricas = list(arrays['categoricas'])
+        self.niveis = {n: np.asarray(v, dtype=float) for n, v in arrays['niveis'].items()}
+        self.media = np.asarray(arrays['media'], dtype=float)
+        self.desvio = np.asarray(arrays['desvio'], dtype=float)
+        self.coef = np.asarray(arrays['coef'], dtype=float)
+        self.intercepto = float(arrays['intercepto'])
+        self.auc = arrays.get('auc')
+        self.n_treino = arrays.get('n_treino')
+        self.features_hash = arrays.get('features_hash')
+
+    @classmethod
+    def treinar(cls, colunas, y, categoricas=('zona_baliza_id',), dominios=None, l2=1.0, iteracoes=50):
+        """
+        Ajusta o modelo às colunas (ordem das colunas = ordem das features)
+
+        Args:
+            colunas (dict): feature -> valores (já transformados pelo pipeline)
+            y (array): 1 = defesa, 0 = golo
+            categoricas (list): Features tratadas como níveis
+            dominios (dict | None): Níveis de texto das categóricas (ex.: fase_jogo)
+            l2 (float): Penalização dos coeficientes (não do intercepto)
+            iteracoes (int): Máximo de passos de Newton
+        """
+        nomes = list(colunas)
+        modelo = cls({
+            'nomes': nomes, 'dominios': dominios or {}, 'categoricas': list(categoricas),
+            'niveis': {}, 'media': np.zeros(len(nomes)), 'desvio': np.ones(len(nomes)),
+            'coef': np.zeros(0), 'intercepto': 0.0
+        })
+        X = modelo.matriz(colunas)
+        y = np.asarray(y, dtype=float)
+
+        for j, nome in enumerate(nomes):
+            if nome in modelo.categoricas:
+                modelo.niveis[nome] = np.unique(X[~np.isnan(X[:, j]), j])
+            else:
+                modelo.media[j] = np.nanmean(X[:, j])
+                modelo.desvio[j] = np.nanstd(X[:, j]) or 1.0
+
+        beta = ajustar_logistica(modelo.desenho(X), y, l2, iteracoes=iteracoes)
+
+        modelo.intercepto, modelo.coef = float(beta[0]), beta[1:]
+        modelo.n_treino = len(y)
+        return modelo
+
+    def matriz(self, colunas):
+        """Matriz (n, n_features) na ordem do modelo; categóricas de texto pelo índice no domínio"""
+        n = len(next(iter(colunas.values())))
+        X = np.full((n, len(self.nomes)), np.nan)
+        for j, nome in enumerate(self.nomes):
+            if nome not in colunas:
+                continue
+            valores = np.asarray(colunas[nome])
+            if nome in self.dominios:
+                indice = {nivel: k for k, nivel in enumerate(self.dominios[nome])}
+                X[:, j] = [indice.get(str(v), np.nan) for v in valores]
+            else:
+                X[:, j] = valores.astype(float)
+        return X
+
+    def desenho(self, X, intercepto=True):
+        """Matriz de desenho: [1s,] indicadores por nível + numéricas padronizadas (NaN -> média)"""
+        blocos = []
+        for j, nome in enumerate(self.nomes):
+            if nome in self.categoricas:
+                blocos.append((X[:, [j]] == self.niveis[nome][None, :]).astype(float))
+            else:
+                z = (X[:, j] - self.media[j]) / self.desvio[j]
+                blocos.append(np.nan_to_num(z)[:, None])
+        if intercepto:
+            blocos.insert(0, np.ones((len(X), 1)))
+        return np.hstack(blocos)
+
+    def prever(self, X):
+        """p1 (0-1)"""
+        D = self.desenho(np.asarray(X, dtype=float), intercepto=False)
+        return 1.0 / (1.0 + np.exp(-(D @ self.coef + self.intercepto)))
+
+    def guardar(self, destino):
+        """Guarda coeficientes e normalização como arrays + metadados JSON num .npz"""
+        meta = {
+            'nomes': self.nomes, 'dominios': self.dominios, 'categoricas': self.categoricas,
+            'niveis': {n: v.tolist() for n, v in self.niveis.items()},
+            'intercepto': self.intercepto, 'auc': self.auc, 'n_treino': self.n_treino,
+            'features_hash': self.features_hash
+        }
+        np.savez(destino, meta=np.array(json.dumps(meta)), media=self.media, desvio=self.desvio, coef=self.coef)
+
+    @classmethod
+    def carregar(cls, caminho):
+        """Carrega um .npz criado por guardar"""
+        with np.load(caminho, allow_pickle=False) as f:
+            arrays = {k: f[k] for k in f.files}
+        meta = json.loads(str(arrays.pop('meta')))
+        return cls({**arrays, **meta})
+
+
+def assinatura_features(metadata):
+    """Identifica as features/transformação dos metadados (o modelo de recurso é retreinado se mudar)"""
+    chaves = ['features', 'temporal_feature', 'fadiga_formula', 'fases']
+    return json.dumps({k: (metadata or {}).get(k) for k in chaves}, sort_keys=True)
+
+
+def carregar_lances(db_path, metadata):
+    """
+    Lances ⨝ guarda_redes já com as features dos metadados (do snapshot
+    Parquet se estiver atualizado, senão da base de dados)
+
+    Returns:
+        tuple: (colunas, y, categoricas, dominios)
+    """
+    pipeline = PipelineFeatures.compilar(metadata)
+    if snapshot_lances.atualizado(db_path):
+        df = snapshot_lances.ler_lances(colunas=COLUNAS_LANCES)
+    else:
+        with sqlite3.connect(db_path) as conn:
+            df = pd.read_sql_query(QUERY_LANCES, conn)
+
+    colunas = pipeline.transformar(df.rename(columns={'minuto_jogo': 'minuto'}))
+    y = df['defesa'].to_numpy()
+    categoricas = ['zona_baliza_id'] + (['fase_jogo'] if pipeline.temporal == 'fase_jogo' else [])
+    dominios = {'fase_jogo': FASES} if pipeline.temporal == 'fase_jogo' else {}
+    return colunas, y, categoricas, dominios
+
+
+def treinar_de_lances(db_path, metadata, seed=42):
+    """
+    Treina o modelo de recurso com lances ⨝ guarda_redes e as features dos metadados
+
+    A AUC guardada é a de uma divisão 80/20 (mesma proporção do treino H2O);
+    o modelo final é ajustado com todos os lances.
+    """
+    colunas, y, categoricas, dominios = carregar_lances(db_path, metadata)
+
+    teste = np.random.default_rng(seed).random(len(y)) >= 0.8
+    parcial = ModeloLogistico.treinar({n: v[~teste] for n, v in colunas.items()}, y[~teste], categoricas, dominios)
+    auc_teste = auc(y[teste], parcial.prever(parcial.matriz({n: v[teste] for n, v in colunas.items()})))
+
+    modelo = ModeloLogistico.treinar(colunas, y, categoricas, dominios)
+    modelo.auc = auc_teste
+    modelo.features_hash = assinatura_features(metadata)
+    return modelo
+
+
+def obter_fallback(model_dir, metadata, db_path='handball_dt.db'):
+    """
+    Modelo de recurso das features atuais: lê o .npz se corresponder aos
+    metadados, senão treina-o a partir dos lances (e tenta guardá-lo)
+    """
+    caminho = Path(model_dir) / FICHEIRO
+    if caminho.exists():
+        modelo = ModeloLogistico.carregar(caminho)
+        if modelo.features_hash == assinatura_features(metadata):
+            return modelo
+
+    modelo = treinar_de_lances(db_path, metadata)
+    try:
+        modelo.guardar(caminho)
+    except OSError as e:
+        print(f"⚠️ Modelo de recurso não guardado ({e})")
+    return modelo
+
+
+# TREINO DO MODELO DE RECURSO
+if __name__ == "__main__":
+    model_dir = Path(__file__).parent
+    db_path = model_dir.parent / 'handball_dt.db'
+
+    print("="*60)
+    print("MODELO DE RECURSO (REGRESSÃO LOGÍSTICA NUMPY)")
+    print("="*60)
+
+    with open(model_dir / 'modelo_defesa_metadata.json', 'r') as f:
+        metadata = json.load(f)
+
+    modelo = treinar_de_lances(db_path, metadata)
+    modelo.guardar(model_dir / FICHEIRO)
+    print(f"✅ {FICHEIRO}: {modelo.n_treino} lances, AUC teste = {modelo.auc:.3f} "
+          f"(GBM H2O: {metadata.get('auc', float('nan')):.3f})")
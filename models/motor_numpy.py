@@ -0,0 +1,262 @@
+"""
+MOTOR NUMPY - Scoring in-process dos GBM exportados do H2O
+Exporta as árvores do líder AutoML para arrays NumPy (.npz) e avalia-as
+de forma vetorizada, sem JVM nem cluster H2O
+"""
+
+import json
+import ntpath
+import numpy as np
+from pathlib import Path
+
+
+def caminho_npz(model_dir, model_path):
+    """Caminho do .npz exportado para um artefacto H2O (mesmo nome + .npz)"""
+    # ntpath.basename aceita tanto caminhos Windows como POSIX
+    return Path(model_dir) / f"{ntpath.basename(model_path)}.npz"
+
+
+def exportar_gbm(model, destino, n_verificacao=256, seed=42):
+    """
+    Exporta um GBM H2O (bernoulli ou gaussian) para um .npz
+
+    As árvores são lidas com a API H2OTree. O resultado é verificado contra
+    model.predict numa amostra aleatória; a diferença constante em log-odds
+    (correção de priors do balance_classes) é guardada em 'correcao_logit'.
+
+    Args:
+        model: Modelo H2O GBM já carregado no cluster
+        destino (str | Path): Ficheiro .npz a criar
+        n_verificacao (int): Linhas da amostra de verificação
+        seed (int): Semente da amostra de verificação
+
+    Returns:
+        Path: Caminho do ficheiro criado
+    """
+    import h2o
+    from h2o.tree import H2OTree
+
+    if model.algo != 'gbm':
+        raise ValueError(f"Só modelos GBM podem ser exportados (recebido: {model.algo})")
+
+    output = model._model_json['output']
+    resposta = model.actual_params['response_column']
+    nomes = [n for n in output['names'] if n != resposta]
+    dominios = {n: d for n, d in zip(output['names'], output['domains']) if d and n != resposta}
+    distribuicao = model.actual_params['distribution']
+    if distribuicao not in ('bernoulli', 'gaussian'):
+        raise ValueError(f"Distribuição não suportada: {distribuicao}")
+
+    arvores = [H2OTree(model, i) for i in range(int(model.summary()['number_of_trees'][0]))]
+    n_nos = max(len(t) for t in arvores)
+    n_niveis = max([len(d) for d in dominios.values()] or [0])
+    n_arvores = len(arvores)
+
+    feature = np.full((n_arvores, n_nos), -1, dtype=np.int16)
+    limiar = np.full((n_arvores, n_nos), np.nan)
+    esq = np.zeros((n_arvores, n_nos), dtype=np.int32)
+    dir_ = np.zeros((n_arvores, n_nos), dtype=np.int32)
+    na_esq = np.zeros((n_arvores, n_nos), dtype=bool)
+    valor = np.zeros((n_arvores, n_nos))
+    cat_esq = np.zeros((n_arvores, n_nos, n_niveis), dtype=bool)
+
+    for a, t in enumerate(arvores):
+        for i in range(len(t)):
+            valor[a, i] = t.predictions[i] if t.predictions[i] is not None else 0.0
+            if t.left_children[i] == -1:
+                continue
+            nome = t.features[i]
+            feature[a, i] = nomes.index(nome)
+            esq[a, i] = t.left_children[i]
+            dir_[a, i] = t.right_children[i]
+            # Sem direção NA aprendida, o H2O envia NA para a esquerda
+            na_esq[a, i] = t.nas[i] != 'RIGHT'
+            if nome in dominios:
+                niveis_esq = set(t.levels[t.left_children[i]] or [])
+                cat_esq[a, i, :len(dominios[nome])] = [d in niveis_esq for d in dominios[nome]]
+            else:
+                limiar[a, i] = t.thresholds[i]
+
+    motor = MotorGBM({
+        'nomes': nomes, 'dominios': dominios, 'distribuicao': distribuicao,
+        'init_f': float(output['init_f']), 'correcao_logit': 0.0,
+        'feature': feature, 'limiar': limiar, 'esq': esq, 'dir': dir_,
+        'na_esq': na_esq, 'valor': valor, 'cat_esq': cat_esq
+    })
+
+    # Amostra de verificação à volta dos limiares observados nas árvores
+    rng = np.random.default_rng(seed)
+    amostra = {}
+    for j, nome in enumerate(nomes):
+        if nome in dominios:
+            amostra[nome] = rng.choice(dominios[nome], n_verificacao).tolist()
+        else:
+            lim = limiar[(feature == j) & ~np.isnan(limiar)]
+            lo, hi = (lim.min() - 1, lim.max() + 1) if lim.size else (0.0, 1.0)
+            valores = rng.uniform(lo, hi, n_verificacao)
+            # ~10% de NA para verificar também a direção dos valores em falta
+            amostra[nome] = [None if rng.random() < 0.1 else v for v in valores]
+
+    pred = model.predict(h2o.H2OFrame(amostra, column_types={n: 'enum' for n in dominios}))
+    coluna = 'p1' if distribuicao == 'bernoulli' else 'predict'
+    esperado = pred[coluna].as_data_frame(use_pandas=True)[coluna].to_numpy(dtype=float)
+
+    X = motor.matriz(amostra)
+    if distribuicao == 'bernoulli':
+        esperado = np.clip(esperado, 1e-12, 1 - 1e-12)
+        desvio = np.log(esperado / (1 - esperado)) - motor.margem(X)
+        motor.correcao_logit = float(np.median(desvio))
+
+    erro = np.abs(motor.prever(X) - esperado).max()
+    if erro > 1e-5 * max(1.0, np.abs(esperado).max()):
+        raise RuntimeError(f"Exportação não reproduz o H2O (erro máximo {erro:.2e})")
+
+    motor.guardar(destino, model_id=model.model_id)
+    print(f"✅ {n_arvores} árvores exportadas para {destino} (erro máx. {erro:.1e})")
+    return Path(destino)
+
+
+class MotorGBM:
+    """
+    Avaliação vetorizada de um GBM exportado
+
+    Todas as árvores são percorridas em simultâneo: em cada nível de
+    profundidade, cada par (árvore, linha) desce um nó.
+
+    Uso:
+        motor = MotorGBM.carregar('models/GBM_5_AutoML_2_20260108_195427.npz')
+        X = motor.matriz({'zona_baliza_id': [5], ...})
+        probs = motor.prever(X)
+    """
+
+    def __init__(self, arrays):
+        self.nomes = list(arrays['nomes'])
+        self.dominios = dict(arrays['dominios'])
+        self.distribuicao = arrays['distribuicao']
+        self.init_f = float(arrays['init_f'])
+        self.correcao_logit = float(arrays['correcao_logit'])
+        self.model_id = arrays.get('model_id')
+        self.feature = arrays['feature'].astype(np.intp)
+        self.limiar = arrays['limiar']
+        self.esq = arrays['esq'].astype(np.intp)
+        self.dir = arrays['dir'].astype(np.intp)
+        self.na_esq = arrays['na_esq']
+        self.valor = arrays['valor']
+        self.cat_esq = arrays['cat_esq']
+        self.profundidade = self._calcular_profundidade()
+        self._arvores = np.arange(self.feature.shape[0])[:, None]
+
+    @classmethod
+    def carregar(cls, caminho):
+        """Carrega um .npz criado por exportar_gbm"""
+        with np.load(caminho, allow_pickle=False) as f:
+            arrays = {k: f[k] for k in f.files}
+        meta = json.loads(str(arrays.pop('meta')))
+        return cls({**arrays, **meta})
+
+    def guardar(self, destino, model_id=None):
+        """Guarda arrays + metadados JSON num único .npz"""
+        meta = {
+            'nomes': self.nomes, 'dominios': self.dominios,
+            'distribuicao': self.distribuicao, 'init_f': self.init_f,
+            'correcao_logit': self.correcao_logit, 'model_id': model_id or self.model_id
+        }
+        np.savez_compressed(
+            destino, meta=np.array(json.dumps(meta)),
+            feature=self.feature.astype(np.int16), limiar=self.limiar,
+            esq=self.esq.astype(np.int32), dir=self.dir.astype(np.int32),
+            na_esq=self.na_esq, valor=self.valor, cat_esq=self.cat_esq
+        )
+
+    def _calcular_profundidade(self):
+        """Profundidade máxima (número de descidas até à folha mais funda)"""
+        arvores = np.arange(self.feature.shape[0])
+        nos = np.zeros_like(arvores)
+        profundidade = 0
+        while True:
+            interno = self.feature[arvores, nos] >= 0
+            if not interno.any():
+                return profundidade
+            a, n = arvores[interno], nos[interno]
+            arvores = np.concatenate([a, a])
+            nos = np.concatenate([self.esq[a, n], self.dir[a, n]])
+            profundidade += 1
+
+    def matriz(self, colunas):
+        """
+        Constrói a matriz (n, n_features) na ordem do modelo
+
+        Colunas categóricas são codificadas pelo índice no domínio do modelo
+        (níveis desconhecidos -> NaN). Colunas em falta ficam a NaN, tal como
+        o H2O faz em model.predict.
+        """
+        n = len(next(iter(colunas.values())))
+        X = np.full((n, len(self.nomes)), np.nan)
+        for j, nome in enumerate(self.nomes):
+            if nome not in colunas:
+                continue
+            valores = np.asarray(colunas[nome])
+            if nome in self.dominios:
+                indice = {nivel: k for k, nivel in enumerate(self.dominios[nome])}
+                X[:, j] = [indice.get(str(v), np.nan) for v in valores]
+            else:
+                X[:, j] = valores.astype(float)
+        return X
+
+    def margem(self, X):
+        """Soma das árvores + init_f (log-odds em bernoulli, valor em gaussian)"""
+        X = np.asarray(X, dtype=float)
+        linhas = np.arange(X.shape[0])[None, :]
+        nos = np.zeros((self.feature.shape[0], X.shape[0]), dtype=np.intp)
+
+        for _ in range(self.profundidade):
+            feat = self.feature[self._arvores, nos]
+            interno = feat >= 0
+            x = X[linhas, np.where(interno, feat, 0)]
+
+            nan = np.isnan(x)
+            vai_esq = np.where(nan, self.na_esq[self._arvores, nos], x < self.limiar[self._arvores, nos])
+            if self.cat_esq.shape[2]:
+                categ = interno & np.isnan(self.limiar[self._arvores, nos])
+                nivel = np.where(nan, 0, x).astype(np.intp).clip(0, self.cat_esq.shape[2] - 1)
+                vai_esq = np.where(categ & ~nan, self.cat_esq[self._arvores, nos, nivel], vai_esq)
+
+            proximo = np.where(vai_esq, self.esq[self._arvores, nos], self.dir[self._arvores, nos])
+            nos = np.where(interno, proximo, nos)
+
+        return self.init_f + self.valor[self._arvores, nos].sum(axis=0)
+
+    def prever(self, X):
+        """p1 (0-1) em bernoulli, valor previsto em gaussian"""
+        f = self.margem(X)
+        if self.distribuicao == 'bernoulli':
+            return 1.0 / (1.0 + np.exp(-(f + self.correcao_logit)))
+        return f
+
+
+# EXPORTAÇÃO DOS MODELOS ATUAIS
+if __name__ == "__main__":
+    import sys
+    import h2o
+
+    model_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parent
+
+    print("="*60)
+    print("EXPORTAÇÃO DAS ÁRVORES PARA O MOTOR NUMPY")
+    print("="*60)
+
+    h2o.init(max_mem_size="2G", verbose=False)
+
+    for nome_meta in ['modelo_defesa_metadata.json', 'modelo_compatibilidade_metadata.json']:
+        metadata_path = model_dir / nome_meta
+        if not metadata_path.exists():
+            continue
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+
+        artefacto = model_dir / ntpath.basename(metadata['model_path'])
+        print(f"\n📦 {artefacto.name}")
+        model = h2o.load_model(str(artefacto))
+        exportar_gbm(model, caminho_npz(model_dir, metadata['model_path']))
+
+    h2o.cluster().shutdown(prompt=False)
@@ -0,0 +1,161 @@
+"""
+PIPELINE DE FEATURES - Transformação compilada a partir dos metadados do modelo
+Lê features, temporal_feature e fadiga_formula/fases do JSON de metadados,
+valida-os contra o modelo carregado e converte colunas de entrada (com o
+minuto do jogo) nas colunas que o modelo espera, de forma vetorizada
+"""
+
+import numpy as np
+
+
+# Features do modelo V3 (metadados antigos sem lista de features)
+FEATURES_PADRAO = [
+    'zona_baliza_id', 'distancia_remate_m', 'velocidade_remate_kmh', 'fase_jogo',
+    'diferenca_golos_momento', 'altura_cm', 'envergadura_cm', 'velocidade_lateral_ms'
+]
+
+# Colunas de entrada que passam diretamente para o modelo
+FEATURES_BASE = {
+    'zona_baliza_id', 'distancia_remate_m', 'velocidade_remate_kmh',
+    'diferenca_golos_momento', 'altura_cm', 'envergadura_cm', 'velocidade_lateral_ms'
+}
+
+# Fases do modelo V3 e limite superior (minuto) de cada uma
+FASES = ['inicio', 'meio_1', 'meio_2', 'final']
+LIMITES_FASES = [15, 30, 45, 60]
+
+
+def _compilar_formula(formula):
+    """Compila fadiga_formula (expressão em 'minuto') numa função vetorizada"""
+    try:
+        codigo = compile(formula, '<fadiga_formula>', 'eval')
+    except SyntaxError as e:
+        raise ValueError(f"fadiga_formula inválida: {formula!r} ({e})")
+    desconhecidos = set(codigo.co_names) - {'minuto'}
+    if desconhecidos:
+        raise ValueError(f"fadiga_formula só pode usar 'minuto' (encontrado: {sorted(desconhecidos)})")
+
+    def fadiga(minuto):
+        return np.asarray(eval(codigo, {'__builtins__': {}}, {'minuto': minuto}), dtype=float)
+
+    # Falha já no arranque se a fórmula não for avaliável num array
+    valores = fadiga(np.arange(0, 61, dtype=float))
+    if valores.shape != (61,) or not np.isfinite(valores).all():
+        raise ValueError(f"fadiga_formula não produz um valor finito por minuto: {formula!r}")
+    return fadiga
+
+
+def _limites_fases(fases):
+    """Limites superiores a partir de 'fases' dos metadados ('0-15,16-30,...')"""
+    if not fases:
+        return LIMITES_FASES
+    limites = [int(intervalo.split('-')[1]) for intervalo in fases.split(',')]
+    if len(limites) != len(FASES):
+        raise ValueError(f"'fases' deve ter {len(FASES)} intervalos (recebido: {fases!r})")
+    return limites
+
+
+class PipelineFeatures:
+    """
+    Transformação entrada -> features do modelo, compilada uma vez
+
+    Entrada: as features base + 'minuto' (0-60). Saída: dicionário na ordem
+    de metadata['features'], com a feature temporal já calculada.
+
+    Uso:
+        pipeline = PipelineFeatures.compilar(metadata)
+        pipeline.validar(motor.nomes, motor.dominios)
+        colunas = pipeline.transformar({'zona_baliza_id': [5], ..., 'minuto': [42]})
+    """
+
+    def __init__(self, features, temporal, fadiga=None, limites=None):
+        self.features = list(features)
+        self.temporal = temporal
+        self._fadiga = fadiga
+        self._limites = np.asarray(limites if limites is not None else LIMITES_FASES)
+        # Tipos fixos do H2OFrame (evita a inferência/coerção em cada chamada)
+        self.tipos_h2o = {'fase_jogo': 'enum'} if temporal == 'fase_jogo' else {}
+
+    @classmethod
+    def compilar(cls, metadata):
+        """Constrói o pipeline a partir dos metadados; ValueError se forem inconsistentes"""
+        metadata = metadata or {}
+        features = metadata.get('features') or FEATURES_PADRAO
+        temporais = [f for f in features if f not in FEATURES_BASE]
+
+        if len(temporais) > 1 or (temporais and temporais[0] not in ('fadiga', 'fase_jogo')):
+            raise ValueError(f"Features sem transformação conhecida: {temporais}")
+        temporal = temporais[0] if temporais else None
+
+        # O treino escreve 'none' para o modelo V1 (sem feature temporal)
+        declarada = metadata.get('temporal_feature')
+        if declarada == 'none':
+            declarada = None
+        if declarada != temporal and 'temporal_feature' in metadata:
+            raise ValueError(
+                f"temporal_feature={declarada!r} não corresponde às features do modelo ({temporal!r})"
+            )
+
+        if temporal == 'fadiga':
+            if 'fadiga_formula' not in metadata:
+                raise ValueError("Modelo com 'fadiga' mas sem 'fadiga_formula' nos metadados")
+            return cls(features, temporal, fadiga=_compilar_formula(metadata['fadiga_formula']))
+        if temporal == 'fase_jogo':
+            return cls(features, temporal, limites=_limites_fases(metadata.get('fases')))
+        return cls(features, temporal)
+
+    def validar(self, nomes_modelo, dominios=None):
+        """
+        Confirma que o modelo carregado espera exatamente estas features
+
+        Args:
+            nomes_modelo (list): Colunas de entrada do modelo (sem a resposta)
+            dominios (dict | None): Níveis das colunas categóricas do modelo
+        """
+        if set(nomes_modelo) != set(self.features):
+            raise ValueError(
+                f"Features dos metadados não correspondem ao modelo: "
+                f"em falta no modelo {sorted(set(self.features) - set(nomes_modelo))}, "
+                f"em falta nos metadados {sorted(set(nomes_modelo) - set(self.features))}"
+            )
+        dominios = dominios or {}
+        if self.temporal == 'fase_jogo':
+            desconhecidas = set(FASES) - set(dominios.get('fase_jogo') or FASES)
+            if desconhecidas:
+                raise ValueError(f"Fases desconhecidas pelo modelo: {sorted(desconhecidas)}")
+        elif self.temporal == 'fadiga' and 'fadiga' in dominios:
+            raise ValueError("'fadiga' é categórica no modelo, mas fadiga_formula é numérica")
+        return self
+
+    def fase(self, minuto):
+        """Fase categórica de cada minuto"""
+        indice = np.searchsorted(self._limites, np.asarray(minuto, dtype=float), side='left')
+        return np.asarray(FASES)[np.minimum(indice, len(FASES) - 1)]
+
+    def valor_temporal(self, minuto):
+        """Valor da feature temporal para cada minuto (None sem feature temporal)"""
+        if self.temporal == 'fadiga':
+            return self._fadiga(np.asarray(minuto, dtype=float))
+        if self.temporal == 'fase_jogo':
+            return self.fase(minuto)
+        return None
+
+    def transformar(self, entrada):
+        """
+        Colunas do modelo (ordem dos metadados) a partir das colunas de entrada
+
+        Args:
+            entrada (dict): features base + 'minuto' (listas ou arrays)
+
+        Returns:
+            dict: feature -> np.ndarray (float, ou texto para fase_jogo)
+        """
+        colunas = {}
+        for nome in self.features:
+            if nome == self.temporal:
+                if 'minuto' not in entrada:
+                    raise KeyError(f"Coluna 'minuto' necessária para calcular '{nome}'")
+                colunas[nome] = self.valor_temporal(entrada['minuto'])
+            else:
+                colunas[nome] = np.asarray(entrada[nome], dtype=float)
+        return colunas
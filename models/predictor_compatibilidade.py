@@ -3,11 +3,42 @@ PREDICTOR - Modelo de Compatibilidade GR vs Adversário
 Classe para prever taxa de defesa de um GR contra adversário específico
 """
 
-import h2o
-import json
-import os
+try:
+    import h2o
+except ImportError:
+    # Sem H2O: só o motor NumPy (árvores exportadas)
+    h2o = None
+import ntpath
+import threading
+import sqlite3
+import sys
+from datetime import datetime
+import numpy as np
+import pandas as pd
 from pathlib import Path
 
+# Permite correr este ficheiro diretamente (python models/<ficheiro>.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from models.gestor_modelos import desligar_h2o, ligar_h2o, lock_h2o
+from models.cache_predicoes import CacheLRU, CachePersistente, pontuar_com_cache
+from models.metricas import Metricas
+from models.motor_numpy import MotorGBM, caminho_npz
+from models.registo_modelos import carregar_artefacto, carregar_h2o, resolver_artefacto
+from models.recarga import VersaoModelo, VigiaMetadados
+from models.servidor_scoring import ClienteScoring
+
+
+# Colunas do modelo, tal como estão nas tabelas guarda_redes e adversarios
+FEATURES_GR = [
+    'altura_cm', 'envergadura_cm', 'velocidade_lateral_ms',
+    'alcance_vertical_cm', 'agilidade_ttest_s', 'anos_experiencia'
+]
+FEATURES_ADV = [
+    'ranking_liga', 'media_golos_jogo', 'velocidade_media_remate_kmh',
+    'remates_zona_alta_perc', 'remates_zona_media_perc', 'remates_zona_baixa_perc',
+    'eficacia_primeira_linha_perc', 'eficacia_segunda_linha_perc', 'transicoes_rapidas_jogo'
+]
+
 
 class CompatibilidadePredictor:
     """
@@ -27,47 +58,136 @@ class CompatibilidadePredictor:
         print(f"Taxa de defesa prevista: {taxa}%")
     """
     
-    def __init__(self, model_dir='.'):
-        """Inicializa predictor e carrega modelo"""
+    # Par de teste da nova versão antes da troca (recarga a quente)
+    PAR_TESTE = {
+        'altura_cm': 185, 'envergadura_cm': 190, 'velocidade_lateral_ms': 4.2,
+        'alcance_vertical_cm': 75, 'agilidade_ttest_s': 9.5, 'anos_experiencia': 5,
+        'ranking_liga': 1, 'media_golos_jogo': 32.5, 'velocidade_media_remate_kmh': 105,
+        'remates_zona_alta_perc': 35, 'remates_zona_media_perc': 40, 'remates_zona_baixa_perc': 25,
+        'eficacia_primeira_linha_perc': 70, 'eficacia_segunda_linha_perc': 55, 'transicoes_rapidas_jogo': 22
+    }
+    
+    def __init__(self, model_dir='.', motor='auto', tamanho_cache=10_000, cache_db=None, servidor=None,
+                 orcamento_ms=None, intervalo_recarga=None):
+        """
+        Inicializa predictor e carrega modelo
+        
+        Args:
+            model_dir (str): Pasta com metadados e artefactos do modelo
+            motor (str): 'numpy' (árvores exportadas, sem cluster), 'h2o' ou
+                'auto' (NumPy se o .npz exportado existir, senão H2O)
+            tamanho_cache (int): Máximo de combinações memorizadas no LRU (0 = sem cache)
+            cache_db (str | None): Ficheiro SQLite do store persistente de
+                predições, partilhado entre workers e reinícios (None = desligado)
+            servidor (str | list | None): Modo cliente - socket(s) do daemon
+                de scoring (models/servidor_scoring.py), em round-robin
+            orcamento_ms (float | None): Orçamento de latência por pedido ao
+                modelo; as chamadas acima são contadas em stats()
+            intervalo_recarga (float | None): Segundos entre verificações do
+                ficheiro de metadados; quando muda, o novo modelo é trocado
+                a quente (None = desligado)
+        """
         self.model_dir = Path(model_dir)
-        self.model = None
-        self.metadata = None
+        self.cliente = ClienteScoring(servidor) if servidor else None
+        self.metricas = Metricas(orcamento_ms)
+        self.cache = CacheLRU(tamanho_cache) if tamanho_cache else None
+        self.cache_persistente = CachePersistente(cache_db) if cache_db else None
         self.h2o_started = False
+        self.metadata_path = self.model_dir / 'modelo_compatibilidade_metadata.json'
+        self.motor_preferido = motor
+        self.erro_recarga = None
+        self._lock_recarga = threading.Lock()
+        self.vigia = None
         
-        # Carregar metadados
-        metadata_path = self.model_dir / 'modelo_compatibilidade_metadata.json'
-        if metadata_path.exists():
-            with open(metadata_path, 'r') as f:
-                self.metadata = json.load(f)
+        # Versão atual (metadados + modelo); o hash identifica o modelo
+        self._versao = VersaoModelo.ler(self.metadata_path)
+        self._carregar_versao(self._versao)
         
-        # Inicializar H2O e carregar modelo
-        self._init_h2o()
-        self._load_model()
+        if intervalo_recarga:
+            self.vigia = VigiaMetadados(self.metadata_path, self.recarregar, intervalo_recarga)
     
-    def _init_h2o(self):
-        """Inicializa cluster H2O (se ainda não estiver)"""
-        try:
-            # Tenta conectar a cluster existente
-            h2o.connect(verbose=False)
-            self.h2o_started = False
-            print("✅ Conectado a cluster H2O existente")
-        except:
-            # Inicia novo cluster
+    # Estado da versão atual (leitura; trocado por inteiro em recarregar)
+    metadata = property(lambda self: self._versao.metadata)
+    model_hash = property(lambda self: self._versao.model_hash)
+    model = property(lambda self: self._versao.model)
+    motor = property(lambda self: self._versao.motor)
+    
+    def _carregar_versao(self, v):
+        """Daemon de scoring, motor NumPy in-process (sem JVM) ou H2O"""
+        npz = caminho_npz(self.model_dir, v.metadata['model_path']) if v.metadata else None
+        if self.cliente is not None:
+            # Modelo carregado no daemon de scoring
+            pass
+        elif self.motor_preferido == 'numpy' or (self.motor_preferido == 'auto' and npz is not None and npz.exists()):
+            self._load_motor_numpy(v, npz)
+        else:
+            self._init_h2o()
+            self._load_model(v)
+        v.pronta = True
+    
+    def recarregar(self, conteudo=None):
+        """
+        Carrega o modelo dos metadados atuais e troca-o a quente
+        
+        A nova versão é carregada e testada com um par GR × adversário antes
+        de substituir a atual; as entradas das caches do hash antigo são
+        removidas. Se falhar, a versão atual mantém-se.
+        
+        Args:
+            conteudo (bytes | None): Conteúdo dos metadados (None = ler o ficheiro)
+        
+        Returns:
+            bool: True se o modelo foi trocado
+        """
+        with self._lock_recarga:
+            nova = VersaoModelo(conteudo) if conteudo is not None else VersaoModelo.ler(self.metadata_path)
+            antiga = self._versao
+            if nova.model_hash == antiga.model_hash:
+                return False
+            
             try:
-                h2o.init(max_mem_size="2G", verbose=False)
-                self.h2o_started = True
-                print("✅ Novo cluster H2O iniciado")
+                self._carregar_versao(nova)
+                taxa = self._pontuar_modelo({c: [v] for c, v in self.PAR_TESTE.items()}, nova)
+                if not np.isfinite(taxa).all():
+                    raise RuntimeError(f"Par de teste devolveu valores inválidos: {taxa}")
             except Exception as e:
-                print(f"❌ Erro ao iniciar H2O: {e}")
-                raise
+                self.erro_recarga = e
+                print(f"❌ Novo modelo rejeitado, mantém-se a versão {antiga.model_hash}: {e}")
+                return False
+            
+            # Troca atómica: pedidos em curso terminam com a versão que já tinham lido
+            self._versao = nova
+            self.erro_recarga = None
+            
+            if self.cache is not None:
+                self.cache.remover_hash(antiga.model_hash)
+            if self.cache_persistente is not None:
+                self.cache_persistente.remover_hash(antiga.model_hash)
+            print(f"🔄 Modelo trocado a quente: {antiga.model_hash} -> {nova.model_hash}")
+            return True
+    
+    def _init_h2o(self):
+        """Liga ao cluster H2O partilhado do processo (models/gestor_modelos.py)"""
+        self.h2o_started = ligar_h2o()
     
-    def _load_model(self):
+    def _load_motor_numpy(self, v, npz):
+        """Carrega árvores exportadas para scoring in-process"""
+        if npz is None or not npz.exists():
+            raise FileNotFoundError(
+                f"Árvores exportadas não encontradas ({npz}). Execute models/motor_numpy.py primeiro!"
+            )
+        # Mesma versão já carregada neste processo (ex.: depois de reverter) é reutilizada
+        v.motor = carregar_artefacto(npz, v.metadata.get('artefactos', {}).get(npz.name), MotorGBM.carregar)
+        print(f"✅ Motor NumPy carregado: {npz.name}")
+    
+    def _load_model(self, v):
         """Carrega modelo treinado"""
-        if self.metadata and 'model_path' in self.metadata:
-            model_path = self.metadata['model_path']
-            if os.path.exists(model_path):
-                self.model = h2o.load_model(model_path)
-                print(f"✅ Modelo carregado: RMSE={self.metadata.get('rmse', 'N/A'):.2f}%")
+        if v.metadata and 'model_path' in v.metadata:
+            # Caminho relativo (registo) ou absoluto de outra máquina -> pasta dos modelos
+            model_path = resolver_artefacto(self.model_dir, v.metadata['model_path'])
+            if model_path.exists():
+                v.model = carregar_h2o(model_path, v.metadata.get('artefactos', {}).get(model_path.name))
+                print(f"✅ Modelo carregado: RMSE={v.metadata.get('rmse', 'N/A'):.2f}%")
             else:
                 raise FileNotFoundError(f"Modelo não encontrado em: {model_path}")
         else:
@@ -103,11 +223,11 @@ class CompatibilidadePredictor:
             float: Taxa de defesa prevista (0-100%)
         """
         
-        if self.model is None:
+        if self.model is None and self.motor is None and self.cliente is None:
             raise RuntimeError("Modelo não carregado!")
         
-        # Criar H2OFrame com as características
-        combinacao = h2o.H2OFrame({
+        # Criar colunas com as características
+        taxa_defesa = self._pontuar({
             'altura_cm': [int(altura_gr)],
             'envergadura_cm': [int(envergadura_gr)],
             'velocidade_lateral_ms': [float(velocidade_gr)],
@@ -123,14 +243,130 @@ class CompatibilidadePredictor:
             'eficacia_primeira_linha_perc': [int(efic_1linha_adv)],
             'eficacia_segunda_linha_perc': [int(efic_2linha_adv)],
             'transicoes_rapidas_jogo': [int(transicoes_adv)]
-        })
+        })[0]
+        
+        return round(float(taxa_defesa), 1)
+    
+    def predict_matrix(self, grs, adversarios, usar_cache=True):
+        """
+        Prevê todos os GRs contra todos os adversários num único pedido ao modelo
+        
+        Args:
+            grs (DataFrame): GRs com as colunas de FEATURES_GR
+            adversarios (DataFrame): Adversários com as colunas de FEATURES_ADV
+            usar_cache (bool): False = direto ao modelo, sem ler nem encher as
+                caches (cálculo em bloco, ex.: materializar_matriz)
+        
+        Returns:
+            np.ndarray: Taxa de defesa prevista (0-100%) com shape (n_gr, n_adv)
+        """
+        
+        if self.model is None and self.motor is None and self.cliente is None:
+            raise RuntimeError("Modelo não carregado!")
+        
+        n_gr, n_adv = len(grs), len(adversarios)
+        
+        # Ordem das linhas: GR -> adversário
+        i_gr = np.repeat(np.arange(n_gr), n_adv)
+        i_adv = np.tile(np.arange(n_adv), n_gr)
+        
+        colunas = {c: grs[c].to_numpy(dtype=float)[i_gr] for c in FEATURES_GR}
+        colunas.update({c: adversarios[c].to_numpy(dtype=float)[i_adv] for c in FEATURES_ADV})
+        
+        taxas = self._pontuar(colunas, usar_cache)
+        
+        return np.round(taxas, 1).reshape(n_gr, n_adv)
+    
+    def materializar_matriz(self, db_path='handball_dt.db'):
+        """
+        Calcula a matriz GR × adversário e guarda-a em compatibilidades_modelo
+        
+        A tabela fica ao lado de compatibilidades_gr_adversario (histórico) e é
+        substituída por inteiro, numa só transação, com a versão do modelo.
+        
+        Returns:
+            int: Número de pares guardados
+        """
+        with sqlite3.connect(db_path) as conn:
+            grs = pd.read_sql_query(f"SELECT id, {', '.join(FEATURES_GR)} FROM guarda_redes", conn)
+            adversarios = pd.read_sql_query(f"SELECT id, {', '.join(FEATURES_ADV)} FROM adversarios", conn)
+        
+        # Todos os pares de uma vez: não passa pelas caches por linha
+        taxas = self.predict_matrix(grs, adversarios, usar_cache=False)
+        
+        model_id = ntpath.basename(self.metadata['model_path'])
+        calculado_em = datetime.now().isoformat()
+        linhas = [
+            (int(gr_id), int(adv_id), float(taxas[i, j]), self.model_hash, model_id, calculado_em)
+            for i, gr_id in enumerate(grs['id'])
+            for j, adv_id in enumerate(adversarios['id'])
+        ]
+        
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS compatibilidades_modelo (
+                    guarda_redes_id INTEGER NOT NULL,
+                    adversario_id INTEGER NOT NULL,
+                    taxa_defesa_prevista REAL NOT NULL,
+                    model_hash TEXT NOT NULL,
+                    model_id TEXT,
+                    calculado_em TEXT NOT NULL,
+                    PRIMARY KEY (guarda_redes_id, adversario_id)
+                )
+            """)
+            conn.execute("DELETE FROM compatibilidades_modelo")
+            conn.executemany("INSERT INTO compatibilidades_modelo VALUES (?, ?, ?, ?, ?, ?)", linhas)
+        
+        print(f"✅ {len(linhas)} pares GR × adversário guardados (modelo {model_id}, hash {self.model_hash})")
+        return len(linhas)
+    
+    def _pontuar(self, colunas, usar_cache=True):
+        """
+        Devolve a taxa prevista como array; só as linhas em falta no LRU e no store
+        persistente vão ao modelo (chave = vetor de features + hash do modelo)
+        """
+        v = self._versao
+        with self.metricas.chamada(len(next(iter(colunas.values())))):
+            if not usar_cache:
+                return np.asarray(self._pontuar_modelo(colunas, v), dtype=float)
+            return np.asarray(pontuar_com_cache(
+                colunas, v.model_hash, lambda c: self._pontuar_modelo(c, v),
+                lru=self.cache, persistente=self.cache_persistente
+            ), dtype=float)
+    
+    def _pontuar_modelo(self, colunas, v=None):
+        """Pontua as colunas (motor NumPy ou um só H2OFrame) e devolve a taxa prevista como array"""
+        v = v or self._versao
+        if self.cliente is not None:
+            with self.metricas.etapa('servidor'):
+                return self.cliente.pontuar('compatibilidade', colunas)
         
-        # Fazer predição
-        pred = self.model.predict(combinacao)
+        if v.motor is not None:
+            with self.metricas.etapa('matriz'):
+                X = v.motor.matriz(colunas)
+            with self.metricas.etapa('arvores'):
+                return v.motor.prever(X)
         
-        taxa_defesa = pred[0, 0]
+        with self.metricas.etapa('frame'):
+            colunas = {n: np.asarray(v).tolist() for n, v in colunas.items()}
         
-        return round(taxa_defesa, 1)
+        with lock_h2o:
+            # Frames temporários no cluster: removidos mesmo que o predict falhe
+            combinacao = pred = None
+            try:
+                with self.metricas.etapa('upload'):
+                    combinacao = h2o.H2OFrame(colunas)
+                
+                # Fazer predição
+                with self.metricas.etapa('predict'):
+                    pred = v.model.predict(combinacao)
+                
+                with self.metricas.etapa('download'):
+                    return pred['predict'].as_data_frame(use_pandas=True)['predict'].to_numpy(dtype=float)
+            finally:
+                frames = [f for f in (combinacao, pred) if f is not None]
+                if frames:
+                    h2o.remove(frames)
     
     def predict_from_dataframes(self, gr_row, adv_row):
         """
@@ -171,22 +407,41 @@ class CompatibilidadePredictor:
                 'Data Treino': self.metadata.get('trained_date', 'N/A'),
                 'N Treino': self.metadata.get('n_train', 'N/A'),
                 'N Teste': self.metadata.get('n_test', 'N/A'),
-                'Taxa Média': f"{self.metadata.get('taxa_media', 'N/A'):.1f}%"
+                'Taxa Média': f"{self.metadata.get('taxa_media', 'N/A'):.1f}%",
+                'Versão': self.model_hash,
+                'Motor': 'Servidor' if self.cliente is not None else 'NumPy' if self.motor is not None else 'H2O'
             }
         return {}
     
+    def cache_stats(self):
+        """Contadores do LRU e do store persistente de predições"""
+        return {
+            'lru': self.cache.stats() if self.cache else {},
+            'persistente': self.cache_persistente.stats() if self.cache_persistente else {}
+        }
+    
+    def stats(self):
+        """Latência por etapa (p50/p95/p99), chamadas, linhas, erros e caches"""
+        return {**self.metricas.stats(), 'cache': self.cache_stats()}
+    
     def shutdown(self):
-        """Desliga cluster H2O (se foi iniciado por este predictor)"""
+        """Para a vigia dos metadados e desliga o cluster H2O (se foi iniciado por este processo)"""
+        if self.vigia is not None:
+            self.vigia.parar()
         if self.h2o_started:
-            h2o.cluster().shutdown(prompt=False)
-    
-    def __del__(self):
-        """Cleanup ao destruir objeto"""
-        self.shutdown()
+            desligar_h2o()
 
 
 # EXEMPLO DE USO
 if __name__ == "__main__":
+    # python models/predictor_compatibilidade.py --matriz  -> recalcula compatibilidades_modelo
+    if '--matriz' in sys.argv:
+        model_dir = Path(__file__).parent
+        predictor = CompatibilidadePredictor(model_dir=model_dir)
+        predictor.materializar_matriz(model_dir.parent / 'handball_dt.db')
+        predictor.shutdown()
+        sys.exit(0)
+    
     print("="*60)
     print("TESTE DO PREDICTOR DE COMPATIBILIDADE")
     print("="*60)
@@ -3,11 +3,36 @@ PREDICTOR - Modelo de Probabilidade de Defesa
 Classe para fazer predições usando o modelo H2O.ai treinado
 """
 
-import h2o
-import json
+try:
+    import h2o
+except ImportError:
+    # Sem H2O: motor NumPy (árvores exportadas) ou modelo de recurso
+    h2o = None
 import os
+import sys
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
 from pathlib import Path
 
+# Permite correr este ficheiro diretamente (python models/<ficheiro>.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from data_access import HandballDataAccess
+from models.gestor_modelos import desligar_h2o, ligar_h2o, lock_h2o
+from models.coalescedor import Coalescedor
+from models.cache_predicoes import CacheLRU, CachePersistente, pontuar_com_cache
+from models.motor_numpy import MotorGBM, caminho_npz
+from models.registo_modelos import RegistoModelos, carregar_artefacto, carregar_h2o, resolver_artefacto
+from models.incerteza import obter_ensemble
+from models.metricas import Metricas
+from models.modelo_fallback import ModeloLogistico, obter_fallback
+from models.pipeline_features import PipelineFeatures
+from models.recarga import VersaoModelo, VigiaMetadados
+from models.servidor_scoring import ClienteScoring
+from models.sombra import Sombra
+from models.tensor_timeout import TensorTimeout
+
 
 class DefesaPredictor:
     """
@@ -23,47 +48,285 @@ class DefesaPredictor:
         print(f"Probabilidade de defesa: {prob}%")
     """
     
-    def __init__(self, model_dir='.'):
-        """Inicializa predictor e carrega modelo"""
+    # Lance de teste da nova versão antes da troca (recarga a quente)
+    GR_TESTE = {'altura_cm': 185, 'envergadura_cm': 190, 'velocidade_lateral_ms': 4.2}
+    CONTEXTO_TESTE = {'distancia': 9.0, 'velocidade': 95, 'minuto': 42, 'diferenca_golos': 0}
+    
+    def __init__(self, model_dir='.', motor='auto', usar_tensor=True, tamanho_cache=50_000, cache_db=None,
+                 assincrono=False, db_path='handball_dt.db', janela_lote_ms=5, servidor=None,
+                 orcamento_ms=250, intervalo_recarga=None, candidato=None, log_sombra=None,
+                 conteudo_metadata=None):
+        """
+        Inicializa predictor e carrega modelo
+        
+        Args:
+            model_dir (str): Pasta com metadados e artefactos do modelo
+            motor (str): 'numpy' (árvores exportadas, sem cluster), 'h2o',
+                'logistico' (modelo de recurso em NumPy, models/modelo_fallback.py)
+                ou 'auto' (NumPy se o .npz exportado existir, senão H2O e, se o
+                H2O falhar, o modelo de recurso)
+            usar_tensor (bool): Consultar o tensor pré-calculado do Timeout
+                (models/tensor_timeout.py) quando existir para este modelo
+            tamanho_cache (int): Máximo de lances memorizados no LRU (0 = sem cache)
+            cache_db (str | None): Ficheiro SQLite do store persistente de
+                predições, partilhado entre workers e reinícios (None = desligado)
+            assincrono (bool): Arrancar H2O e carregar o modelo numa thread; até
+                estar pronto, as predições são taxas empíricas por zona
+                (provisorio=True)
+            db_path (str): Base de dados usada para as taxas empíricas
+            janela_lote_ms (float): Com H2O, pedidos concorrentes que chegam
+                nesta janela são pontuados num só H2OFrame (0 = desligado)
+            servidor (str | list | None): Modo cliente - socket(s) do daemon
+                de scoring (models/servidor_scoring.py), em round-robin; o
+                modelo não é carregado neste processo
+            orcamento_ms (float): Orçamento de latência por pedido ao modelo;
+                as chamadas acima são contadas em stats()
+            intervalo_recarga (float | None): Segundos entre verificações do
+                ficheiro de metadados; quando muda, o novo modelo é carregado
+                em fundo e trocado a quente (None = desligado)
+            candidato (int | None): Versão do registo (models/registo_modelos.py)
+                pontuada em sombra, num pool de threads, com os mesmos pedidos
+                (só com o motor NumPy: sem .npz exportado não há sombra)
+            log_sombra (str | None): JSONL das comparações em sombra
+                (None = <model_dir>/sombra_defesa.jsonl)
+            conteudo_metadata (bytes | None): Metadados a usar em vez do
+                ficheiro da versão atual (ex.: candidato do registo)
+        """
         self.model_dir = Path(model_dir)
-        self.model = None
-        self.metadata = None
+        self.cliente = ClienteScoring(servidor) if servidor else None
+        self.metricas = Metricas(orcamento_ms)
+        self.cache = CacheLRU(tamanho_cache) if tamanho_cache else None
+        self.cache_persistente = CachePersistente(cache_db) if cache_db else None
         self.h2o_started = False
+        self.metadata_path = self.model_dir / 'modelo_defesa_metadata.json'
+        
+        # Versão atual (metadados + modelo); o hash identifica o modelo
+        if conteudo_metadata is not None:
+            self._versao = VersaoModelo(conteudo_metadata)
+        else:
+            self._versao = VersaoModelo.ler(self.metadata_path)
         
-        # Carregar metadados
-        metadata_path = self.model_dir / 'modelo_defesa_metadata.json'
-        if metadata_path.exists():
-            with open(metadata_path, 'r') as f:
-                self.metadata = json.load(f)
+        # Transformação de features dos metadados (erro já aqui se forem inválidos)
+        self._versao.pipeline = PipelineFeatures.compilar(self._versao.metadata)
         
-        # Inicializar H2O e carregar modelo
-        self._init_h2o()
-        self._load_model()
+        self.db_path = db_path
+        self.erro_arranque = None
+        self.erro_recarga = None
+        self._taxas_empiricas = None
+        self._pronto = threading.Event()
+        self._lock_recarga = threading.Lock()
+        self.motor_preferido = motor
+        self.usar_tensor = usar_tensor
+        self.janela_lote_ms = janela_lote_ms
+        self.vigia = None
+        
+        if assincrono:
+            threading.Thread(target=self._arrancar, args=(True,), daemon=True).start()
+        else:
+            self._arrancar()
+        
+        if intervalo_recarga:
+            self.vigia = VigiaMetadados(self.metadata_path, self.recarregar, intervalo_recarga)
+        
+        # Modelo candidato em sombra (predictor à parte, sem caches nem tensor).
+        # Só com árvores exportadas: em H2O disputaria o lock_h2o com os pedidos reais
+        self.sombra = None
+        if candidato is not None:
+            conteudo = RegistoModelos(self.model_dir).conteudo('defesa', candidato)
+            versao_candidata = VersaoModelo(conteudo)
+            npz = caminho_npz(self.model_dir, versao_candidata.metadata['model_path']) if versao_candidata.metadata else None
+            if npz is None or not npz.exists():
+                print(f"⚠️ Candidato v{candidato} sem árvores exportadas (python models/motor_numpy.py) - sem scoring sombra")
+            elif versao_candidata.model_hash == self.model_hash:
+                print(f"ℹ️ Candidato v{candidato} já é a versão atual - sem scoring sombra")
+            else:
+                modelo_candidato = DefesaPredictor(
+                    self.model_dir, motor='numpy', usar_tensor=False, tamanho_cache=0,
+                    assincrono=assincrono, db_path=db_path, janela_lote_ms=0, conteudo_metadata=conteudo
+                )
+                self.sombra = Sombra(modelo_candidato, log_sombra or self.model_dir / 'sombra_defesa.jsonl')
+                print(f"👥 Scoring sombra ativo: candidato v{candidato} ({modelo_candidato.model_hash})")
     
-    def _init_h2o(self):
-        """Inicializa cluster H2O (se ainda não estiver)"""
-        try:
-            # Tenta conectar a cluster existente
-            h2o.connect(verbose=False)
-            self.h2o_started = False
-            print("✅ Conectado a cluster H2O existente")
-        except:
-            # Inicia novo cluster
+    # Estado da versão atual (leitura; trocado por inteiro em recarregar)
+    metadata = property(lambda self: self._versao.metadata)
+    model_hash = property(lambda self: self._versao.model_hash)
+    pipeline = property(lambda self: self._versao.pipeline)
+    model = property(lambda self: self._versao.model)
+    motor = property(lambda self: self._versao.motor)
+    tensor = property(lambda self: self._versao.tensor)
+    coalescedor = property(lambda self: self._versao.coalescedor)
+    
+    def _arrancar(self, em_fundo=False):
+        """Carrega a versão inicial e o tensor do Timeout"""
+        with self._lock_recarga:
             try:
-                h2o.init(max_mem_size="2G", verbose=False)
-                self.h2o_started = True
-                print("✅ Novo cluster H2O iniciado")
+                self._carregar_versao(self._versao)
             except Exception as e:
-                print(f"❌ Erro ao iniciar H2O: {e}")
-                raise
+                if not em_fundo:
+                    raise
+                # Fica em modo provisório (taxas empíricas) em vez de parar a página
+                self.erro_arranque = e
+                print(f"❌ Modelo não carregado, a usar taxas empíricas: {e}")
+                return
+            
+            self._pronto.set()
+            
+            if self.usar_tensor:
+                self._load_tensor(self._versao)
+    
+    def _carregar_versao(self, v):
+        """Carrega o motor da versão (NumPy in-process ou H2O) e valida as features"""
+        npz = caminho_npz(self.model_dir, v.metadata['model_path']) if v.metadata else None
+        if self.cliente is not None:
+            # Modelo carregado no daemon de scoring
+            pass
+        elif self.motor_preferido == 'numpy' or (self.motor_preferido == 'auto' and npz is not None and npz.exists()):
+            self._load_motor_numpy(v, npz)
+        elif self.motor_preferido == 'logistico':
+            self._load_fallback(v)
+        else:
+            try:
+                self._init_h2o()
+                self._load_model(v)
+            except Exception as e:
+                if self.motor_preferido == 'h2o':
+                    raise
+                # H2O não instalado ou cluster sem arrancar: não para os dashboards
+                print(f"⚠️ H2O indisponível ({e}) - a usar o modelo de recurso")
+                self._load_fallback(v)
+        self._validar_pipeline(v)
+        if v.model is not None and self.janela_lote_ms:
+            v.coalescedor = Coalescedor(lambda colunas: self._pontuar_h2o(colunas, v), janela_ms=self.janela_lote_ms)
+        v.pronta = True
+    
+    def recarregar(self, conteudo=None):
+        """
+        Carrega o modelo dos metadados atuais e troca-o a quente
+        
+        A nova versão é carregada e testada com um lance (e o tensor do
+        Timeout verificado) enquanto a atual continua a responder; só depois
+        substitui a atual, numa única atribuição. As entradas das caches do
+        hash antigo são removidas. Se falhar, a versão atual mantém-se.
+        
+        Args:
+            conteudo (bytes | None): Conteúdo dos metadados (None = ler o ficheiro)
+        
+        Returns:
+            bool: True se o modelo foi trocado
+        """
+        with self._lock_recarga:
+            nova = VersaoModelo(conteudo) if conteudo is not None else VersaoModelo.ler(self.metadata_path)
+            antiga = self._versao
+            if nova.model_hash == antiga.model_hash and antiga.pronta:
+                return False
+            
+            try:
+                nova.pipeline = PipelineFeatures.compilar(nova.metadata)
+                self._carregar_versao(nova)
+                self._testar_versao(nova)
+                if self.usar_tensor:
+                    self._load_tensor(nova)
+            except Exception as e:
+                self.erro_recarga = e
+                print(f"❌ Novo modelo rejeitado, mantém-se a versão {antiga.model_hash}: {e}")
+                return False
+            
+            # Troca atómica: pedidos em curso terminam com a versão que já tinham lido
+            self._versao = nova
+            self.erro_recarga = None
+            self.erro_arranque = None
+            self._pronto.set()
+            
+            if antiga.coalescedor is not None:
+                antiga.coalescedor.parar()
+            if antiga.model_hash != nova.model_hash:
+                self._invalidar_cache(antiga.model_hash)
+            print(f"🔄 Modelo trocado a quente: {antiga.model_hash} -> {nova.model_hash}")
+            
+            # Candidato promovido: deixa de haver o que comparar
+            if self.sombra is not None and self.sombra.candidato.model_hash == nova.model_hash:
+                self.sombra.parar()
+                self.sombra = None
+            return True
+    
+    def _testar_versao(self, v):
+        """Lance de teste com a versão nova: erro se a predição não for uma probabilidade válida"""
+        probs = self._predict_matrix(pd.DataFrame([self.GR_TESTE]), [self.CONTEXTO_TESTE], False, v)
+        if not np.isfinite(probs).all() or probs.min() < 0 or probs.max() > 100:
+            raise RuntimeError(f"Lance de teste devolveu valores inválidos: {probs.ravel()[:9]}")
+    
+    def _invalidar_cache(self, model_hash):
+        """Remove das caches só as predições de um hash de modelo"""
+        if self.cache is not None:
+            self.cache.remover_hash(model_hash)
+        if self.cache_persistente is not None:
+            self.cache_persistente.remover_hash(model_hash)
     
-    def _load_model(self):
+    @property
+    def provisorio(self):
+        """True enquanto as predições vêm das taxas empíricas (modelo ainda não pronto)"""
+        return not self._pronto.is_set()
+    
+    def aguardar(self, timeout=None):
+        """Espera que o modelo fique pronto; devolve True se estiver"""
+        return self._pronto.wait(timeout)
+    
+    def _init_h2o(self):
+        """Liga ao cluster H2O partilhado do processo (models/gestor_modelos.py)"""
+        self.h2o_started = ligar_h2o()
+    
+    def _load_motor_numpy(self, v, npz):
+        """Carrega árvores exportadas para scoring in-process"""
+        if npz is None or not npz.exists():
+            raise FileNotFoundError(
+                f"Árvores exportadas não encontradas ({npz}). Execute models/motor_numpy.py primeiro!"
+            )
+        # Mesma versão já carregada neste processo (ex.: depois de reverter) é reutilizada
+        v.motor = carregar_artefacto(npz, v.metadata.get('artefactos', {}).get(npz.name), MotorGBM.carregar)
+        print(f"✅ Motor NumPy carregado: {npz.name}")
+    
+    def _load_fallback(self, v):
+        """Regressão logística NumPy com as features dos metadados (treinada dos lances se preciso)"""
+        v.motor = obter_fallback(self.model_dir, v.metadata, self.db_path)
+        # Predições diferentes das do GBM: chave própria nas caches e no tensor
+        v.model_hash = f"{v.model_hash}-lr"
+        print(f"✅ Modelo de recurso carregado: AUC={v.motor.auc:.3f}")
+    
+    def _validar_pipeline(self, v):
+        """Confirma que as features dos metadados são as que o modelo carregado espera"""
+        if v.motor is not None:
+            v.pipeline.validar(v.motor.nomes, v.motor.dominios)
+        elif v.model is not None:
+            output = v.model._model_json['output']
+            resposta = v.model.actual_params['response_column']
+            nomes = [n for n in output['names'] if n != resposta]
+            dominios = {n: d for n, d in zip(output['names'], output['domains']) if d and n != resposta}
+            v.pipeline.validar(nomes, dominios)
+    
+    def _load_tensor(self, v):
+        """Abre o tensor do Timeout da versão, se existir e estiver atualizado"""
+        tensor = TensorTimeout.carregar(self.model_dir, v.model_hash)
+        if tensor is None:
+            return
+        
+        # Confirma que o tensor reproduz o predictor atual antes de o usar
+        verificacao = tensor.info['verificacao']
+        grs = pd.DataFrame(tensor.info['grs'], columns=['altura_cm', 'envergadura_cm', 'velocidade_lateral_ms'])
+        atual = self._predict_matrix(grs, [verificacao['contexto']], False, v)[0]
+        if np.allclose(atual, verificacao['probs'], atol=0.05):
+            v.tensor = tensor
+            print(f"✅ Tensor do Timeout carregado: {tensor.tensor.shape}")
+        else:
+            print("⚠️ Tensor do Timeout desatualizado - ignorado")
+    
+    def _load_model(self, v):
         """Carrega modelo treinado"""
-        if self.metadata and 'model_path' in self.metadata:
-            model_path = self.metadata['model_path']
-            if os.path.exists(model_path):
-                self.model = h2o.load_model(model_path)
-                print(f"✅ Modelo carregado: AUC={self.metadata.get('auc', 'N/A'):.3f}")
+        if v.metadata and 'model_path' in v.metadata:
+            # Caminho relativo (registo) ou absoluto de outra máquina -> pasta dos modelos
+            model_path = resolver_artefacto(self.model_dir, v.metadata['model_path'])
+            if model_path.exists():
+                v.model = carregar_h2o(model_path, v.metadata.get('artefactos', {}).get(model_path.name))
+                print(f"✅ Modelo carregado: AUC={v.metadata.get('auc', 'N/A'):.3f}")
             else:
                 raise FileNotFoundError(f"Modelo não encontrado em: {model_path}")
         else:
@@ -88,87 +351,380 @@ class DefesaPredictor:
             float: Probabilidade de defesa (0-100%)
         """
         
-        if self.model is None:
-            raise RuntimeError("Modelo não carregado!")
+        self._verificar_modelo()
         
-        # Converter minuto para fase (modelo V3)
-        if minuto <= 15:
-            fase = 'inicio'
-        elif minuto <= 30:
-            fase = 'meio_1'
-        elif minuto <= 45:
-            fase = 'meio_2'
-        else:
-            fase = 'final'
-        
-        # Criar H2OFrame com o lance
-        lance = h2o.H2OFrame({
+        v = self._versao
+        prob = self._pontuar(v.pipeline.transformar({
             'zona_baliza_id': [int(zona)],
             'distancia_remate_m': [float(distancia)],
             'velocidade_remate_kmh': [float(velocidade)],
-            'fase_jogo': [fase],  # MUDANÇA: fase em vez de minuto
+            'minuto': [minuto],  # feature temporal (fadiga/fase) dos metadados
             'diferenca_golos_momento': [int(diferenca_golos)],
             'altura_cm': [int(altura_gr)],
             'envergadura_cm': [int(envergadura_gr)],
             'velocidade_lateral_ms': [float(vel_lateral_gr)]
-        })
+        }), v)
+        prob = round(float(prob[0]) * 100, 1)
         
-        # Fazer fase categórica
-        lance['fase_jogo'] = lance['fase_jogo'].asfactor()
+        self._sombrear(
+            lambda: [self.sombra.candidato.predict(zona, distancia, velocidade, altura_gr, envergadura_gr,
+                                                   vel_lateral_gr, minuto, diferenca_golos)],
+            [prob], [int(zona)], v
+        )
         
-        # Fazer predição
-        pred = self.model.predict(lance)
+        return prob
+    
+    def predict_grid(self, grs, distancia, velocidade, minuto, diferenca_golos):
+        """
+        Prevê a grelha 3x3 de todos os GRs para um contexto de jogo
         
-        # p1 = probabilidade da classe 1 (defesa)
-        prob_defesa = pred['p1'][0, 0] * 100
+        Args:
+            grs (DataFrame | list[dict]): GRs com altura_cm, envergadura_cm
+                e velocidade_lateral_ms
+            distancia, velocidade, minuto, diferenca_golos: contexto do lance
+                (mesmo significado que em predict)
         
-        return round(prob_defesa, 1)
+        Returns:
+            np.ndarray: Probabilidades (0-100%) com shape (n_gr, 3, 3)
+        """
+        contexto = {
+            'distancia': distancia, 'velocidade': velocidade,
+            'minuto': minuto, 'diferenca_golos': diferenca_golos
+        }
+        return self.predict_matrix(grs, [contexto])[0]
     
-    def predict_batch(self, lances_df):
+    def predict_matrix(self, grs, contextos, usar_tensor=True):
         """
-        Prevê probabilidade para múltiplos lances
+        Prevê todas as combinações zona × GR × contexto num único H2OFrame
+        (um upload e uma chamada a model.predict)
+        
+        Contextos presentes no tensor pré-calculado são respondidos por
+        consulta direta, sem passar pelo modelo.
         
         Args:
-            lances_df (DataFrame): DataFrame com colunas:
-                - zona_baliza_id
-                - distancia_remate_m
-                - velocidade_remate_kmh
-                - minuto_jogo (será convertido para fase_jogo)
-                - diferenca_golos_momento
-                - altura_cm
-                - envergadura_cm
-                - velocidade_lateral_ms
+            grs (DataFrame | list[dict]): GRs com altura_cm, envergadura_cm
+                e velocidade_lateral_ms
+            contextos (list[dict]): Contextos com chaves distancia, velocidade,
+                minuto e diferenca_golos
+            usar_tensor (bool): Consultar o tensor pré-calculado, se carregado
         
         Returns:
-            list: Lista de probabilidades (0-100%)
+            np.ndarray: Probabilidades (0-100%) com shape (n_contextos, n_gr, 3, 3).
+                Zonas 1-3 = linha Superior, 4-6 = Meio, 7-9 = Inferior
         """
         
-        if self.model is None:
-            raise RuntimeError("Modelo não carregado!")
+        self._verificar_modelo()
+        
+        v = self._versao
+        grs, contextos = pd.DataFrame(grs), list(contextos)
+        resultado = self._predict_matrix(grs, contextos, usar_tensor, v)
         
-        # Converter minuto para fase
-        import pandas as pd
-        df = lances_df.copy()
-        df['fase_jogo'] = pd.cut(
-            df['minuto_jogo'],
-            bins=[0, 15, 30, 45, 60],
-            labels=['inicio', 'meio_1', 'meio_2', 'final']
+        self._sombrear(
+            lambda: self.sombra.candidato.predict_matrix(grs, contextos, usar_tensor=False),
+            resultado, np.broadcast_to(np.arange(1, 10).reshape(3, 3), resultado.shape), v
         )
         
-        # Remover minuto_jogo (não é mais usado)
-        df = df.drop('minuto_jogo', axis=1)
+        return resultado
+    
+    def _sombrear(self, pontuar_candidato, primario, zonas, v):
+        """Repete o pedido no modelo candidato, em fundo (models/sombra.py)"""
+        sombra = self.sombra
+        if sombra is not None and v.pronta and not sombra.candidato.provisorio:
+            sombra.submeter(pontuar_candidato, primario, zonas, v.model_hash)
+    
+    def _predict_matrix(self, grs, contextos, usar_tensor, v):
+        """predict_matrix com uma versão do modelo fixa"""
+        resultado = np.empty((len(contextos), len(grs), 3, 3))
         
-        # Converter para H2OFrame
-        hf = h2o.H2OFrame(df)
-        hf['fase_jogo'] = hf['fase_jogo'].asfactor()
+        em_falta = []
+        with self.metricas.etapa('tensor'):
+            for i, contexto in enumerate(contextos):
+                grid = None
+                if usar_tensor and v.tensor is not None:
+                    grid = v.tensor.procurar(grs, **contexto)
+                if grid is None:
+                    em_falta.append(i)
+                else:
+                    resultado[i] = grid
         
-        # Fazer predições
-        preds = self.model.predict(hf)
+        if em_falta:
+            resultado[em_falta] = self._pontuar_contextos(grs, [contextos[i] for i in em_falta], v)
         
-        # Extrair probabilidades
-        probs = [round(p * 100, 1) for p in preds['p1'].as_data_frame()['p1'].tolist()]
+        return resultado
+    
+    def sweep(self, grs, eixos, **contexto):
+        """
+        Varre 1 ou 2 variáveis de contexto numa só chamada (análise de sensibilidade)
+        
+        Exemplos:
+            # velocidade 70-120 × zona (GR 0): probs[:, 0].reshape(-1, 9)
+            probs = predictor.sweep(grs, {'velocidade': range(70, 121)},
+                                    distancia=9.0, minuto=42, diferenca_golos=0)
+            # minuto 0-60 × GR (minuto de cruzamento): probs.mean(axis=(2, 3))
+            probs = predictor.sweep(grs, {'minuto': range(0, 61)},
+                                    distancia=9.0, velocidade=95, diferenca_golos=0)
+        
+        Args:
+            grs (DataFrame | list[dict]): GRs com altura_cm, envergadura_cm
+                e velocidade_lateral_ms
+            eixos (dict): 1 ou 2 variáveis (distancia, velocidade, minuto,
+                diferenca_golos) -> valores a varrer
+            **contexto: Valores fixos das restantes variáveis
         
-        return probs
+        Returns:
+            np.ndarray: Probabilidades (0-100%) com shape
+                (len(eixo_1)[, len(eixo_2)], n_gr, 3, 3)
+        """
+        variaveis = ['distancia', 'velocidade', 'minuto', 'diferenca_golos']
+        if not 1 <= len(eixos) <= 2:
+            raise ValueError(f"sweep aceita 1 ou 2 eixos (recebido: {len(eixos)})")
+        desconhecidas = set(eixos) - set(variaveis)
+        if desconhecidas:
+            raise ValueError(f"Eixos desconhecidos: {sorted(desconhecidas)} (válidos: {variaveis})")
+        em_falta = [v for v in variaveis if v not in eixos and v not in contexto]
+        if em_falta:
+            raise ValueError(f"Valores fixos em falta: {em_falta}")
+        
+        nomes = list(eixos)
+        valores = [np.asarray(list(eixos[n])) for n in nomes]
+        grelha = np.meshgrid(*valores, indexing='ij')
+        
+        # Um contexto por ponto da grelha, todos no mesmo pedido
+        contextos = pd.DataFrame({n: g.ravel() for n, g in zip(nomes, grelha)})
+        for v in variaveis:
+            if v not in eixos:
+                contextos[v] = contexto[v]
+        
+        probs = self.predict_matrix(grs, contextos.to_dict('records'))
+        
+        return probs.reshape(*[len(v) for v in valores], *probs.shape[1:])
+    
+    def predict_matrix_intervalos(self, grs, contextos, nivel=0.9):
+        """
+        predict_matrix com intervalos bootstrap por zona
+        
+        A distribuição vem do ensemble de regressões logísticas reamostradas
+        (models/incerteza.py), centrada nas predições do modelo principal;
+        todos os membros são avaliados numa só multiplicação de matrizes.
+        
+        Args:
+            grs, contextos: Como em predict_matrix
+            nivel (float): Nível dos intervalos (0.9 = percentis 5 e 95)
+        
+        Returns:
+            dict: 'probs', 'inferior', 'superior' com shape (n_ctx, n_gr, 3, 3)
+                e 'amostras' (B, n_ctx, n_gr, 3, 3), tudo em 0-100%.
+                Comparar GRs: models.incerteza.prob_superioridade(amostras[:, i])
+        """
+        v = self._versao
+        grs, contextos = pd.DataFrame(grs), list(contextos)
+        probs = self.predict_matrix(grs, contextos)
+        
+        if v.ensemble is None:
+            v.ensemble = obter_ensemble(self.model_dir, v.metadata, self.db_path)
+        
+        with self.metricas.etapa('incerteza'):
+            colunas = self._colunas_contextos(grs, contextos, v)
+            amostras = v.ensemble.amostras(colunas, probs.ravel() / 100).reshape(-1, *probs.shape) * 100
+            alfa = 50 * (1 - nivel)
+            inferior, superior = np.percentile(amostras, [alfa, 100 - alfa], axis=0)
+        
+        return {'probs': probs, 'inferior': inferior, 'superior': superior, 'amostras': amostras}
+    
+    def _colunas_contextos(self, grs, contextos, v):
+        """Features de zona × GR × contexto (ordem das linhas: contexto -> GR -> zona)"""
+        ctx = pd.DataFrame(contextos)
+        n_ctx, n_gr = len(ctx), len(grs)
+        
+        i_ctx = np.repeat(np.arange(n_ctx), n_gr * 9)
+        i_gr = np.tile(np.repeat(np.arange(n_gr), 9), n_ctx)
+        zonas = np.tile(np.arange(1, 10), n_ctx * n_gr)
+        
+        return v.pipeline.transformar({
+            'zona_baliza_id': zonas,
+            'distancia_remate_m': ctx['distancia'].astype(float).to_numpy()[i_ctx],
+            'velocidade_remate_kmh': ctx['velocidade'].astype(float).to_numpy()[i_ctx],
+            'minuto': ctx['minuto'].astype(float).to_numpy()[i_ctx],
+            'diferenca_golos_momento': ctx['diferenca_golos'].astype(int).to_numpy()[i_ctx],
+            'altura_cm': grs['altura_cm'].astype(int).to_numpy()[i_gr],
+            'envergadura_cm': grs['envergadura_cm'].astype(int).to_numpy()[i_gr],
+            'velocidade_lateral_ms': grs['velocidade_lateral_ms'].astype(float).to_numpy()[i_gr]
+        })
+    
+    def _pontuar_contextos(self, grs, contextos, v):
+        """Pontua zona × GR × contexto num só pedido ao modelo, shape (n_ctx, n_gr, 3, 3)"""
+        probs = self._pontuar(self._colunas_contextos(grs, contextos, v), v)
+        
+        return np.round(probs * 100, 1).reshape(len(contextos), len(grs), 3, 3)
+    
+    def chave_temporal(self, minuto):
+        """Valor da feature temporal enviada ao modelo para este minuto"""
+        valor = self.pipeline.valor_temporal([minuto])
+        return None if valor is None else valor[0].item()
+    
+    def _verificar_modelo(self):
+        """Erro se o modelo já devia estar carregado e não está"""
+        if not self.provisorio and self.model is None and self.motor is None and self.cliente is None:
+            raise RuntimeError("Modelo não carregado!")
+    
+    def _pontuar(self, colunas, v=None):
+        """
+        Devolve p1 (0-1) como array; só as linhas em falta no LRU e no store
+        persistente vão ao modelo (chave = vetor de features + hash do modelo)
+        
+        Enquanto o modelo não está pronto, responde com as taxas empíricas
+        (nunca guardadas em cache).
+        
+        Args:
+            colunas (dict): Features do modelo (já transformadas pelo pipeline)
+            v (VersaoModelo | None): Versão do modelo (None = a atual)
+        """
+        v = v or self._versao
+        with self.metricas.chamada(len(next(iter(colunas.values())))):
+            if not v.pronta:
+                with self.metricas.etapa('empirico'):
+                    return self._pontuar_empirico(colunas)
+            
+            return np.asarray(pontuar_com_cache(
+                colunas, v.model_hash, lambda c: self._pontuar_modelo(c, v),
+                lru=self.cache, persistente=self.cache_persistente
+            ), dtype=float)
+    
+    def _pontuar_modelo(self, colunas, v):
+        """Pontua as colunas (daemon, motor NumPy ou um só H2OFrame) e devolve p1 (0-1) como array"""
+        if self.cliente is not None:
+            with self.metricas.etapa('servidor'):
+                return self.cliente.pontuar('defesa', colunas)
+        
+        if v.motor is not None:
+            with self.metricas.etapa('matriz'):
+                X = v.motor.matriz(colunas)
+            with self.metricas.etapa('arvores'):
+                return v.motor.prever(X)
+        
+        # Sessões concorrentes partilham o mesmo H2OFrame
+        if v.coalescedor is not None:
+            with self.metricas.etapa('coalescedor'):
+                return v.coalescedor.pontuar(colunas)
+        return self._pontuar_h2o(colunas, v)
+    
+    def _pontuar_h2o(self, colunas, v, via_ficheiro=False):
+        """
+        Um H2OFrame + model.predict; devolve p1 (0-1) como array
+        
+        Com via_ficheiro, as colunas são escritas num CSV temporário (pandas,
+        em C) e enviadas com h2o.upload_file, em vez de convertidas em listas
+        Python linha a linha - para blocos grandes do predict_batch.
+        """
+        with self.metricas.etapa('frame'):
+            if via_ficheiro:
+                fd, csv = tempfile.mkstemp(suffix='.csv')
+                os.close(fd)
+                pd.DataFrame(colunas, copy=False).to_csv(csv, index=False)
+            else:
+                colunas = {n: np.asarray(valores).tolist() for n, valores in colunas.items()}
+        
+        with lock_h2o:
+            # Frames temporários no cluster: removidos mesmo que o predict falhe
+            lances = pred = None
+            try:
+                with self.metricas.etapa('upload'):
+                    if via_ficheiro:
+                        try:
+                            lances = h2o.upload_file(csv, header=1, col_types=v.pipeline.tipos_h2o or None)
+                        finally:
+                            os.remove(csv)
+                    else:
+                        lances = h2o.H2OFrame(colunas, column_types=v.pipeline.tipos_h2o)
+                
+                with self.metricas.etapa('predict'):
+                    pred = v.model.predict(lances)
+                
+                # p1 = probabilidade da classe 1 (defesa)
+                with self.metricas.etapa('download'):
+                    return pred['p1'].as_data_frame(use_pandas=True)['p1'].to_numpy(dtype=float)
+            finally:
+                frames = [f for f in (lances, pred) if f is not None]
+                if frames:
+                    h2o.remove(frames)
+    
+    def _pontuar_empirico(self, colunas):
+        """Taxa de defesa histórica do GR em cada zona (0-1); média da zona para GRs desconhecidos"""
+        if self._taxas_empiricas is None:
+            self._taxas_empiricas = self._calcular_taxas_empiricas()
+        por_gr, por_zona = self._taxas_empiricas
+        
+        chaves = zip(colunas['altura_cm'], colunas['envergadura_cm'], colunas['velocidade_lateral_ms'])
+        return np.array([
+            por_gr.get((int(a), int(e), float(v)), {}).get(int(z), por_zona.get(int(z), 50.0)) / 100
+            for (a, e, v), z in zip(chaves, colunas['zona_baliza_id'])
+        ])
+    
+    def _calcular_taxas_empiricas(self):
+        """{(altura, envergadura, vel_lateral): {zona: taxa}} e {zona: taxa global} a partir dos lances"""
+        db = HandballDataAccess(self.db_path)
+        por_gr = {}
+        remates, defesas = {}, {}
+        for _, gr in db.get_all_goalkeepers().iterrows():
+            zonas = db.get_zone_performance(int(gr['id']))
+            chave = (int(gr['altura_cm']), int(gr['envergadura_cm']), float(gr['velocidade_lateral_ms']))
+            por_gr[chave] = dict(zip(zonas['zona_baliza_id'].astype(int), zonas['taxa_defesa'].astype(float)))
+            for z, n, d in zip(zonas['zona_baliza_id'].astype(int), zonas['total_remates'], zonas['defesas']):
+                remates[z] = remates.get(z, 0) + n
+                defesas[z] = defesas.get(z, 0) + d
+        por_zona = {z: 100.0 * defesas[z] / remates[z] for z in remates if remates[z]}
+        return por_gr, por_zona
+    
+    def predict_batch(self, lances, tamanho_lote=100_000):
+        """
+        Prevê probabilidade para múltiplos lances, em blocos de memória limitada
+        
+        Cada bloco é convertido coluna a coluna (arrays NumPy, sem cópia do
+        DataFrame) e pontuado diretamente no modelo, sem passar pelas caches
+        de predições nem pelo coalescedor.
+        
+        Args:
+            lances (DataFrame | iterável de DataFrames): Lances com as colunas
+                zona_baliza_id, distancia_remate_m, velocidade_remate_kmh,
+                minuto_jogo (convertido na feature temporal do modelo),
+                diferenca_golos_momento, altura_cm, envergadura_cm e
+                velocidade_lateral_ms; ou blocos desses DataFrames
+                (ex.: pd.read_sql(..., chunksize=...)) para épocas inteiras
+            tamanho_lote (int): Máximo de linhas por pedido ao modelo
+        
+        Returns:
+            np.ndarray: Probabilidade de defesa (0-100%) de cada lance
+        """
+        
+        self._verificar_modelo()
+        
+        v = self._versao
+        if isinstance(lances, pd.DataFrame):
+            lances = [lances]
+        
+        resultados = []
+        for bloco in lances:
+            for inicio in range(0, len(bloco), tamanho_lote):
+                parte = bloco.iloc[inicio:inicio + tamanho_lote]
+                
+                # Colunas de entrada do pipeline (minuto_jogo -> feature temporal)
+                entrada = {
+                    nome: parte[nome].to_numpy()
+                    for nome in v.pipeline.features if nome != v.pipeline.temporal
+                }
+                entrada['minuto'] = parte['minuto_jogo' if 'minuto_jogo' in parte else 'minuto'].to_numpy()
+                colunas = v.pipeline.transformar(entrada)
+                
+                with self.metricas.chamada(len(parte)):
+                    if not v.pronta:
+                        probs = self._pontuar_empirico(colunas)
+                    elif self.cliente is None and v.motor is None and v.model is not None:
+                        probs = self._pontuar_h2o(colunas, v, via_ficheiro=True)
+                    else:
+                        probs = self._pontuar_modelo(colunas, v)
+                resultados.append(np.asarray(probs, dtype=float) * 100)
+        
+        return np.concatenate(resultados) if resultados else np.empty(0)
     
     def get_model_info(self):
         """Retorna informações sobre o modelo"""
@@ -178,18 +734,40 @@ class DefesaPredictor:
                 'Accuracy': self.metadata.get('accuracy', 'N/A'),
                 'Data Treino': self.metadata.get('trained_date', 'N/A'),
                 'N Treino': self.metadata.get('n_train', 'N/A'),
-                'N Teste': self.metadata.get('n_test', 'N/A')
+                'N Teste': self.metadata.get('n_test', 'N/A'),
+                'Versão': self.model_hash,
+                'Motor': ('Empírico (provisório)' if self.provisorio else 'Servidor' if self.cliente is not None
+                          else 'Logístico (recurso)' if isinstance(self.motor, ModeloLogistico)
+                          else 'NumPy' if self.motor is not None else 'H2O')
             }
         return {}
     
+    def cache_stats(self):
+        """Contadores do LRU e do store persistente de predições"""
+        return {
+            'lru': self.cache.stats() if self.cache else {},
+            'persistente': self.cache_persistente.stats() if self.cache_persistente else {},
+            'coalescedor': self.coalescedor.stats() if self.coalescedor else {}
+        }
+    
+    def stats(self):
+        """Latência por etapa (p50/p95/p99), chamadas, linhas, erros e caches"""
+        return {
+            **self.metricas.stats(),
+            'cache': self.cache_stats(),
+            'sombra': self.sombra.stats() if self.sombra is not None else {}
+        }
+    
     def shutdown(self):
-        """Desliga cluster H2O (se foi iniciado por este predictor)"""
+        """Para a vigia, o coalescedor e a sombra e desliga o cluster H2O (se foi iniciado por este processo)"""
+        if self.vigia is not None:
+            self.vigia.parar()
+        if self.coalescedor is not None:
+            self.coalescedor.parar()
+        if self.sombra is not None:
+            self.sombra.parar()
         if self.h2o_started:
-            h2o.cluster().shutdown(prompt=False)
-    
-    def __del__(self):
-        """Cleanup ao destruir objeto"""
-        self.shutdown()
+            desligar_h2o()
 
 
 # EXEMPLO DE USO
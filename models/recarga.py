@@ -0,0 +1,85 @@
+"""
+RECARGA DE MODELOS - Versões trocáveis a quente
+Cada versão (metadados + artefacto carregado) é um objeto independente: a
+nova é carregada e testada em fundo e só depois substitui a atual, numa única
+atribuição, enquanto os dashboards continuam a responder com a anterior
+"""
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+
+class VersaoModelo:
+    """
+    Estado de uma versão do modelo
+
+    Os predictors leem sempre self._versao uma vez por pedido, por isso um
+    pedido nunca mistura o hash/pipeline de uma versão com o modelo de outra.
+    """
+
+    def __init__(self, conteudo=None):
+        """
+        Args:
+            conteudo (bytes | None): Conteúdo do JSON de metadados
+        """
+        self.conteudo = conteudo
+        self.metadata = json.loads(conteudo) if conteudo else None
+        self.model_hash = hashlib.sha256(conteudo).hexdigest()[:16] if conteudo else None
+        self.model = None
+        self.motor = None
+        self.pipeline = None
+        self.tensor = None
+        self.coalescedor = None
+        self.ensemble = None
+        self.pronta = False
+
+    @classmethod
+    def ler(cls, metadata_path):
+        """Versão (ainda por carregar) a partir do ficheiro de metadados"""
+        metadata_path = Path(metadata_path)
+        return cls(metadata_path.read_bytes() if metadata_path.exists() else None)
+
+
+class VigiaMetadados:
+    """
+    Thread que verifica periodicamente o ficheiro de metadados
+
+    Quando o mtime ou o tamanho mudam, chama ao_mudar(conteudo) com os bytes
+    novos. Erros do callback são mostrados e a vigia continua.
+
+    Uso:
+        vigia = VigiaMetadados('models/modelo_defesa_metadata.json', predictor.recarregar, intervalo=5)
+        vigia.parar()
+    """
+
+    def __init__(self, caminho, ao_mudar, intervalo=5.0):
+        self.caminho = Path(caminho)
+        self.ao_mudar = ao_mudar
+        self.intervalo = intervalo
+        self._ultimo = self._assinatura()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._ciclo, daemon=True)
+        self._thread.start()
+
+    def _assinatura(self):
+        try:
+            estado = self.caminho.stat()
+            return estado.st_mtime_ns, estado.st_size
+        except FileNotFoundError:
+            return None
+
+    def _ciclo(self):
+        while not self._parar.wait(self.intervalo):
+            assinatura = self._assinatura()
+            if assinatura is None or assinatura == self._ultimo:
+                continue
+            self._ultimo = assinatura
+            try:
+                self.ao_mudar(self.caminho.read_bytes())
+            except Exception as e:
+                print(f"❌ Recarga de {self.caminho.name} falhou: {e}")
+
+    def parar(self):
+        self._parar.set()
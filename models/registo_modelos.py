@@ -0,0 +1,353 @@
+"""
+REGISTO DE MODELOS - Versões dos modelos com artefactos verificados
+Cada treino fica registado em models/registo_modelos.json com caminhos
+relativos, SHA-256 dos artefactos e métricas. O ficheiro de metadados de cada
+modelo (modelo_*_metadata.json) é o ponteiro para a versão atual: ativar ou
+reverter só reescreve esse ficheiro pequeno (os predictors trocam a quente)
+"""
+
+import hashlib
+import json
+import ntpath
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+# Permite correr este ficheiro diretamente (python models/<ficheiro>.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+REGISTO = 'registo_modelos.json'
+PONTEIROS = {
+    'defesa': 'modelo_defesa_metadata.json',
+    'compatibilidade': 'modelo_compatibilidade_metadata.json'
+}
+
+# Artefactos já carregados neste processo, por SHA-256 (ou caminho + mtime).
+# LRU: versões substituídas saem ao fim de MAX_CARREGADOS artefactos mais recentes
+_carregados = OrderedDict()
+_lock = threading.Lock()
+MAX_CARREGADOS = 8
+
+
+# =============================================================================
+# ARTEFACTOS
+# =============================================================================
+
+def sha256_ficheiro(caminho, bloco=1 << 20):
+    """SHA-256 (hex) do conteúdo de um ficheiro, lido por blocos"""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for parte in iter(lambda: f.read(bloco), b''):
+            h.update(parte)
+    return h.hexdigest()
+
+
+def resolver_artefacto(model_dir, model_path):
+    """
+    Caminho local de um artefacto dos metadados
+
+    Caminhos relativos são relativos à pasta dos modelos. Caminhos absolutos
+    de outra máquina (ex.: C:\\Users\\...) são procurados pelo nome na pasta
+    dos modelos.
+    """
+    if not ntpath.isabs(model_path) and not os.path.isabs(model_path):
+        return Path(model_dir) / model_path
+    if os.path.exists(model_path):
+        return Path(model_path)
+    return Path(model_dir) / ntpath.basename(model_path)
+
+
+def carregar_artefacto(caminho, sha256, carregar):
+    """
+    Carrega um artefacto uma única vez por processo
+
+    Com sha256 (dos metadados), o conteúdo é verificado antes do primeiro
+    carregamento e a chave da cache é o hash: reabrir a mesma versão (ex.:
+    depois de reverter) não volta a ler nem a verificar o ficheiro. Ficam no
+    máximo MAX_CARREGADOS artefactos (os usados há mais tempo saem primeiro).
+
+    Args:
+        caminho (Path): Ficheiro do artefacto
+        sha256 (str | None): Hash esperado (None = sem verificação)
+        carregar (callable): caminho -> objeto carregado
+
+    Returns:
+        O objeto devolvido por carregar (partilhado entre predictors)
+    """
+    caminho = Path(caminho)
+    if sha256:
+        chave = sha256
+    else:
+        estado = caminho.stat()
+        chave = (str(caminho.resolve()), estado.st_mtime_ns, estado.st_size)
+
+    with _lock:
+        if chave in _carregados:
+            _carregados.move_to_end(chave)
+            return _carregados[chave]
+
+    if sha256:
+        obtido = sha256_ficheiro(caminho)
+        if obtido != sha256:
+            raise ValueError(f"Artefacto corrompido ou alterado: {caminho.name} (SHA-256 {obtido[:12]} != {sha256[:12]})")
+
+    objeto = carregar(caminho)
+    with _lock:
+        objeto = _carregados.setdefault(chave, objeto)
+        _carregados.move_to_end(chave)
+        # Os predictors guardam o objeto na sua versão: sair daqui só liberta os já sem uso
+        while len(_carregados) > MAX_CARREGADOS:
+            _carregados.popitem(last=False)
+        return objeto
+
+
+def carregar_h2o(caminho, sha256=None):
+    """
+    Modelo H2O do artefacto, reutilizando o que o cluster já tiver
+
+    Workers ligados ao mesmo cluster partilham os modelos: se o model_id já
+    lá estiver (carregado por outro processo), o upload é saltado.
+    """
+    import h2o
+
+    def carregar(caminho):
+        try:
+            return h2o.get_model(caminho.name)
+        except Exception:
+            return h2o.load_model(str(caminho))
+
+    return carregar_artefacto(caminho, sha256, carregar)
+
+
+# =============================================================================
+# REGISTO
+# =============================================================================
+
+class RegistoModelos:
+    """
+    Registo de versões por tipo de modelo ('defesa', 'compatibilidade')
+
+    registo_modelos.json:
+        {tipo: {'atual': n, 'historico': [n, ...], 'candidato': n | None,
+                'versoes': {n: metadados}}}
+
+    Os metadados de cada versão levam model_path relativo, 'versao_registo'
+    e 'artefactos' ({ficheiro: sha256}).
+
+    Uso:
+        registo = RegistoModelos('models')
+        n = registo.registar('defesa', metadata)   # regista e ativa
+        registo.reverter('defesa')                  # volta à versão anterior
+    """
+
+    def __init__(self, model_dir='models'):
+        self.model_dir = Path(model_dir)
+        self.caminho = self.model_dir / REGISTO
+        self._lock = threading.Lock()
+
+    def _ler(self):
+        if not self.caminho.exists():
+            return {}
+        with open(self.caminho, 'r') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _serializar(dados):
+        return json.dumps(dados, indent=2).encode('utf-8')
+
+    def _escrever_json(self, caminho, dados):
+        """Escrita atómica (ficheiro temporário + os.replace)"""
+        temporario = caminho.with_name(caminho.name + '.tmp')
+        temporario.write_bytes(self._serializar(dados))
+        os.replace(temporario, caminho)
+
+    def registar(self, tipo, metadata, ativar=True):
+        """
+        Regista uma versão a partir dos metadados do treino
+
+        Args:
+            tipo (str): 'defesa' ou 'compatibilidade'
+            metadata (dict): Metadados do treino (model_path pode ser absoluto)
+            ativar (bool): Passar já a versão atual
+
+        Returns:
+            int: Número da versão registada
+        """
+        if tipo not in PONTEIROS:
+            raise ValueError(f"Tipo de modelo desconhecido: {tipo} (usar {list(PONTEIROS)})")
+
+        artefacto = resolver_artefacto(self.model_dir, metadata['model_path'])
+        if not artefacto.exists():
+            raise FileNotFoundError(f"Artefacto não encontrado: {artefacto}")
+
+        artefactos = {artefacto.name: sha256_ficheiro(artefacto)}
+        npz = artefacto.with_name(artefacto.name + '.npz')
+        if npz.exists():
+            artefactos[npz.name] = sha256_ficheiro(npz)
+
+        with self._lock:
+            registo = self._ler()
+            entrada = registo.setdefault(tipo, {'atual': None, 'historico': [], 'versoes': {}})
+            n = max(map(int, entrada['versoes']), default=0) + 1
+            entrada['versoes'][str(n)] = {
+                **metadata,
+                'model_path': artefacto.name,
+                'versao_registo': n,
+                'registado_em': datetime.now().isoformat(),
+                'artefactos': artefactos
+            }
+            self._escrever_json(self.caminho, registo)
+
+        print(f"✅ {tipo} v{n} registada ({artefacto.name})")
+        if ativar:
+            self.ativar(tipo, n)
+        return n
+
+    def ativar(self, tipo, versao, verificar=True):
+        """
+        Passa uma versão registada a atual (reescreve só o ponteiro)
+
+        Args:
+            tipo (str): 'defesa' ou 'compatibilidade'
+            versao (int): Número da versão
+            verificar (bool): Confirmar os SHA-256 dos artefactos antes
+        """
+        with self._lock:
+            registo = self._ler()
+            entrada = registo.get(tipo, {})
+            metadata = entrada.get('versoes', {}).get(str(versao))
+            if metadata is None:
+                raise KeyError(f"Versão {versao} de {tipo} não registada")
+            if verificar:
+                self._verificar(metadata)
+
+            if entrada['atual'] is not None and entrada['atual'] != int(versao):
+                entrada['historico'].append(entrada['atual'])
+            entrada['atual'] = int(versao)
+            if entrada.get('candidato') == int(versao):
+                entrada['candidato'] = None
+
+            # O ponteiro é o ficheiro de metadados lido pelos predictors
+            self._escrever_json(self.model_dir / PONTEIROS[tipo], metadata)
+            self._escrever_json(self.caminho, registo)
+
+        print(f"✅ {tipo}: versão atual v{versao}")
+
+    def reverter(self, tipo):
+        """Volta à versão ativa anterior; devolve o número da versão"""
+        with self._lock:
+            registo = self._ler()
+            entrada = registo.get(tipo, {})
+            if not entrada.get('historico'):
+                raise ValueError(f"Sem versão anterior de {tipo} para reverter")
+            anterior = entrada['historico'].pop()
+            metadata = entrada['versoes'][str(anterior)]
+            entrada['atual'] = anterior
+            self._escrever_json(self.model_dir / PONTEIROS[tipo], metadata)
+            self._escrever_json(self.caminho, registo)
+
+        print(f"↩️ {tipo}: revertido para v{anterior}")
+        return anterior
+
+    def _verificar(self, metadata):
+        for nome, esperado in metadata.get('artefactos', {}).items():
+            caminho = self.model_dir / nome
+            if not caminho.exists():
+                raise FileNotFoundError(f"Artefacto em falta: {caminho}")
+            if sha256_ficheiro(caminho) != esperado:
+                raise ValueError(f"SHA-256 de {nome} não corresponde ao registo")
+
+    def verificar(self, tipo, versao=None):
+        """Confirma os artefactos de uma versão (por omissão a atual)"""
+        entrada = self._ler().get(tipo, {})
+        versao = versao if versao is not None else entrada.get('atual')
+        self._verificar(entrada['versoes'][str(versao)])
+        return True
+
+    def versoes(self, tipo):
+        """Lista de (número, metadados) de um tipo, da mais antiga para a mais recente"""
+        entrada = self._ler().get(tipo, {})
+        return sorted(((int(n), m) for n, m in entrada.get('versoes', {}).items()), key=lambda x: x[0])
+
+    def atual(self, tipo):
+        """Número da versão atual (None se o tipo não estiver registado)"""
+        return self._ler().get(tipo, {}).get('atual')
+
+    def conteudo(self, tipo, versao):
+        """Bytes dos metadados de uma versão, iguais aos do ponteiro se for ativada (mesmo hash)"""
+        metadata = self._ler().get(tipo, {}).get('versoes', {}).get(str(versao))
+        if metadata is None:
+            raise KeyError(f"Versão {versao} de {tipo} não registada")
+        return self._serializar(metadata)
+
+    def definir_candidato(self, tipo, versao):
+        """Versão pontuada em sombra contra a atual (None = nenhuma)"""
+        with self._lock:
+            registo = self._ler()
+            entrada = registo.get(tipo, {})
+            if versao is not None and str(versao) not in entrada.get('versoes', {}):
+                raise KeyError(f"Versão {versao} de {tipo} não registada")
+            entrada['candidato'] = None if versao is None else int(versao)
+            self._escrever_json(self.caminho, registo)
+        print(f"✅ {tipo}: candidato {'nenhum' if versao is None else f'v{versao}'}")
+
+    def candidato(self, tipo):
+        """Número da versão candidata (None se não houver)"""
+        return self._ler().get(tipo, {}).get('candidato')
+
+    def importar_ponteiros(self):
+        """Regista os metadados existentes (treinos anteriores ao registo)"""
+        for tipo, nome in PONTEIROS.items():
+            caminho = self.model_dir / nome
+            if not caminho.exists():
+                continue
+            with open(caminho, 'r') as f:
+                metadata = json.load(f)
+            if 'versao_registo' in metadata:
+                continue
+            self.registar(tipo, metadata)
+
+
+# LINHA DE COMANDOS
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Registo de versões dos modelos do Digital Twin")
+    parser.add_argument('--model-dir', default=str(Path(__file__).parent), help="Pasta dos modelos")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    sub.add_parser('importar', help="Registar os metadados atuais")
+    listar = sub.add_parser('listar', help="Versões registadas")
+    listar.add_argument('tipo', choices=list(PONTEIROS))
+    ativar = sub.add_parser('ativar', help="Passar uma versão a atual")
+    ativar.add_argument('tipo', choices=list(PONTEIROS))
+    ativar.add_argument('versao', type=int)
+    reverter = sub.add_parser('reverter', help="Voltar à versão anterior")
+    reverter.add_argument('tipo', choices=list(PONTEIROS))
+    verificar = sub.add_parser('verificar', help="Confirmar SHA-256 da versão atual")
+    verificar.add_argument('tipo', choices=list(PONTEIROS))
+    candidato = sub.add_parser('candidato', help="Versão a pontuar em sombra (sem versão = nenhuma)")
+    candidato.add_argument('tipo', choices=list(PONTEIROS))
+    candidato.add_argument('versao', type=int, nargs='?')
+    args = parser.parse_args()
+
+    registo = RegistoModelos(args.model_dir)
+    if args.comando == 'importar':
+        registo.importar_ponteiros()
+    elif args.comando == 'listar':
+        atual, candidato = registo.atual(args.tipo), registo.candidato(args.tipo)
+        for n, m in registo.versoes(args.tipo):
+            metrica = f"AUC={m['auc']:.3f}" if 'auc' in m else f"RMSE={m.get('rmse', float('nan')):.2f}%"
+            marca = '*' if n == atual else 's' if n == candidato else ' '
+            print(f"{marca} v{n}  {m['model_path']}  {metrica}  {m.get('trained_date', '')}")
+    elif args.comando == 'ativar':
+        registo.ativar(args.tipo, args.versao)
+    elif args.comando == 'reverter':
+        registo.reverter(args.tipo)
+    elif args.comando == 'verificar':
+        registo.verificar(args.tipo)
+        print(f"✅ Artefactos de {args.tipo} v{registo.atual(args.tipo)} verificados")
+    elif args.comando == 'candidato':
+        registo.definir_candidato(args.tipo, args.versao)
@@ -0,0 +1,246 @@
+"""
+SERVIDOR DE SCORING - Daemon local que serve os dois modelos por Unix socket
+Um processo carrega os modelos de defesa e compatibilidade uma vez; os workers
+do Streamlit ligam-se como clientes (DefesaPredictor/CompatibilidadePredictor
+com servidor=...) e podem ser repartidos por vários daemons em round-robin
+
+Protocolo binário (little-endian), cada mensagem precedida do tamanho (uint32):
+    Pedido:   modelo (uint8: 0 defesa, 1 compatibilidade), n_colunas (uint16),
+              n_linhas (uint32); por coluna: tipo (uint8: 0 float64, 1 texto),
+              tamanho do nome (uint16), nome UTF-8 e os valores
+              (float64 × n_linhas, ou tamanho uint32 + textos UTF-8 separados por \\x1f)
+    Resposta: estado (uint8: 0 ok, 1 erro), n (uint32) e n float64
+              (ou mensagem de erro UTF-8 com n bytes)
+"""
+
+import itertools
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import numpy as np
+from pathlib import Path
+
+# Permite correr este ficheiro diretamente (python models/<ficheiro>.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+MODELOS = {'defesa': 0, 'compatibilidade': 1}
+SOCKET_PADRAO = '/tmp/digital_twin_scoring.sock'
+
+_TAMANHO = struct.Struct('<I')
+_CABECALHO = struct.Struct('<BHI')
+_COLUNA = struct.Struct('<BH')
+_RESPOSTA = struct.Struct('<BI')
+_SEPARADOR = '\x1f'
+
+
+# =============================================================================
+# PROTOCOLO
+# =============================================================================
+
+def codificar_pedido(modelo, colunas):
+    """Pedido binário com as colunas (números como float64, texto como UTF-8)"""
+    n = len(next(iter(colunas.values())))
+    partes = [_CABECALHO.pack(MODELOS[modelo], len(colunas), n)]
+    for nome, valores in colunas.items():
+        nome_b = nome.encode('utf-8')
+        if any(isinstance(v, str) for v in valores):
+            texto = _SEPARADOR.join(str(v) for v in valores).encode('utf-8')
+            partes += [_COLUNA.pack(1, len(nome_b)), nome_b, _TAMANHO.pack(len(texto)), texto]
+        else:
+            partes += [_COLUNA.pack(0, len(nome_b)), nome_b,
+                       np.asarray(valores, dtype='<f8').tobytes()]
+    return b''.join(partes)
+
+
+def descodificar_pedido(dados):
+    """(modelo, colunas) a partir do pedido binário"""
+    id_modelo, n_colunas, n = _CABECALHO.unpack_from(dados, 0)
+    pos = _CABECALHO.size
+    colunas = {}
+    for _ in range(n_colunas):
+        tipo, tam_nome = _COLUNA.unpack_from(dados, pos)
+        pos += _COLUNA.size
+        nome = dados[pos:pos + tam_nome].decode('utf-8')
+        pos += tam_nome
+        if tipo == 1:
+            (tam,) = _TAMANHO.unpack_from(dados, pos)
+            pos += _TAMANHO.size
+            colunas[nome] = dados[pos:pos + tam].decode('utf-8').split(_SEPARADOR) if n else []
+            pos += tam
+        else:
+            colunas[nome] = np.frombuffer(dados, dtype='<f8', count=n, offset=pos).tolist()
+            pos += 8 * n
+    modelo = {v: k for k, v in MODELOS.items()}[id_modelo]
+    return modelo, colunas
+
+
+def _enviar(sock, dados):
+    sock.sendall(_TAMANHO.pack(len(dados)) + dados)
+
+
+def _receber_exato(sock, n):
+    partes = []
+    while n:
+        parte = sock.recv(min(n, 1 << 20))
+        if not parte:
+            raise ConnectionError("Ligação fechada pelo outro lado")
+        partes.append(parte)
+        n -= len(parte)
+    return b''.join(partes)
+
+
+def _receber(sock):
+    (n,) = _TAMANHO.unpack(_receber_exato(sock, _TAMANHO.size))
+    return _receber_exato(sock, n)
+
+
+# =============================================================================
+# SERVIDOR
+# =============================================================================
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Uma ligação persistente por worker; responde a pedidos até o cliente fechar"""
+
+    def handle(self):
+        while True:
+            try:
+                pedido = _receber(self.request)
+            except ConnectionError:
+                return
+            try:
+                modelo, colunas = descodificar_pedido(pedido)
+                valores = np.asarray(self.server.predictors[modelo]._pontuar(colunas), dtype='<f8')
+                resposta = _RESPOSTA.pack(0, len(valores)) + valores.tobytes()
+            except Exception as e:
+                erro = f"{type(e).__name__}: {e}".encode('utf-8')
+                resposta = _RESPOSTA.pack(1, len(erro)) + erro
+            _enviar(self.request, resposta)
+
+
+class ServidorScoring(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Daemon de scoring (uma thread por ligação)
+
+    Os predictors são os do gestor de modelos deste processo, com as caches
+    e o coalescedor: pedidos de vários workers ao mesmo tempo seguem num só lote.
+
+    Uso:
+        servidor = ServidorScoring('/tmp/digital_twin_scoring.sock', model_dir='models')
+        servidor.serve_forever()
+    """
+
+    daemon_threads = True
+
+    def __init__(self, caminho=SOCKET_PADRAO, model_dir='models', cache_db='models/cache_predicoes.db'):
+        from models.gestor_modelos import obter_compatibilidade, obter_defesa
+
+        self.predictors = {
+            'defesa': obter_defesa(model_dir, cache_db=cache_db, assincrono=False, usar_tensor=False,
+                                   servidor=None),
+            'compatibilidade': obter_compatibilidade(model_dir, cache_db=cache_db, servidor=None)
+        }
+
+        if os.path.exists(caminho):
+            os.unlink(caminho)
+        super().__init__(caminho, _Handler)
+        self.caminho = caminho
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.caminho):
+            os.unlink(self.caminho)
+
+
+# =============================================================================
+# CLIENTE
+# =============================================================================
+
+class ClienteScoring:
+    """
+    Cliente dos daemons de scoring, com round-robin entre sockets
+
+    Cada thread mantém uma ligação persistente por daemon. Se um daemon
+    falhar, o pedido é repetido no seguinte.
+
+    Uso:
+        cliente = ClienteScoring(['/tmp/scoring_1.sock', '/tmp/scoring_2.sock'])
+        probs = cliente.pontuar('defesa', {'zona_baliza_id': [5], ...})
+    """
+
+    def __init__(self, sockets, timeout=30.0):
+        if isinstance(sockets, (str, Path)):
+            sockets = [s for s in str(sockets).split(',') if s]
+        if not sockets:
+            raise ValueError("Nenhum socket de scoring indicado")
+        self.sockets = [str(s) for s in sockets]
+        self.timeout = timeout
+        self._ciclo = itertools.cycle(range(len(self.sockets)))
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _ligacao(self, i):
+        ligacoes = self._local.__dict__.setdefault('ligacoes', {})
+        sock = ligacoes.get(i)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.sockets[i])
+            ligacoes[i] = sock
+        return sock
+
+    def _fechar(self, i):
+        sock = self._local.__dict__.get('ligacoes', {}).pop(i, None)
+        if sock is not None:
+            sock.close()
+
+    def pontuar(self, modelo, colunas):
+        """Predições (float64) do modelo para as colunas, pedidas ao próximo daemon"""
+        pedido = codificar_pedido(modelo, colunas)
+        with self._lock:
+            primeiro = next(self._ciclo)
+
+        ultimo_erro = None
+        for k in range(len(self.sockets)):
+            i = (primeiro + k) % len(self.sockets)
+            try:
+                sock = self._ligacao(i)
+                _enviar(sock, pedido)
+                resposta = _receber(sock)
+            except OSError as e:
+                self._fechar(i)
+                ultimo_erro = e
+                continue
+
+            estado, n = _RESPOSTA.unpack_from(resposta, 0)
+            if estado != 0:
+                raise RuntimeError(f"Servidor de scoring: {resposta[_RESPOSTA.size:].decode('utf-8')}")
+            return np.frombuffer(resposta, dtype='<f8', count=n, offset=_RESPOSTA.size).copy()
+
+        raise ConnectionError(f"Nenhum servidor de scoring disponível ({ultimo_erro})")
+
+
+# ARRANQUE DO DAEMON
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Daemon de scoring dos modelos do Digital Twin")
+    parser.add_argument('--socket', default=SOCKET_PADRAO, help="Caminho do Unix socket")
+    parser.add_argument('--model-dir', default=str(Path(__file__).parent), help="Pasta dos modelos")
+    parser.add_argument('--cache-db', default=None, help="Store SQLite de predições (opcional)")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("SERVIDOR DE SCORING")
+    print("="*60)
+
+    servidor = ServidorScoring(args.socket, model_dir=args.model_dir, cache_db=args.cache_db)
+    print(f"✅ À escuta em {args.socket}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
@@ -0,0 +1,143 @@
+"""
+SCORING SOMBRA - Modelo candidato pontuado em paralelo com o de produção
+Cada pedido dos dashboards é repetido num pool de threads com o candidato,
+fora do caminho da resposta; as duas saídas e a discordância por zona ficam
+num log JSONL e em contadores acumulados (stats) para decidir a promoção
+"""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+
+
+# Acima deste número de valores por pedido, o log guarda só o resumo por zona
+MAX_VALORES_LOG = 1000
+
+
+class Sombra:
+    """
+    Pontuação sombra de um candidato (nunca atrasa nem altera a resposta)
+
+    Os pedidos são descartados (e contados) se o pool tiver mais de
+    max_pendentes por tratar, para a sombra nunca acumular atraso.
+
+    Uso:
+        sombra = Sombra(candidato, log_path='models/sombra_defesa.jsonl')
+        sombra.submeter(lambda: candidato.predict_matrix(grs, contextos), probs, zonas, hash_atual)
+        print(sombra.stats())
+    """
+
+    def __init__(self, candidato, log_path=None, max_workers=1, max_pendentes=32):
+        """
+        Args:
+            candidato: Predictor do modelo candidato (model_hash usado no log)
+            log_path (str | Path | None): Ficheiro JSONL (None = só contadores)
+            max_workers (int): Threads do pool
+            max_pendentes (int): Pedidos em espera a partir dos quais se descarta
+        """
+        self.candidato = candidato
+        self.log_path = Path(log_path) if log_path else None
+        self.max_pendentes = max_pendentes
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sombra')
+        self._lock = threading.Lock()
+        self._pendentes = 0
+        self.pedidos = 0
+        self.descartados = 0
+        self.erros = 0
+        # Por zona: n, soma das diferenças, soma |diferença|, soma diferença²
+        self._zonas = np.zeros((9, 4))
+
+    def submeter(self, pontuar_candidato, primario, zonas, primario_hash):
+        """
+        Agenda a comparação e volta logo
+
+        Args:
+            pontuar_candidato (callable): () -> predições do candidato, mesma
+                shape e unidades (0-100%) que primario
+            primario (np.ndarray): Predições devolvidas ao dashboard
+            zonas (np.ndarray): Zona (1-9) de cada predição, mesma shape
+            primario_hash (str): Versão do modelo de produção
+        """
+        with self._lock:
+            if self._pendentes >= self.max_pendentes:
+                self.descartados += 1
+                return
+            self._pendentes += 1
+        primario = np.array(primario, dtype=float)
+        zonas = np.asarray(zonas, dtype=int)
+        self._pool.submit(self._comparar, pontuar_candidato, primario, zonas, primario_hash)
+
+    def _comparar(self, pontuar_candidato, primario, zonas, primario_hash):
+        try:
+            candidato = np.asarray(pontuar_candidato(), dtype=float)
+            diferenca = (candidato - primario).ravel()
+            indices = zonas.ravel() - 1
+
+            acumulado = np.zeros((9, 4))
+            np.add.at(acumulado, (indices, 0), 1)
+            np.add.at(acumulado, (indices, 1), diferenca)
+            np.add.at(acumulado, (indices, 2), np.abs(diferenca))
+            np.add.at(acumulado, (indices, 3), diferenca ** 2)
+
+            with self._lock:
+                self._zonas += acumulado
+                self.pedidos += 1
+
+            if self.log_path is not None:
+                self._escrever(primario, candidato, acumulado, primario_hash)
+        except Exception as e:
+            with self._lock:
+                self.erros += 1
+            print(f"❌ Scoring sombra falhou: {e}")
+        finally:
+            with self._lock:
+                self._pendentes -= 1
+
+    def _escrever(self, primario, candidato, acumulado, primario_hash):
+        registo = {
+            'quando': datetime.now().isoformat(),
+            'primario_hash': primario_hash,
+            'candidato_hash': self.candidato.model_hash,
+            'n': int(primario.size),
+            'por_zona': self._resumo_zonas(acumulado)
+        }
+        if primario.size <= MAX_VALORES_LOG:
+            registo['primario'] = np.round(primario.ravel(), 2).tolist()
+            registo['candidato'] = np.round(candidato.ravel(), 2).tolist()
+        linha = json.dumps(registo, separators=(',', ':'))
+        with self._lock:
+            with open(self.log_path, 'a') as f:
+                f.write(linha + '\n')
+
+    @staticmethod
+    def _resumo_zonas(acumulado):
+        """Diferença média (candidato - produção), |diferença| média e RMSE por zona"""
+        resumo = {}
+        for zona, (n, soma, soma_abs, soma_2) in enumerate(acumulado, start=1):
+            if n:
+                resumo[zona] = {
+                    'n': int(n),
+                    'dif_media': round(soma / n, 3),
+                    'dif_abs_media': round(soma_abs / n, 3),
+                    'rmse': round(float(np.sqrt(soma_2 / n)), 3)
+                }
+        return resumo
+
+    def stats(self):
+        """Contadores e discordância acumulada por zona (pontos percentuais)"""
+        with self._lock:
+            return {
+                'candidato_hash': self.candidato.model_hash,
+                'pedidos': self.pedidos,
+                'descartados': self.descartados,
+                'erros': self.erros,
+                'pendentes': self._pendentes,
+                'por_zona': self._resumo_zonas(self._zonas)
+            }
+
+    def parar(self):
+        """Termina o pool (espera pelas comparações em curso)"""
+        self._pool.shutdown(wait=True)
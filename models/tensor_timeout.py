@@ -0,0 +1,171 @@
+"""
+TENSOR TIMEOUT - Predições pré-calculadas para o espaço dos sliders do Timeout
+Pontua uma vez por versão de modelo todas as combinações distância × velocidade ×
+fase/fadiga × diferença de golos × GR × zona e guarda-as num .npy memory-mapped
+"""
+
+import json
+import numpy as np
+from pathlib import Path
+
+
+# Valores possíveis dos sliders do Timeout
+EIXOS = {
+    'distancia': np.round(np.arange(6.0, 12.01, 0.5), 1),
+    'velocidade': np.arange(70, 121),
+    'minuto': np.arange(0, 61),
+    'diferenca_golos': np.arange(-10, 11),
+}
+
+# Probabilidades guardadas como décimas de ponto percentual (0-1000)
+ESCALA = 10
+
+
+def caminho_tensor(model_dir, model_hash):
+    """Caminho do .npy do tensor (o .json de eixos fica ao lado)"""
+    return Path(model_dir) / f"tensor_timeout_{model_hash}.npy"
+
+
+def construir_tensor(predictor, grs, model_dir):
+    """
+    Pontua todo o espaço do Timeout e guarda o tensor
+
+    Os minutos são agrupados pelo valor da feature temporal que o predictor
+    envia ao modelo (fase ou fadiga), por isso só é pontuado um minuto por
+    bucket.
+
+    Args:
+        predictor (DefesaPredictor): Predictor com o modelo atual
+        grs (DataFrame): GRs (altura_cm, envergadura_cm, velocidade_lateral_ms)
+        model_dir (str | Path): Pasta onde guardar o tensor
+
+    Returns:
+        Path: Caminho do .npy criado
+    """
+    grs = grs[['altura_cm', 'envergadura_cm', 'velocidade_lateral_ms']].reset_index(drop=True)
+
+    # Buckets temporais: minutos com o mesmo valor de feature partilham predição
+    chaves = [predictor.chave_temporal(m) for m in EIXOS['minuto']]
+    buckets = list(dict.fromkeys(chaves))
+    minuto_bucket = [buckets.index(c) for c in chaves]
+    minuto_repr = [int(EIXOS['minuto'][chaves.index(b)]) for b in buckets]
+
+    forma = (len(grs), len(EIXOS['distancia']), len(EIXOS['velocidade']),
+             len(buckets), len(EIXOS['diferenca_golos']), 9)
+    destino = caminho_tensor(model_dir, predictor.model_hash)
+    tensor = np.lib.format.open_memmap(destino, mode='w+', dtype=np.uint16, shape=forma)
+
+    # Um pedido por (distância, velocidade): todos os buckets e diferenças
+    for i_dist, distancia in enumerate(EIXOS['distancia']):
+        for i_vel, velocidade in enumerate(EIXOS['velocidade']):
+            contextos = [
+                {'distancia': float(distancia), 'velocidade': int(velocidade), 'minuto': m, 'diferenca_golos': int(d)}
+                for m in minuto_repr for d in EIXOS['diferenca_golos']
+            ]
+            probs = predictor.predict_matrix(grs, contextos, usar_tensor=False)
+            # (ctx, gr, 3, 3) -> (gr, bucket, dif, 9)
+            probs = probs.reshape(forma[3], forma[4], len(grs), 9).transpose(2, 0, 1, 3)
+            tensor[:, i_dist, i_vel] = np.round(probs * ESCALA).astype(np.uint16)
+
+    tensor.flush()
+    del tensor
+
+    # Amostra de verificação: detecta tensores desatualizados face ao predictor
+    amostra = {'distancia': 9.0, 'velocidade': 95, 'minuto': 42, 'diferenca_golos': 0}
+    verificacao = predictor.predict_matrix(grs, [amostra], usar_tensor=False)[0]
+
+    with open(destino.with_suffix('.json'), 'w') as f:
+        json.dump({
+            'model_hash': predictor.model_hash,
+            'forma': forma,
+            'eixos': {k: v.tolist() for k, v in EIXOS.items()},
+            'minuto_bucket': minuto_bucket,
+            'grs': grs.values.tolist(),
+            'verificacao': {'contexto': amostra, 'probs': verificacao.tolist()}
+        }, f, indent=2)
+
+    print(f"✅ Tensor {forma} guardado em {destino} ({destino.stat().st_size / 1e6:.1f} MB)")
+    return destino
+
+
+class TensorTimeout:
+    """
+    Consulta O(1) do tensor pré-calculado
+
+    Uso:
+        tensor = TensorTimeout.carregar('models', predictor.model_hash)
+        grids = tensor.procurar(grs, distancia=9.0, velocidade=95, minuto=42, diferenca_golos=0)
+    """
+
+    def __init__(self, tensor, info):
+        self.tensor = tensor
+        self.info = info
+        self.eixos = {k: np.asarray(v) for k, v in info['eixos'].items()}
+        self.minuto_bucket = np.asarray(info['minuto_bucket'])
+        self._indice_gr = {tuple(gr): i for i, gr in enumerate(info['grs'])}
+
+    @classmethod
+    def carregar(cls, model_dir, model_hash):
+        """Abre o tensor do modelo em modo memory-map (None se não existir)"""
+        caminho = caminho_tensor(model_dir, model_hash)
+        if not caminho.exists() or not caminho.with_suffix('.json').exists():
+            return None
+        with open(caminho.with_suffix('.json'), 'r') as f:
+            info = json.load(f)
+        return cls(np.load(caminho, mmap_mode='r'), info)
+
+    def _indice(self, eixo, valor):
+        """Índice do valor no eixo (None se fora da grelha)"""
+        i = int(np.searchsorted(self.eixos[eixo], valor))
+        if i < len(self.eixos[eixo]) and np.isclose(self.eixos[eixo][i], valor):
+            return i
+        return None
+
+    def procurar(self, grs, distancia, velocidade, minuto, diferenca_golos):
+        """
+        Grids 3x3 (0-100%) de todos os GRs, shape (n_gr, 3, 3)
+
+        Returns:
+            np.ndarray | None: None se o contexto ou algum GR não estiver no tensor
+        """
+        i_dist = self._indice('distancia', distancia)
+        i_vel = self._indice('velocidade', velocidade)
+        i_min = self._indice('minuto', minuto)
+        i_dif = self._indice('diferenca_golos', diferenca_golos)
+        if None in (i_dist, i_vel, i_min, i_dif):
+            return None
+
+        chaves = zip(grs['altura_cm'], grs['envergadura_cm'], grs['velocidade_lateral_ms'])
+        i_grs = [self._indice_gr.get((int(a), int(e), float(v))) for a, e, v in chaves]
+        if None in i_grs:
+            return None
+
+        bloco = self.tensor[i_grs, i_dist, i_vel, self.minuto_bucket[i_min], i_dif]
+        return bloco.reshape(len(i_grs), 3, 3) / ESCALA
+
+
+# BUILD DO TENSOR PARA O MODELO ATUAL
+if __name__ == "__main__":
+    import sys
+    import sqlite3
+    import pandas as pd
+
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    from models.predictor_defesa import DefesaPredictor
+
+    model_dir = Path(__file__).parent
+    db_path = model_dir.parent / 'handball_dt.db'
+
+    print("="*60)
+    print("BUILD DO TENSOR DO TIMEOUT")
+    print("="*60)
+
+    with sqlite3.connect(db_path) as conn:
+        grs = pd.read_sql_query(
+            "SELECT altura_cm, envergadura_cm, velocidade_lateral_ms FROM guarda_redes ORDER BY id", conn
+        )
+
+    # Sem tensor (a reconstruir) nem LRU (cada contexto só é pontuado uma vez)
+    predictor = DefesaPredictor(model_dir=model_dir, usar_tensor=False, tamanho_cache=0)
+    construir_tensor(predictor, grs, model_dir)
+    predictor.shutdown()
@@ -13,7 +13,7 @@ sys.path.append('..')
 
 # H2O
 try:
-    from models.predictor_defesa import DefesaPredictor
+    from models.gestor_modelos import obter_defesa
     H2O_OK = True
 except:
     H2O_OK = False
@@ -30,11 +30,11 @@ with open('styles/custom.css') as f:
 def get_db():
     return HandballDataAccess()
 
-@st.cache_resource
 def get_predictor():
+    # Instância única do processo, partilhada com as outras páginas
     if H2O_OK:
         try:
-            return DefesaPredictor(model_dir='models')
+            return obter_defesa()
         except:
             return None
     return None
@@ -138,25 +138,13 @@ def get_distribuicao_adversario(adv):
     return grid
 
 
-def calcular_probs_h2o(gr, predictor, dist, vel, minuto, dif):
-    """Calcula prob defesa para 9 zonas, retorna grid 3x3"""
-    probs = []
-    for zona in range(1, 10):
-        try:
-            p = predictor.predict(
-                zona=zona, distancia=dist, velocidade=vel,
-                altura_gr=int(gr['altura_cm']),
-                envergadura_gr=int(gr['envergadura_cm']),
-                vel_lateral_gr=float(gr['velocidade_lateral_ms']),
-                minuto=minuto, diferenca_golos=dif
-            )
-            probs.append(p)
-        except:
-            probs.append(50.0)
-    
+def calcular_probs_h2o(grs, predictor, dist, vel, minuto, dif):
+    """Calcula prob defesa para 9 zonas de todos os GRs, retorna grids (n_gr, 3, 3)"""
     # Zonas 1-3=Superior, 4-6=Meio, 7-9=Inferior
-    grid = np.array(probs).reshape(3, 3)
-    return grid
+    try:
+        return predictor.predict_grid(grs, dist, vel, minuto, dif)
+    except:
+        return np.full((len(grs), 3, 3), 50.0)
 
 
 def calcular_media_ponderada(grid_defesa, grid_adversario):
@@ -179,15 +167,13 @@ with st.sidebar:
     
     # Adversário
     query = "SELECT id, nome FROM adversarios ORDER BY ranking_liga"
-    with db.get_connection() as conn:
-        advs = pd.read_sql_query(query, conn)
+    advs = db.read_query(query)
     
     adv_nome = st.selectbox("Adversário", advs['nome'].tolist())
     adv_id = int(advs[advs['nome'] == adv_nome]['id'].values[0])
     
     query = "SELECT * FROM adversarios WHERE id = ?"
-    with db.get_connection() as conn:
-        adv = pd.read_sql_query(query, conn, params=(adv_id,)).iloc[0]
+    adv = db.read_query(query, (adv_id,)).iloc[0]
     
     st.divider()
     st.markdown("## ⚙️ Condições")
@@ -219,6 +205,13 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+# Modelo ainda a carregar (ou indisponível): valores provisórios
+if predictor.provisorio:
+    if predictor.erro_arranque:
+        st.warning("⚠️ Modelo H2O não disponível - probabilidades **provisórias** (taxas empíricas por zona)")
+    else:
+        st.info("⏳ Modelo H2O a carregar - probabilidades **provisórias** (taxas empíricas por zona). Atualizam automaticamente no próximo ajuste.")
+
 # =============================================================================
 # CARREGAR DADOS (continua...)
 # =============================================================================
@@ -228,16 +221,17 @@ st.markdown(f"""
 # =============================================================================
 # GRs
 query = "SELECT * FROM guarda_redes"
-with db.get_connection() as conn:
-    grs = pd.read_sql_query(query, conn)
+grs = db.read_query(query)
 
 # Distribuição adversário
 dist_adv = get_distribuicao_adversario(adv)
 
 # Calcular ranking H2O
+grids = calcular_probs_h2o(grs, predictor, cond_dist, cond_vel, cond_minuto, cond_dif)
+
 ranking = []
-for _, gr in grs.iterrows():
-    grid = calcular_probs_h2o(gr, predictor, cond_dist, cond_vel, cond_minuto, cond_dif)
+for i, (_, gr) in enumerate(grs.iterrows()):
+    grid = grids[i]
     media = calcular_media_ponderada(grid, dist_adv)
     ranking.append({
         'id': gr['id'],
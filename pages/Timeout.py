@@ -13,7 +13,8 @@ sys.path.append('..')
 
 # H2O
 try:
-    from models.predictor_defesa import DefesaPredictor
+    from models.gestor_modelos import obter_defesa
+    from models.incerteza import prob_superioridade
     H2O_OK = True
 except:
     H2O_OK = False
@@ -30,11 +31,11 @@ with open('styles/custom.css') as f:
 def get_db():
     return HandballDataAccess()
 
-@st.cache_resource
 def get_predictor():
+    # Instância única do processo, partilhada com as outras páginas
     if H2O_OK:
         try:
-            return DefesaPredictor(model_dir='models')
+            return obter_defesa()
         except:
             return None
     return None
@@ -116,25 +117,32 @@ def heatmap_baliza(grid, titulo="", height=400, destacar_fracas=None):
 # =============================================================================
 # CALCULAR PROBS H2O
 # =============================================================================
-def calcular_probs_gr(gr, predictor, dist, vel, minuto, dif):
-    """Retorna grid 3x3 e média"""
-    probs = []
-    for zona in range(1, 10):
-        try:
-            p = predictor.predict(
-                zona=zona, distancia=dist, velocidade=vel,
-                altura_gr=int(gr['altura_cm']),
-                envergadura_gr=int(gr['envergadura_cm']),
-                vel_lateral_gr=float(gr['velocidade_lateral_ms']),
-                minuto=minuto, diferenca_golos=dif
-            )
-            probs.append(p)
-        except:
-            probs.append(50.0)
-    
-    grid = np.array(probs).reshape(3, 3)
-    media = np.mean(probs)
-    return grid, media, probs
+def calcular_probs_grs(grs, predictor, contextos):
+    """Retorna grids 3x3 de todos os GRs por contexto (n_ctx, n_gr, 3, 3) num só pedido"""
+    try:
+        return predictor.predict_matrix(grs, contextos)
+    except:
+        return np.full((len(contextos), len(grs), 3, 3), 50.0)
+
+def calcular_incerteza(grs, predictor, contextos):
+    """Grids + intervalos bootstrap e P(GR i > GR j) por contexto; None se indisponível"""
+    try:
+        r = predictor.predict_matrix_intervalos(grs, contextos, nivel=0.9)
+        medias = r['amostras'].mean(axis=(3, 4))
+        r['ic_media'] = np.percentile(medias, [5, 95], axis=0)
+        r['p_superior'] = [prob_superioridade(r['amostras'][:, i]) for i in range(len(contextos))]
+        return r
+    except:
+        return None
+
+def calcular_sweep_minutos(grs, predictor, minuto, dist, vel, dif):
+    """Média das 9 zonas por minuto (minuto atual -> 60) e GR, shape (n_min, n_gr), num só pedido"""
+    try:
+        probs = predictor.sweep(grs, {'minuto': range(minuto, 61)},
+                                distancia=dist, velocidade=vel, diferenca_golos=dif)
+        return probs.mean(axis=(2, 3))
+    except:
+        return None
 
 # =============================================================================
 # GERAR RECOMENDAÇÕES TÁTICAS
@@ -317,21 +325,18 @@ with st.sidebar:
     st.markdown("## ⚡ CONTEXTO")
     
     query = "SELECT id, nome FROM adversarios ORDER BY ranking_liga"
-    with db.get_connection() as conn:
-        advs = pd.read_sql_query(query, conn)
+    advs = db.read_query(query)
     
     adv_nome = st.selectbox("Adversário", advs['nome'].tolist())
     adv_id = int(advs[advs['nome'] == adv_nome]['id'].values[0])
     
     query = "SELECT * FROM adversarios WHERE id = ?"
-    with db.get_connection() as conn:
-        adv_info = pd.read_sql_query(query, conn, params=(adv_id,)).iloc[0]
+    adv_info = db.read_query(query, (adv_id,)).iloc[0]
     
     st.divider()
     
     query = "SELECT * FROM guarda_redes"
-    with db.get_connection() as conn:
-        grs = pd.read_sql_query(query, conn)
+    grs = db.read_query(query)
     
     gr_atual_nome = st.selectbox("GR em Campo", grs['nome'].tolist())
     gr_atual = grs[grs['nome'] == gr_atual_nome].iloc[0]
@@ -373,12 +378,37 @@ zona_adv_forte_idx = np.argmax(dist_adv.flatten())
 # =============================================================================
 # CALCULAR RANKING
 # =============================================================================
+# Jogo normal + pênalti (7m) num único pedido ao H2O
+provisorio = predictor.provisorio
+vel_penalty = st.session_state.get('vel_pen', int(adv_info['velocidade_media_remate_kmh']))
+contextos = [
+    {'distancia': dist, 'velocidade': vel, 'minuto': minuto, 'diferenca_golos': diferenca},
+    {'distancia': 7.0, 'velocidade': vel_penalty, 'minuto': minuto, 'diferenca_golos': diferenca}
+]
+
+# Intervalos bootstrap (ensemble numa só passagem); sem eles, só os grids
+incerteza = None if provisorio else calcular_incerteza(grs, predictor, contextos)
+if incerteza is not None:
+    grids_jogo, grids_pen = incerteza['probs']
+else:
+    grids_jogo, grids_pen = calcular_probs_grs(grs, predictor, contextos)
+
+def prob_melhor(a, b, ctx=0):
+    """P(GR a com média superior ao GR b) no contexto; None sem incerteza"""
+    return None if incerteza is None else incerteza['p_superior'][ctx][a, b]
+
+def texto_ic(i, ctx=0):
+    if incerteza is None:
+        return ""
+    lo, hi = incerteza['ic_media'][:, ctx, i]
+    return f"IC 90%: {lo:.0f}–{hi:.0f}%"
+
 ranking = []
-for _, gr in grs.iterrows():
-    grid, media, probs = calcular_probs_gr(gr, predictor, dist, vel, minuto, diferenca)
+for i, (_, gr) in enumerate(grs.iterrows()):
+    grid = grids_jogo[i]
     ranking.append({
-        'id': gr['id'], 'nome': gr['nome'], 'altura': gr['altura_cm'],
-        'envergadura': gr['envergadura_cm'], 'grid': grid, 'media': media, 'probs': probs
+        'i': i, 'id': gr['id'], 'nome': gr['nome'], 'altura': gr['altura_cm'],
+        'envergadura': gr['envergadura_cm'], 'grid': grid, 'media': grid.mean(), 'probs': grid.flatten().tolist()
     })
 
 ranking = sorted(ranking, key=lambda x: x['media'], reverse=True)
@@ -407,6 +437,13 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+# Modelo ainda a carregar (ou indisponível): valores provisórios
+if provisorio:
+    if predictor.erro_arranque:
+        st.warning("⚠️ Modelo H2O não disponível - probabilidades **provisórias** (taxas empíricas por zona)")
+    else:
+        st.info("⏳ Modelo H2O a carregar - probabilidades **provisórias** (taxas empíricas por zona). Atualizam automaticamente no próximo ajuste.")
+
 # =============================================================================
 # TABS: JOGO NORMAL vs pênalti
 # =============================================================================
@@ -445,7 +482,8 @@ with tab_jogo:
                 <div style="font-size: 28px; margin-bottom: 5px;">{icon}</div>
                 <div style="font-size: 18px; font-weight: bold; margin-bottom: 8px;">{r['nome']}</div>
                 <div style="font-size: 42px; font-weight: bold; color: {cor}; line-height: 1;">{taxa:.0f}%</div>
-                <div style="font-size: 11px; color: #888; margin-top: 8px;">{r['altura']}cm | {r['envergadura']}cm</div>
+                <div style="font-size: 11px; color: #888; margin-top: 4px; min-height: 14px;">{texto_ic(r['i'])}</div>
+                <div style="font-size: 11px; color: #888; margin-top: 4px;">{r['altura']}cm | {r['envergadura']}cm</div>
                 <div style="font-size: 11px; color: gold; min-height: 16px; margin-top: 4px;">{badge if badge else ""}</div>
             </div>
             """, unsafe_allow_html=True)
@@ -464,6 +502,10 @@ with tab_jogo:
         st.markdown("### 💡 DECISÃO")
         diff = melhor['media'] - gr_atual_data['media']
         
+        # Diferença só conta se for provável que não é ruído (ensemble bootstrap)
+        p_melhor = prob_melhor(melhor['i'], gr_atual_data['i'])
+        texto_p = "" if p_melhor is None else f"P(melhor) = {p_melhor:.0%}"
+        
         if melhor['nome'] == gr_atual_nome:
             st.markdown(f"""
             <div style="background: #28a74533; border: 3px solid #28a745; border-radius: 12px; padding: 20px; text-align: center;">
@@ -472,30 +514,33 @@ with tab_jogo:
                 <div style="font-size: 16px;">{gr_atual_nome}</div>
             </div>
             """, unsafe_allow_html=True)
-        elif diff > 5:
+        elif diff > 5 and (p_melhor is None or p_melhor >= 0.9):
             st.markdown(f"""
             <div style="background: #dc354533; border: 3px solid #dc3545; border-radius: 12px; padding: 20px; text-align: center;">
                 <div style="font-size: 40px;">🔄</div>
                 <div style="font-size: 22px; font-weight: bold; color: #dc3545;">TROCAR</div>
                 <div style="font-size: 14px;">{gr_atual_nome} → <b>{melhor['nome']}</b></div>
                 <div style="font-size: 24px; color: #28a745;">+{diff:.0f}%</div>
+                <div style="font-size: 12px; color: #666;">{texto_p}</div>
             </div>
             """, unsafe_allow_html=True)
-        elif diff > 2:
+        elif diff > 2 and (p_melhor is None or p_melhor >= 0.7):
             st.markdown(f"""
             <div style="background: #ffc10733; border: 3px solid #ffc107; border-radius: 12px; padding: 20px; text-align: center;">
                 <div style="font-size: 40px;">🤔</div>
                 <div style="font-size: 22px; font-weight: bold; color: #ffc107;">CONSIDERAR</div>
                 <div style="font-size: 14px;">{melhor['nome']} +{diff:.0f}%</div>
+                <div style="font-size: 12px; color: #666;">{texto_p}</div>
             </div>
             """, unsafe_allow_html=True)
         else:
+            motivo = f"Dif. mínima ({diff:.0f}%)" if diff <= 2 else f"+{diff:.0f}% dentro do ruído ({texto_p})"
             st.markdown(f"""
             <div style="background: #17a2b833; border: 3px solid #17a2b8; border-radius: 12px; padding: 20px; text-align: center;">
                 <div style="font-size: 40px;">✅</div>
                 <div style="font-size: 22px; font-weight: bold; color: #17a2b8;">MANTER</div>
                 <div style="font-size: 16px;">{gr_atual_nome}</div>
-                <div style="font-size: 12px; color: #666;">Dif. mínima ({diff:.0f}%)</div>
+                <div style="font-size: 12px; color: #666;">{motivo}</div>
             </div>
             """, unsafe_allow_html=True)
         
@@ -558,6 +603,38 @@ with tab_jogo:
         </div>
         """, unsafe_allow_html=True)
 
+    # EVOLUÇÃO ATÉ AO FIM (sweep minuto × GR)
+    medias_min = calcular_sweep_minutos(grs, predictor, minuto, dist, vel, diferenca)
+    if medias_min is not None and minuto < 60:
+        st.markdown("### 📈 ATÉ AO FIM DO JOGO")
+        minutos = np.arange(minuto, 61)
+        i_atual = int(np.flatnonzero(grs['nome'] == gr_atual_nome)[0])
+        
+        fig = go.Figure()
+        for i, nome in enumerate(grs['nome']):
+            fig.add_trace(go.Scatter(
+                x=minutos, y=medias_min[:, i], mode='lines', name=nome,
+                line=dict(width=4 if i == i_atual else 2, dash='solid' if i == i_atual else 'dot')
+            ))
+        
+        # Primeiro minuto em que outro GR passa à frente do GR em campo
+        outros = np.delete(medias_min, i_atual, axis=1)
+        passa = np.where(outros.max(axis=1) > medias_min[:, i_atual])[0]
+        if len(passa):
+            min_cruz = int(minutos[passa[0]])
+            fig.add_vline(x=min_cruz, line_dash='dash', line_color='#dc3545')
+            if min_cruz > minuto:
+                st.info(f"🔄 A partir do minuto **{min_cruz}** outro GR passa a ter melhor probabilidade média que {gr_atual_nome}")
+        else:
+            st.success(f"✅ {gr_atual_nome} mantém a melhor probabilidade média até ao fim do jogo")
+        
+        fig.update_layout(
+            height=300, margin=dict(l=10, r=10, t=10, b=10),
+            xaxis_title="Minuto", yaxis_title="Prob. defesa média (%)",
+            legend=dict(orientation='h', y=1.1)
+        )
+        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+
 # =============================================================================
 # TAB 2: PENALTY
 # =============================================================================
@@ -573,13 +650,13 @@ with tab_penalty:
     
     st.markdown("")
     
-    # Calcular ranking para penalties (dist=7m)
+    # Ranking para penalties (dist=7m) - já calculado com o jogo normal
     ranking_pen = []
-    for _, gr in grs.iterrows():
-        grid, media, probs = calcular_probs_gr(gr, predictor, 7.0, vel_penalty, minuto, diferenca)
+    for i, (_, gr) in enumerate(grs.iterrows()):
+        grid = grids_pen[i]
         ranking_pen.append({
-            'nome': gr['nome'], 'altura': gr['altura_cm'],
-            'grid': grid, 'media': media, 'probs': probs
+            'i': i, 'nome': gr['nome'], 'altura': gr['altura_cm'],
+            'grid': grid, 'media': grid.mean(), 'probs': grid.flatten().tolist()
         })
     
     ranking_pen = sorted(ranking_pen, key=lambda x: x['media'], reverse=True)
@@ -615,7 +692,8 @@ with tab_penalty:
                 <div style="font-size: 28px; margin-bottom: 5px;">{icon}</div>
                 <div style="font-size: 18px; font-weight: bold; margin-bottom: 8px;">{r['nome']}</div>
                 <div style="font-size: 42px; font-weight: bold; color: {cor}; line-height: 1;">{taxa:.0f}%</div>
-                <div style="font-size: 11px; color: #888; margin-top: 8px;">7 metros | {r['altura']}cm</div>
+                <div style="font-size: 11px; color: #888; margin-top: 4px; min-height: 14px;">{texto_ic(r['i'], ctx=1)}</div>
+                <div style="font-size: 11px; color: #888; margin-top: 4px;">7 metros | {r['altura']}cm</div>
                 <div style="font-size: 11px; color: gold; min-height: 16px; margin-top: 4px;">{badge if badge else ""}</div>
             </div>
             """, unsafe_allow_html=True)
@@ -626,13 +704,17 @@ with tab_penalty:
     melhor_pen = ranking_pen[0]
     atual_pen = next(r for r in ranking_pen if r['nome'] == gr_atual_nome)
     diff_pen = melhor_pen['media'] - atual_pen['media']
+    p_pen = prob_melhor(melhor_pen['i'], atual_pen['i'], ctx=1)
+    texto_p_pen = "" if p_pen is None else f", P(melhor) = {p_pen:.0%}"
     
     if melhor_pen['nome'] == gr_atual_nome:
         st.success(f"✅ **MANTER {gr_atual_nome}** para o Pênalti é a melhor opção!")
-    elif diff_pen > 5:
-        st.error(f"🔄 **TROCAR para {melhor_pen['nome']}** (+{diff_pen:.0f}%)")
+    elif diff_pen > 5 and (p_pen is None or p_pen >= 0.9):
+        st.error(f"🔄 **TROCAR para {melhor_pen['nome']}** (+{diff_pen:.0f}%{texto_p_pen})")
+    elif diff_pen > 2 and (p_pen is None or p_pen >= 0.7):
+        st.warning(f"🤔 **Considerar {melhor_pen['nome']}** (+{diff_pen:.0f}%{texto_p_pen})")
     elif diff_pen > 2:
-        st.warning(f"🤔 **Considerar {melhor_pen['nome']}** (+{diff_pen:.0f}%)")
+        st.info(f"✅ **MANTER {gr_atual_nome}** - +{diff_pen:.0f}% dentro do ruído{texto_p_pen}")
     else:
         st.info(f"✅ **MANTER {gr_atual_nome}** - diferença mínima ({diff_pen:.0f}%)")
     
@@ -653,4 +735,41 @@ with tab_penalty:
                 """, unsafe_allow_html=True)
                 
             fig = heatmap_baliza(r['grid'], "", 700)
-            st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
\ No newline at end of file
+            st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+# =============================================================================
+# DIAGNÓSTICO (latência do modelo)
+# =============================================================================
+with st.sidebar:
+    with st.expander("🩺 Diagnóstico do modelo"):
+        stats = predictor.stats()
+        st.caption(f"Motor: {predictor.get_model_info().get('Motor', 'N/A')}")
+        
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Chamadas", stats['chamadas'])
+        col2.metric("Linhas", stats['linhas'])
+        col3.metric("Erros", stats['erros'])
+        
+        if stats['etapas']:
+            etapas = pd.DataFrame(stats['etapas']).T[['n', 'p50_ms', 'p95_ms', 'p99_ms']]
+            st.dataframe(etapas.round(1), use_container_width=True)
+        
+        total = stats['etapas'].get('total')
+        if total and stats['orcamento_ms']:
+            if total['p95_ms'] > stats['orcamento_ms']:
+                st.error(f"⚠️ p95 {total['p95_ms']:.0f} ms acima do orçamento ({stats['orcamento_ms']:.0f} ms)")
+            else:
+                st.success(f"✅ p95 {total['p95_ms']:.0f} ms dentro do orçamento ({stats['orcamento_ms']:.0f} ms)")
+        
+        lru = stats['cache']['lru']
+        if lru:
+            st.caption(f"Cache LRU: {lru['hit_rate']:.0%} hits ({lru['entradas']} entradas)")
+        
+        sombra = stats.get('sombra')
+        if sombra:
+            st.caption(f"👥 Candidato em sombra ({sombra['candidato_hash']}): "
+                       f"{sombra['pedidos']} pedidos, {sombra['descartados']} descartados")
+            if sombra['por_zona']:
+                discordancia = pd.DataFrame(sombra['por_zona']).T[['n', 'dif_media', 'dif_abs_media']]
+                zonas_nome = ['Sup.Esq', 'Sup.Centro', 'Sup.Dir', 'Meio.Esq', 'Meio.Centro', 'Meio.Dir', 'Inf.Esq', 'Inf.Centro', 'Inf.Dir']
+                discordancia.index = [zonas_nome[int(z) - 1] for z in discordancia.index]
+                st.dataframe(discordancia, use_container_width=True)
@@ -12,7 +12,7 @@ import sys
 sys.path.append('..')
 
 try:
-    from models.predictor_defesa import DefesaPredictor
+    from models.gestor_modelos import obter_defesa
     H2O_OK = True
 except:
     H2O_OK = False
@@ -29,11 +29,11 @@ with open('styles/custom.css') as f:
 def get_db():
     return HandballDataAccess()
 
-@st.cache_resource
 def get_predictor():
+    # Instância única do processo, partilhada com as outras páginas
     if H2O_OK:
         try:
-            return DefesaPredictor(model_dir='models')
+            return obter_defesa()
         except:
             return None
     return None
@@ -215,25 +215,17 @@ def heatmap_baliza(grid, titulo="", height=400, destacar_fracas=None):
 # =============================================================================
 # CALCULAR PROBS H2O
 # =============================================================================
-def calcular_probs_gr(gr, predictor, dist=9.0, vel=95, minuto=30, dif=0):
-    """Retorna grid 3x3, média e lista de probs"""
-    probs = []
-    for zona in range(1, 10):
-        try:
-            p = predictor.predict(
-                zona=zona, distancia=dist, velocidade=vel,
-                altura_gr=int(gr['altura_cm']),
-                envergadura_gr=int(gr['envergadura_cm']),
-                vel_lateral_gr=float(gr['velocidade_lateral_ms']),
-                minuto=minuto, diferenca_golos=dif
-            )
-            probs.append(p)
-        except:
-            probs.append(50.0)
-    
-    grid = np.array(probs).reshape(3, 3)
-    media = np.mean(probs)
-    return grid, media, probs
+def calcular_probs_grs(grs, predictor, dist=9.0, vel=95, minuto=30, dif=0):
+    """Retorna {nome: (grid 3x3, média, lista de probs)} de todos os GRs num só pedido"""
+    try:
+        grids = predictor.predict_grid(grs, dist, vel, minuto, dif)
+    except:
+        grids = np.full((len(grs), 3, 3), 50.0)
+    
+    return {
+        nome: (grid, grid.mean(), grid.flatten().tolist())
+        for nome, grid in zip(grs['nome'], grids)
+    }
 
 # =============================================================================
 # VERIFICAR H2O
@@ -250,8 +242,7 @@ with st.sidebar:
     
     # GRs
     query = "SELECT * FROM guarda_redes"
-    with db.get_connection() as conn:
-        grs = pd.read_sql_query(query, conn)
+    grs = db.read_query(query)
     
     gr_selecionado = st.selectbox("Guarda-Redes", grs['nome'].tolist())
     gr_data = grs[grs['nome'] == gr_selecionado].iloc[0]
@@ -260,15 +251,13 @@ with st.sidebar:
     
     # Adversários
     query = "SELECT id, nome FROM adversarios ORDER BY ranking_liga"
-    with db.get_connection() as conn:
-        advs = pd.read_sql_query(query, conn)
+    advs = db.read_query(query)
     
     adv_nome = st.selectbox("Próximo Adversário", advs['nome'].tolist())
     adv_id = int(advs[advs['nome'] == adv_nome]['id'].values[0])
     
     query = "SELECT * FROM adversarios WHERE id = ?"
-    with db.get_connection() as conn:
-        adv_info = pd.read_sql_query(query, conn, params=(adv_id,)).iloc[0]
+    adv_info = db.read_query(query, (adv_id,)).iloc[0]
     
     st.divider()
     
@@ -294,6 +283,13 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+# Modelo ainda a carregar (ou indisponível): valores provisórios
+if predictor.provisorio:
+    if predictor.erro_arranque:
+        st.warning("⚠️ Modelo H2O não disponível - probabilidades **provisórias** (taxas empíricas por zona)")
+    else:
+        st.info("⏳ Modelo H2O a carregar - probabilidades **provisórias** (taxas empíricas por zona). Atualizam automaticamente no próximo ajuste.")
+
 # =============================================================================
 # CALCULAR DADOS
 # =============================================================================
@@ -308,6 +304,9 @@ def get_dist_adversario(adv):
         [baixa * 0.30, baixa * 0.40, baixa * 0.30]
     ])
 
+# Probabilidades de todos os GRs num único pedido ao H2O (partilhadas pelos tabs)
+probs_plantel = calcular_probs_grs(grs, predictor, treino_dist, treino_vel)
+
 # =============================================================================
 # TABS
 # =============================================================================
@@ -318,7 +317,7 @@ tab1, tab2, tab3 = st.tabs(["📊 Análise Individual", "👥 Comparação Plant
 # =============================================================================
 with tab1:
     # Calcular dados do GR selecionado
-    grid_gr, media_gr, probs_gr = calcular_probs_gr(gr_data, predictor, treino_dist, treino_vel)
+    grid_gr, media_gr, probs_gr = probs_plantel[gr_selecionado]
     zonas_fracas = np.argsort(probs_gr)[:3].tolist()
     
     st.markdown(f"### 📊 Análise de {gr_selecionado}")
@@ -413,7 +412,7 @@ with tab2:
     # Calcular dados de todos os GRs
     todos_grs = []
     for _, gr in grs.iterrows():
-        grid, media, probs = calcular_probs_gr(gr, predictor, treino_dist, treino_vel)
+        grid, media, probs = probs_plantel[gr['nome']]
         todos_grs.append({
             'nome': gr['nome'],
             'altura': gr['altura_cm'],
@@ -507,8 +506,8 @@ for row in range(3):
 # TAB 3: PLANO SEMANAL
 # =============================================================================
 with tab3:
-    # RECALCULAR tudo para o GR atual
-    grid_gr, media_gr, probs_gr = calcular_probs_gr(gr_data, predictor, treino_dist, treino_vel)
+    # Dados do GR atual
+    grid_gr, media_gr, probs_gr = probs_plantel[gr_selecionado]
     zonas_fracas = np.argsort(probs_gr)[:3].tolist()
     dist_adv = get_dist_adversario(adv_info)
     zona_adv_forte = np.argmax(dist_adv.flatten())
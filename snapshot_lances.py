@@ -0,0 +1,232 @@
+"""
+SNAPSHOT DE LANCES - Factos lances ⨝ jogos ⨝ guarda_redes em Parquet por época
+Exportação colunar (tipos fixos, texto em dicionário, um diretório por época)
+para treino e análise: lida com memory-map em vez da query SQL com três
+tabelas, e importada pelo H2O diretamente do ficheiro em vez do upload do pandas
+"""
+
+import hashlib
+import json
+import shutil
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+except ImportError:
+    pa = None
+
+DESTINO = 'snapshots/lances'
+MANIFESTO = 'manifesto.json'
+
+QUERY_FACTOS = """
+SELECT
+    l.id AS lance_id,
+    l.jogo_id,
+    j.guarda_redes_id,
+    j.adversario_id,
+    j.epoca,
+    j.data,
+    j.local,
+    j.fase_competicao,
+    l.zona_baliza_id,
+    l.zona_baliza_nome,
+    l.distancia_remate_m,
+    l.velocidade_remate_kmh,
+    l.tipo_remate,
+    l.posicao_ofensiva,
+    l.minuto_jogo,
+    l.fase_jogo,
+    l.tempo_desde_ultima_defesa_s,
+    l.resultado,
+    l.diferenca_golos_momento,
+    l.inferioridade_numerica,
+    gr.altura_cm,
+    gr.envergadura_cm,
+    gr.velocidade_lateral_ms,
+    CASE WHEN l.resultado = 'Defesa' THEN 1 ELSE 0 END as defesa
+FROM lances l
+JOIN jogos j ON l.jogo_id = j.id
+JOIN guarda_redes gr ON j.guarda_redes_id = gr.id
+"""
+
+# Tipo de cada coluna da query; 'texto' (poucos valores distintos) fica em
+# dicionário: índices int32 + valores únicos
+TIPOS = {
+    'lance_id': 'int64', 'jogo_id': 'int32', 'guarda_redes_id': 'int32', 'adversario_id': 'int32',
+    'epoca': 'int16', 'data': 'texto', 'local': 'texto', 'fase_competicao': 'texto',
+    'zona_baliza_id': 'int8', 'zona_baliza_nome': 'texto', 'distancia_remate_m': 'float64',
+    'velocidade_remate_kmh': 'float64', 'tipo_remate': 'texto', 'posicao_ofensiva': 'texto',
+    'minuto_jogo': 'int16', 'fase_jogo': 'texto', 'tempo_desde_ultima_defesa_s': 'int32',
+    'resultado': 'texto', 'diferenca_golos_momento': 'int16', 'inferioridade_numerica': 'int8',
+    'altura_cm': 'int16', 'envergadura_cm': 'int16', 'velocidade_lateral_ms': 'float64',
+    'defesa': 'int8'
+}
+
+
+def esquema():
+    """Esquema Arrow do snapshot (epoca fica no caminho: epoca=2025/)"""
+    return pa.schema([
+        pa.field(nome, pa.dictionary(pa.int32(), pa.string()) if tipo == 'texto' else pa.type_for_alias(tipo))
+        for nome, tipo in TIPOS.items()
+    ])
+
+
+def _exigir_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow não instalado (pip install pyarrow) - snapshot Parquet indisponível")
+
+
+# Colunas de cada tabela que entram no snapshot (a assinatura só olha para estas)
+COLUNAS_ORIGEM = {
+    'lances': ['id', 'jogo_id', 'zona_baliza_id', 'zona_baliza_nome', 'distancia_remate_m',
+               'velocidade_remate_kmh', 'tipo_remate', 'posicao_ofensiva', 'minuto_jogo', 'fase_jogo',
+               'tempo_desde_ultima_defesa_s', 'resultado', 'diferenca_golos_momento', 'inferioridade_numerica'],
+    'jogos': ['id', 'guarda_redes_id', 'adversario_id', 'epoca', 'data', 'local', 'fase_competicao'],
+    'guarda_redes': ['id', 'altura_cm', 'envergadura_cm', 'velocidade_lateral_ms'],
+}
+
+
+def versao_dados(conn, lote=50_000):
+    """
+    Assinatura do conteúdo exportado: linhas e SHA-256 das colunas de cada tabela
+
+    Apanha também edições no lugar (ex.: resultado corrigido, lance movido
+    para outro jogo), que não mudam contagens nem o maior id.
+    """
+    versao = []
+    for tabela, colunas in COLUNAS_ORIGEM.items():
+        h = hashlib.sha256()
+        n = 0
+        cursor = conn.execute(f"SELECT {', '.join(colunas)} FROM {tabela} ORDER BY id")
+        while True:
+            linhas = cursor.fetchmany(lote)
+            if not linhas:
+                break
+            h.update(repr(linhas).encode())
+            n += len(linhas)
+        versao.append([tabela, n, h.hexdigest()])
+    return versao
+
+
+def exportar(db_path='handball_dt.db', destino=DESTINO, lote=200_000):
+    """
+    Escreve o snapshot (substitui o anterior só no fim)
+
+    A query é lida em lotes, por isso a memória não cresce com o número de lances.
+
+    Args:
+        db_path (str): Base de dados SQLite
+        destino (str | Path): Diretório do dataset (epoca=AAAA/part-*.parquet)
+        lote (int): Linhas por lote lido e por row group
+
+    Returns:
+        dict: Manifesto (linhas, épocas, versão dos dados)
+    """
+    _exigir_pyarrow()
+    destino = Path(destino)
+    temporario = destino.with_name(destino.name + '.tmp')
+    shutil.rmtree(temporario, ignore_errors=True)
+    alvo = esquema()
+    contagem = {'linhas': 0, 'epocas': set()}
+
+    # O write_dataset consome os lotes numa thread sua (a conexão só é usada por ela)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        versao = versao_dados(conn)
+
+        def lotes():
+            for df in pd.read_sql_query(QUERY_FACTOS, conn, chunksize=lote):
+                contagem['linhas'] += len(df)
+                contagem['epocas'].update(df['epoca'].dropna().astype(int).tolist())
+                yield from pa.Table.from_pandas(df, schema=alvo, preserve_index=False).to_batches()
+
+        ds.write_dataset(
+            lotes(), temporario, schema=alvo, format='parquet',
+            partitioning=ds.partitioning(pa.schema([alvo.field('epoca')]), flavor='hive'),
+            file_options=ds.ParquetFileFormat().make_write_options(compression='zstd', use_dictionary=True),
+            max_rows_per_group=lote, existing_data_behavior='overwrite_or_ignore'
+        )
+    finally:
+        conn.close()
+
+    manifesto = {
+        'linhas': contagem['linhas'],
+        'epocas': sorted(contagem['epocas']),
+        'versao_dados': versao,
+        'origem': str(db_path),
+        'criado_em': datetime.now().isoformat()
+    }
+    (temporario / MANIFESTO).write_text(json.dumps(manifesto, indent=2))
+
+    shutil.rmtree(destino, ignore_errors=True)
+    temporario.rename(destino)
+    return manifesto
+
+
+def manifesto(destino=DESTINO):
+    caminho = Path(destino) / MANIFESTO
+    return json.loads(caminho.read_text()) if caminho.exists() else None
+
+
+def atualizado(db_path='handball_dt.db', destino=DESTINO):
+    """True se houver snapshot, pyarrow e os dados não tiverem mudado desde a exportação"""
+    info = manifesto(destino)
+    if pa is None or info is None:
+        return False
+    with sqlite3.connect(db_path) as conn:
+        return info['versao_dados'] == versao_dados(conn)
+
+
+def ler_tabela(destino=DESTINO, colunas=None, epocas=None):
+    """
+    Tabela Arrow do snapshot, lida com memory-map
+
+    Args:
+        colunas (list | None): Só estas colunas (None = todas)
+        epocas (list | None): Só estas épocas (as outras partições nem são abertas)
+    """
+    _exigir_pyarrow()
+    dataset = ds.dataset(
+        Path(destino), format='parquet',
+        partitioning=ds.partitioning(pa.schema([esquema().field('epoca')]), flavor='hive'),
+        filesystem=fs.LocalFileSystem(use_mmap=True), exclude_invalid_files=True
+    )
+    filtro = ds.field('epoca').isin(epocas) if epocas else None
+    return dataset.to_table(columns=colunas, filter=filtro)
+
+
+def ler_lances(destino=DESTINO, colunas=None, epocas=None):
+    """DataFrame do snapshot (colunas em dicionário -> category)"""
+    return ler_tabela(destino, colunas, epocas).to_pandas()
+
+
+def importar_h2o(destino=DESTINO, colunas=None):
+    """
+    H2OFrame importado diretamente dos ficheiros Parquet pelo cluster (sem
+    passar pelo pandas); exige que o cluster veja o mesmo disco (h2o.init local)
+    """
+    import h2o
+
+    destino = Path(destino).resolve()
+    hf = h2o.import_file(str(destino), pattern=r".*\.parquet$", partition_by=['epoca'])
+    return hf[colunas] if colunas else hf
+
+
+# EXPORTAÇÃO
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'handball_dt.db'
+    destino = sys.argv[2] if len(sys.argv) > 2 else DESTINO
+
+    inicio = datetime.now()
+    info = exportar(db_path, destino)
+    segundos = (datetime.now() - inicio).total_seconds()
+    tamanho = sum(f.stat().st_size for f in Path(destino).rglob('*.parquet'))
+    print(f"✅ {info['linhas']} lances em {destino} ({tamanho / 1e6:.1f} MB, "
+          f"épocas {', '.join(map(str, info['epocas']))}) em {segundos:.1f}s")
@@ -0,0 +1,20 @@
+"""
+Configuração dos testes (pytest na raiz do repositório: python -m pytest -q)
+"""
+
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+# Módulos do repositório (data_access, models.*) importáveis a partir dos testes
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def db_copia(tmp_path):
+    """Cópia da handball_dt.db versionada (os testes nunca escrevem na original)"""
+    destino = tmp_path / 'handball_dt.db'
+    shutil.copy(Path(__file__).resolve().parent.parent / 'handball_dt.db', destino)
+    return destino
@@ -0,0 +1,91 @@
+"""
+Agregados por zona (agregados_zonas.py): os triggers acompanham a agregação completa
+"""
+
+import sqlite3
+
+import pytest
+
+import agregados_zonas
+
+
+@pytest.fixture
+def conn(db_copia):
+    conn = sqlite3.connect(db_copia)
+    agregados_zonas.instalar(conn)
+    yield conn
+    conn.close()
+
+
+def copiar_linha(conn, tabela, id_origem, **alteracoes):
+    """Insere uma cópia da linha id_origem com um id novo; devolve o id"""
+    cursor = conn.execute(f"SELECT * FROM {tabela} WHERE id = ?", (id_origem,))
+    linha = dict(zip([c[0] for c in cursor.description], cursor.fetchone()))
+    linha.update(alteracoes)
+    if 'id' not in alteracoes:
+        linha['id'] = conn.execute(f"SELECT MAX(id) + 1 FROM {tabela}").fetchone()[0]
+    conn.execute(f"INSERT INTO {tabela} ({', '.join(linha)}) VALUES ({', '.join('?' * len(linha))})",
+                 list(linha.values()))
+    return linha['id']
+
+
+def ids(conn, tabela, n=2):
+    return [r[0] for r in conn.execute(f"SELECT id FROM {tabela} ORDER BY id LIMIT ?", (n,))]
+
+
+def test_instalacao_consistente(conn):
+    assert conn.execute(f"SELECT COUNT(*) FROM {agregados_zonas.TABELA}").fetchone()[0] > 0
+    assert agregados_zonas.diferencas(conn) == []
+
+
+def test_lances_inseridos_alterados_e_apagados(conn):
+    lance, outro = ids(conn, 'lances')
+    jogo_outro = conn.execute("SELECT MAX(jogo_id) FROM lances").fetchone()[0]
+    with conn:
+        novo = copiar_linha(conn, 'lances', lance)
+    assert agregados_zonas.diferencas(conn) == []
+
+    with conn:
+        conn.execute("UPDATE lances SET resultado = CASE resultado WHEN 'Defesa' THEN 'Golo' "
+                     "ELSE 'Defesa' END, zona_baliza_id = 9 WHERE id = ?", (novo,))
+        conn.execute("UPDATE lances SET jogo_id = ? WHERE id = ?", (jogo_outro, outro))
+    assert agregados_zonas.diferencas(conn) == []
+
+    with conn:
+        conn.execute("DELETE FROM lances WHERE id IN (?, ?)", (novo, lance))
+    assert agregados_zonas.diferencas(conn) == []
+
+
+def test_jogos_alterados_apagados_e_inseridos_depois_dos_lances(conn):
+    jogo, outro = [r[0] for r in conn.execute("SELECT DISTINCT jogo_id FROM lances ORDER BY jogo_id LIMIT 2")]
+    gr = conn.execute("SELECT MAX(id) FROM guarda_redes").fetchone()[0]
+    with conn:
+        conn.execute("UPDATE jogos SET guarda_redes_id = ?, epoca = epoca + 1 WHERE id = ?", (gr, jogo))
+    assert agregados_zonas.diferencas(conn) == []
+
+    with conn:
+        conn.execute("DELETE FROM jogos WHERE id = ?", (outro,))
+    assert agregados_zonas.diferencas(conn) == []
+
+    # Lance registado antes da linha do jogo: só conta quando o jogo chega
+    novo_jogo = conn.execute("SELECT MAX(id) + 1 FROM jogos").fetchone()[0]
+    with conn:
+        copiar_linha(conn, 'lances', ids(conn, 'lances', 1)[0], jogo_id=novo_jogo)
+        copiar_linha(conn, 'jogos', jogo, id=novo_jogo)
+    assert agregados_zonas.diferencas(conn) == []
+
+
+def test_reinstalar_substitui_triggers_antigos(conn):
+    nome = f'{agregados_zonas.TABELA}_jogo_apagado'
+    with conn:
+        # Trigger de uma versão anterior (sem efeito): o agregado diverge
+        conn.execute(f"DROP TRIGGER {nome}")
+        conn.execute(f"CREATE TRIGGER {nome} AFTER DELETE ON jogos BEGIN SELECT 1; END")
+        conn.execute("DELETE FROM jogos WHERE id = (SELECT MIN(jogo_id) FROM lances)")
+    assert agregados_zonas.diferencas(conn) != []
+
+    agregados_zonas.instalar(conn)
+
+    assert agregados_zonas.diferencas(conn) == []
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (nome,)).fetchone()[0]
+    assert ' '.join(sql.split()) == ' '.join(agregados_zonas.TRIGGERS[nome].split())
@@ -0,0 +1,78 @@
+"""
+Caches de predições (models/cache_predicoes.py): limites, evictions e poda
+"""
+
+import sqlite3
+
+from models.cache_predicoes import CacheLRU, CachePersistente
+
+
+def test_lru_remove_o_menos_usado():
+    cache = CacheLRU(max_entradas=3)
+    cache.put_many([('h', 1), ('h', 2), ('h', 3)], [0.1, 0.2, 0.3])
+    cache.get_many([('h', 1)])                  # 1 passa a recente: sai o 2
+    cache.put_many([('h', 4)], [0.4])
+
+    assert cache.get_many([('h', 1), ('h', 2), ('h', 3), ('h', 4)]) == [0.1, None, 0.3, 0.4]
+    assert len(cache) == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_lru_nunca_passa_o_limite():
+    cache = CacheLRU(max_entradas=100)
+    for i in range(50):
+        cache.put_many([('h', i, j) for j in range(7)], [float(j) for j in range(7)])
+        assert len(cache) <= 100
+    assert cache.stats()['evictions'] == 50 * 7 - 100
+
+
+def test_lru_contadores_e_remover_hash():
+    cache = CacheLRU(max_entradas=10)
+    cache.put_many([('a', 1), ('b', 1)], [1.0, 2.0])
+    cache.get_many([('a', 1), ('a', 2)])
+
+    assert cache.remover_hash('a') == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entradas']) == (1, 1, 1)
+    assert stats['hit_rate'] == 0.5
+
+
+def _contar(caminho):
+    with sqlite3.connect(caminho) as conn:
+        return conn.execute("SELECT COUNT(*) FROM predictions_cache").fetchone()[0]
+
+
+def test_persistente_poda_as_mais_antigas(tmp_path):
+    caminho = tmp_path / 'cache.db'
+    store = CachePersistente(caminho, max_entradas=1000)
+    for lote in range(30):
+        store.put_many('h', [('k', lote, j) for j in range(100)], [float(lote)] * 100)
+        assert _contar(caminho) <= 1000
+
+    assert store.stats()['podadas'] > 0
+    assert store.stats()['entradas'] >= _contar(caminho)
+    # O lote mais recente fica, o primeiro já saiu
+    assert store.get_many('h', [('k', 29, 0), ('k', 0, 0)]) == [29.0, None]
+
+
+def test_persistente_poda_na_abertura(tmp_path):
+    caminho = tmp_path / 'cache.db'
+    CachePersistente(caminho, max_entradas=10_000).put_many('h', [('k', i) for i in range(800)], [1.0] * 800)
+
+    store = CachePersistente(caminho, max_entradas=500)
+
+    assert _contar(caminho) <= 450
+    assert store.stats()['entradas'] == _contar(caminho)
+
+
+def test_persistente_substituicoes_e_remover_hash(tmp_path):
+    caminho = tmp_path / 'cache.db'
+    store = CachePersistente(caminho, max_entradas=1000)
+    store.put_many('a', [('k', i) for i in range(10)], [1.0] * 10)
+    for _ in range(5):
+        store.put_many('b', [('k', i) for i in range(10)], [2.0] * 10)
+
+    assert _contar(caminho) == 20
+    assert store.remover_hash('a') == 10
+    assert store.get_many('b', [('k', 0)]) == [2.0]
+    assert store.stats()['entradas'] >= _contar(caminho) == 10
@@ -0,0 +1,65 @@
+"""
+Ingestão ao vivo (ingestao_lances.py): um lote que falha a escrita fica no buffer
+"""
+
+import sqlite3
+
+import pytest
+
+import ingestao_lances
+from ingestao_lances import IngestorLances
+
+
+@pytest.fixture
+def ingestor(db_copia):
+    ingestor = IngestorLances(str(db_copia), tamanho_lote=100)
+    # Não espera 5 s pelo lock nos testes de base de dados bloqueada
+    ingestor._conn.execute("PRAGMA busy_timeout=50")
+    yield ingestor
+    ingestor.fechar()
+
+
+def contar_lances(caminho):
+    with sqlite3.connect(caminho) as conn:
+        return conn.execute("SELECT COUNT(*) FROM lances").fetchone()[0]
+
+
+def registar_dois(ingestor):
+    jogo = ingestor.iniciar_jogo(1, 3)
+    ingestor.registar(jogo, 5, 'Defesa', 12)
+    ingestor.registar(jogo, 3, 'Golo', 13)
+    return jogo
+
+
+def test_flush_com_base_bloqueada_mantem_o_lote(ingestor, db_copia):
+    jogo = registar_dois(ingestor)
+    antes = contar_lances(db_copia)
+
+    escritor = sqlite3.connect(db_copia, isolation_level=None)
+    escritor.execute("BEGIN IMMEDIATE")
+    with pytest.raises(sqlite3.OperationalError, match='locked'):
+        ingestor.flush()
+    escritor.execute("ROLLBACK")
+    escritor.close()
+
+    assert len(ingestor._buffer) == 2
+    assert not ingestor._conn.in_transaction
+    assert ingestor.flush() == 2
+    assert contar_lances(db_copia) == antes + 2
+    assert ingestor.estado(jogo)['zonas'] == {3: {'remates': 1, 'defesas': 0}, 5: {'remates': 1, 'defesas': 1}}
+
+
+def test_flush_com_erro_na_transacao_mantem_o_lote(ingestor, db_copia, monkeypatch):
+    jogo = registar_dois(ingestor)
+    antes = contar_lances(db_copia)
+
+    monkeypatch.setattr(ingestao_lances, 'SOMAR_ZONA', "INSERT INTO tabela_inexistente VALUES (?, ?, ?, ?)")
+    with pytest.raises(sqlite3.OperationalError, match='tabela_inexistente'):
+        ingestor.flush()
+    monkeypatch.undo()
+
+    # Rollback completo: nem os lances do lote ficaram escritos
+    assert contar_lances(db_copia) == antes
+    assert len(ingestor._buffer) == 2
+    assert ingestor.flush() == 2
+    assert ingestor.estado(jogo)['remates'] == 2
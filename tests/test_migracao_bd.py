@@ -0,0 +1,50 @@
+"""
+Migração da base de dados (migracao_bd.py): chaves, índices e idempotência
+"""
+
+import sqlite3
+
+import agregados_zonas
+import migracao_bd
+
+
+def esquema(caminho):
+    with sqlite3.connect(caminho) as conn:
+        return conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+
+
+def contagens(caminho):
+    with sqlite3.connect(caminho) as conn:
+        return {t: conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in migracao_bd.CHAVES}
+
+
+def test_migrar_e_idempotente(db_copia):
+    antes = contagens(db_copia)
+
+    primeira = migracao_bd.migrar(db_copia, backup=False)
+    depois = esquema(db_copia)
+    segunda = migracao_bd.migrar(db_copia, backup=False)
+
+    assert set(primeira['tabelas']) == set(migracao_bd.CHAVES)
+    assert segunda == {'tabelas': [], 'indices': [], 'removidos': []}
+    assert esquema(db_copia) == depois
+    assert contagens(db_copia) == antes
+
+
+def test_migrar_chaves_indices_agregados_e_wal(db_copia):
+    migracao_bd.migrar(db_copia, backup=False)
+
+    with sqlite3.connect(db_copia) as conn:
+        for tabela, chave in migracao_bd.CHAVES.items():
+            colunas = conn.execute(f'PRAGMA table_info("{tabela}")').fetchall()
+            assert tuple(c[1] for c in sorted(colunas, key=lambda c: c[5]) if c[5]) == chave
+        nomes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {nome for nome, tabela, _, _ in migracao_bd.INDICES if tabela != 'compatibilidades_modelo'} <= nomes
+        assert not nomes & set(migracao_bd.OBSOLETOS)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert agregados_zonas.diferencas(conn) == []
+
+
+def test_migrar_com_backup(db_copia):
+    migracao_bd.migrar(db_copia)
+    assert contagens(f"{db_copia}.bak") == contagens(db_copia)
@@ -0,0 +1,63 @@
+"""
+Motor NumPy (models/motor_numpy.py) contra o H2O no modelo de defesa versionado
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from models.motor_numpy import MotorGBM, caminho_npz
+
+MODELOS = Path(__file__).resolve().parent.parent / 'models'
+
+
+@pytest.fixture(scope='module')
+def modelo_h2o():
+    """Modelo de defesa carregado num cluster H2O local (salta sem H2O/Java)"""
+    h2o = pytest.importorskip('h2o')
+    try:
+        h2o.init(max_mem_size="1G", verbose=False)
+    except Exception as e:
+        pytest.skip(f"cluster H2O indisponível: {e}")
+    metadata = json.loads((MODELOS / 'modelo_defesa_metadata.json').read_text())
+    model = h2o.load_model(str(MODELOS / metadata['model_path']))
+    yield h2o, model, metadata
+    h2o.cluster().shutdown(prompt=False)
+
+
+def amostra(motor, n=300, seed=0):
+    """Linhas aleatórias em torno dos limiares das árvores, com ~10% de NA"""
+    rng = np.random.default_rng(seed)
+    colunas = {}
+    for j, nome in enumerate(motor.nomes):
+        if nome in motor.dominios:
+            colunas[nome] = rng.choice(motor.dominios[nome], n).tolist()
+            continue
+        lim = motor.limiar[(motor.feature == j) & ~np.isnan(motor.limiar)]
+        lo, hi = (lim.min() - 1, lim.max() + 1) if lim.size else (0.0, 1.0)
+        colunas[nome] = [None if rng.random() < 0.1 else v for v in rng.uniform(lo, hi, n)]
+    return colunas
+
+
+def test_motor_reproduz_h2o(modelo_h2o):
+    h2o, model, metadata = modelo_h2o
+    motor = MotorGBM.carregar(caminho_npz(MODELOS, metadata['model_path']))
+    colunas = amostra(motor)
+
+    frame = h2o.H2OFrame(colunas, column_types={n: 'enum' for n in motor.dominios})
+    esperado = model.predict(frame)['p1'].as_data_frame(use_pandas=True)['p1'].to_numpy(dtype=float)
+
+    np.testing.assert_allclose(motor.prever(motor.matriz(colunas)), esperado, atol=1e-5)
+
+
+def test_motor_carregado_e_deterministico():
+    metadata = json.loads((MODELOS / 'modelo_defesa_metadata.json').read_text())
+    motor = MotorGBM.carregar(caminho_npz(MODELOS, metadata['model_path']))
+    X = motor.matriz(amostra(motor, n=50, seed=1))
+    probs = motor.prever(X)
+
+    assert probs.shape == (50,)
+    assert ((probs > 0) & (probs < 1)).all()
+    np.testing.assert_array_equal(probs, motor.prever(X))
@@ -0,0 +1,50 @@
+"""
+Pipeline de features (models/pipeline_features.py): validação dos metadados
+"""
+
+import numpy as np
+import pytest
+
+from models.pipeline_features import FEATURES_PADRAO, PipelineFeatures
+
+FEATURES_FADIGA = [f if f != 'fase_jogo' else 'fadiga' for f in FEATURES_PADRAO]
+
+
+def metadata(formula):
+    return {'features': FEATURES_FADIGA, 'temporal_feature': 'fadiga', 'fadiga_formula': formula}
+
+
+@pytest.mark.parametrize('formula', [
+    'minuto /',                      # sintaxe
+    "__import__('os').getcwd()",     # nomes além de 'minuto'
+    'np.log(minuto)',
+    'minuto.real.conjugate()',
+    '1 / (minuto - 30)',             # infinito no minuto 30
+    '0.5',                           # um só valor, não um por minuto
+])
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+def test_fadiga_formula_invalida(formula):
+    with pytest.raises(ValueError, match='fadiga_formula'):
+        PipelineFeatures.compilar(metadata(formula))
+
+
+def test_fadiga_sem_formula():
+    meta = metadata('minuto/60')
+    del meta['fadiga_formula']
+    with pytest.raises(ValueError, match='fadiga_formula'):
+        PipelineFeatures.compilar(meta)
+
+
+def test_fadiga_formula_valida():
+    pipeline = PipelineFeatures.compilar(metadata('minuto/60'))
+    np.testing.assert_allclose(pipeline.valor_temporal(np.array([0, 30, 60])), [0.0, 0.5, 1.0])
+
+
+def test_validar_features_do_modelo():
+    pipeline = PipelineFeatures.compilar(metadata('minuto/60'))
+    assert pipeline.validar(FEATURES_FADIGA) is pipeline
+
+    with pytest.raises(ValueError, match='não correspondem'):
+        pipeline.validar(FEATURES_PADRAO)
+    with pytest.raises(ValueError, match='categórica'):
+        pipeline.validar(FEATURES_FADIGA, {'fadiga': ['baixa', 'alta']})
@@ -163,6 +163,13 @@ model_path = h2o.save_model(
 
 print(f"   ✅ Modelo guardado em: {model_path}")
 
+# Exportar árvores para o motor NumPy (scoring sem cluster H2O)
+if best_model.algo == 'gbm':
+    from models.motor_numpy import exportar_gbm
+    exportar_gbm(best_model, f"{model_path}.npz")
+else:
+    print(f"   ℹ️ Líder {best_model.algo} não exportável - predictor usará o H2O")
+
 # 11. TESTE DE PREDIÇÃO
 print("\n🔟 Teste de Predição:")
 
@@ -209,9 +216,9 @@ metadata = {
     'taxa_std': float(df_clean['taxa_defesa_perc'].std())
 }
 
-import json
-with open('models/modelo_compatibilidade_metadata.json', 'w') as f:
-    json.dump(metadata, f, indent=2)
+# Registar a versão (caminho relativo + SHA-256) e passá-la a atual
+from models.registo_modelos import RegistoModelos
+RegistoModelos('models').registar('compatibilidade', metadata)
 
 print("   ✅ Metadados guardados")
 
@@ -8,7 +8,8 @@ from h2o.automl import H2OAutoML
 import pandas as pd
 import sqlite3
 from datetime import datetime
-import json
+
+import snapshot_lances
 
 print("="*70)
 print("RETREINO MODELO - 3 VERSÕES PARA COMPARAR")
@@ -17,8 +18,12 @@ print("="*70)
 # Inicializar H2O
 h2o.init(max_mem_size="4G")
 
-# Carregar dados
-conn = sqlite3.connect('handball_dt.db')
+# Carregar dados: snapshot Parquet (python snapshot_lances.py) importado pelo
+# H2O diretamente do disco, se estiver atualizado; senão query SQL + upload pandas
+COLUNAS = [
+    'zona_baliza_id', 'distancia_remate_m', 'velocidade_remate_kmh', 'minuto_jogo',
+    'diferenca_golos_momento', 'altura_cm', 'envergadura_cm', 'velocidade_lateral_ms', 'defesa'
+]
 
 query = """
 SELECT 
@@ -36,10 +41,18 @@ JOIN jogos j ON l.jogo_id = j.id
 JOIN guarda_redes gr ON j.guarda_redes_id = gr.id
 """
 
-df = pd.read_sql_query(query, conn)
-conn.close()
+if snapshot_lances.atualizado('handball_dt.db'):
+    hf = snapshot_lances.importar_h2o(colunas=COLUNAS)
+    origem = "snapshot Parquet"
+else:
+    conn = sqlite3.connect('handball_dt.db')
+    hf = h2o.H2OFrame(pd.read_sql_query(query, conn)[COLUNAS])
+    conn.close()
+    origem = "SQLite"
 
-print(f"\n✅ {len(df)} lances carregados")
+hf['defesa'] = hf['defesa'].asfactor()
+
+print(f"\n✅ {hf.nrows} lances carregados ({origem})")
 
 # =============================================================================
 # VERSÃO 1: SEM feature temporal (baseline)
@@ -48,10 +61,7 @@ print("\n" + "="*70)
 print("VERSÃO 1: SEM minuto_jogo (baseline)")
 print("="*70)
 
-df_v1 = df.copy()
-
-hf_v1 = h2o.H2OFrame(df_v1)
-hf_v1['defesa'] = hf_v1['defesa'].asfactor()
+hf_v1 = hf
 
 train_v1, test_v1 = hf_v1.split_frame(ratios=[0.8], seed=42)
 
@@ -86,12 +96,9 @@ print("\n" + "="*70)
 print("VERSÃO 2: Com feature FADIGA (0-1 linear)")
 print("="*70)
 
-df_v2 = df.copy()
+hf_v2 = h2o.deep_copy(hf, 'lances_v2')
 # Fadiga cresce linearmente com o tempo
-df_v2['fadiga'] = df_v2['minuto_jogo'] / 60.0  # 0.0 no início, 1.0 aos 60min
-
-hf_v2 = h2o.H2OFrame(df_v2)
-hf_v2['defesa'] = hf_v2['defesa'].asfactor()
+hf_v2['fadiga'] = hf_v2['minuto_jogo'] / 60.0  # 0.0 no início, 1.0 aos 60min
 
 train_v2, test_v2 = hf_v2.split_frame(ratios=[0.8], seed=42)
 
@@ -126,18 +133,13 @@ print("\n" + "="*70)
 print("VERSÃO 3: Com FASE_JOGO categórica")
 print("="*70)
 
-df_v3 = df.copy()
+hf_v3 = h2o.deep_copy(hf, 'lances_v3')
 # Fase categórica
-df_v3['fase_jogo'] = pd.cut(
-    df_v3['minuto_jogo'], 
-    bins=[0, 15, 30, 45, 60],
+hf_v3['fase_jogo'] = hf_v3['minuto_jogo'].cut(
+    breaks=[0, 15, 30, 45, 60],
     labels=['inicio', 'meio_1', 'meio_2', 'final']
 )
 
-hf_v3 = h2o.H2OFrame(df_v3)
-hf_v3['defesa'] = hf_v3['defesa'].asfactor()
-hf_v3['fase_jogo'] = hf_v3['fase_jogo'].asfactor()
-
 train_v3, test_v3 = hf_v3.split_frame(ratios=[0.8], seed=42)
 
 features_v3 = [
@@ -206,6 +208,13 @@ else:
 # Guardar modelo
 model_path = h2o.save_model(model=model, path="./models", force=True)
 
+# Exportar árvores para o motor NumPy (scoring sem cluster H2O)
+if model.algo == 'gbm':
+    from models.motor_numpy import exportar_gbm
+    exportar_gbm(model, f"{model_path}.npz")
+else:
+    print(f"\nℹ️ Líder {model.algo} não exportável - predictor usará o H2O")
+
 # Metadados
 metadata = {
     'model_path': model_path,
@@ -219,8 +228,14 @@ metadata = {
     **metadata_extra
 }
 
-with open('models/modelo_defesa_metadata.json', 'w') as f:
-    json.dump(metadata, f, indent=2)
+# Registar a versão (caminho relativo + SHA-256). Se já houver um modelo em
+# produção, a nova versão fica como candidata, pontuada em sombra nos dashboards
+from models.registo_modelos import RegistoModelos
+registo = RegistoModelos('models')
+versao = registo.registar('defesa', metadata, ativar=registo.atual('defesa') is None)
+if registo.atual('defesa') != versao:
+    registo.definir_candidato('defesa', versao)
+    print(f"   👥 Em sombra contra a versão atual; promover com: python models/registo_modelos.py ativar defesa {versao}")
 
 print(f"\n✅ Modelo {melhor.upper()} guardado!")
 print(f"   Path: {model_path}")